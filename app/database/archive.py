@@ -0,0 +1,249 @@
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interaction_archive_summary (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    interactions INTEGER NOT NULL DEFAULT 0,
+    first_at TEXT,
+    last_at TEXT,
+    PRIMARY KEY (user_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS interaction_archive_files (
+    month TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_OLD_INTERACTIONS = """
+SELECT * FROM interactions
+WHERE created_at < ?
+ORDER BY id LIMIT ?
+"""
+
+
+def create_archive_tables(conn):
+    """Cria as tabelas de resumo e de arquivos do histórico arquivado"""
+    conn.executescript(ARCHIVE_SCHEMA)
+
+
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, f"interactions-{month}.jsonl.gz")
+
+
+class InteractionArchive:
+    """Armazenamento quente/frio do histórico de interações.
+
+    Interações mais antigas que ``retention_days`` saem da tabela ``interactions``
+    para arquivos mensais JSONL comprimidos e apenas acrescidos (cada lote vira
+    um novo membro gzip). No banco fica só um resumo por usuário e mês, que
+    também indica quais arquivos abrir numa leitura do histórico arquivado.
+    """
+
+    def __init__(self, pool, archive_dir, retention_days=90, batch_size=5000):
+        self.pool = pool
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    def ensure_schema(self):
+        """Cria as tabelas se ainda não existirem"""
+        with self.pool.connection() as conn:
+            create_archive_tables(conn)
+
+    # -- Arquivamento ------------------------------------------------------
+
+    def archive(self, now=None):
+        """Move em lotes as interações antigas para os arquivos; retorna quantas moveu"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self.pool.connection() as conn:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_created_at ON interactions (created_at)")
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        total = 0
+        while True:
+            rows = self.pool.fetch_all(_OLD_INTERACTIONS, (cutoff, self.batch_size))
+            if not rows:
+                break
+            self._archive_batch(rows)
+            total += len(rows)
+            logger.info(f"{total} interações arquivadas (até o id {rows[-1]['id']})")
+        return total
+
+    def _archive_batch(self, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row["created_at"][:7], []).append(row)
+
+        # 1) Acrescenta aos arquivos e força a gravação em disco...
+        for month, month_rows in by_month.items():
+            with open(archive_path(self.archive_dir, month), "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as archive_file:
+                    for row in month_rows:
+                        archive_file.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+                raw.flush()
+                os.fsync(raw.fileno())
+
+        # 2) ...e só então resume e apaga do banco. Se o processo cair entre as duas
+        # etapas, o lote é arquivado de novo e a leitura descarta ids repetidos.
+        summaries = {}
+        for row in rows:
+            key = (row["user_id"], row["created_at"][:7])
+            count, first_at, last_at = summaries.get(key, (0, row["created_at"], row["created_at"]))
+            summaries[key] = (count + 1, min(first_at, row["created_at"]), max(last_at, row["created_at"]))
+
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO interaction_archive_summary (user_id, month, interactions, first_at, last_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id, month) DO UPDATE SET "
+                "interactions = interactions + excluded.interactions, "
+                "first_at = MIN(first_at, excluded.first_at), last_at = MAX(last_at, excluded.last_at)",
+                [(user_id, month) + values for (user_id, month), values in summaries.items()]
+            )
+            conn.executemany(
+                "INSERT INTO interaction_archive_files (month, path, rows) VALUES (?, ?, ?) "
+                "ON CONFLICT (month) DO UPDATE SET rows = rows + excluded.rows, updated_at = CURRENT_TIMESTAMP",
+                [(month, archive_path(self.archive_dir, month), len(month_rows))
+                 for month, month_rows in by_month.items()]
+            )
+            conn.executemany("DELETE FROM interactions WHERE id = ?", [(row["id"],) for row in rows])
+
+    # -- VACUUM incremental ------------------------------------------------
+
+    def enable_incremental_vacuum(self):
+        """Ativa auto_vacuum=INCREMENTAL (exige um VACUUM completo, feito uma única vez)"""
+        with self.pool.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        logger.info("auto_vacuum incremental ativado")
+        return True
+
+    def incremental_vacuum(self, pages_per_step=1000, pause=0.05, max_seconds=60):
+        """Devolve páginas livres ao sistema em passos curtos, sem travar o banco por muito tempo"""
+        deadline = time.monotonic() + max_seconds
+        released = 0
+        while time.monotonic() < deadline:
+            with self.pool.connection() as conn:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free == 0 or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    break
+                # executescript executa o pragma até o fim (execute libera só uma página)
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)});")
+                released += free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            time.sleep(pause)
+        if released:
+            # Em WAL o arquivo só encolhe depois do checkpoint
+            with self.pool.connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return released
+
+    # -- Leitura -----------------------------------------------------------
+
+    def get_user_history(self, user_id, since=None, until=None, include_archived=True):
+        """Histórico do usuário em ordem cronológica, juntando o arquivo e a tabela quente.
+
+        ``since``/``until`` são textos no formato de ``created_at``. Os arquivos só
+        são abertos para os meses em que o resumo indica interações do usuário.
+        """
+        history = []
+        if include_archived:
+            history.extend(self.iter_archived(user_id, since, until))
+        query = "SELECT * FROM interactions WHERE user_id = ?"
+        params = [user_id]
+        if since:
+            query += " AND created_at >= ?"
+            params.append(since)
+        if until:
+            query += " AND created_at < ?"
+            params.append(until)
+        history.extend(self.pool.fetch_all(query + " ORDER BY id", params))
+        return history
+
+    def iter_archived(self, user_id, since=None, until=None):
+        """Interações arquivadas do usuário, lidas sob demanda dos arquivos mensais"""
+        months = self.pool.fetch_all(
+            "SELECT month FROM interaction_archive_summary WHERE user_id = ? "
+            "AND month >= ? AND month <= ? ORDER BY month",
+            (user_id, (since or "0000-00")[:7], (until or "9999-99")[:7])
+        )
+        for entry in months:
+            path = archive_path(self.archive_dir, entry["month"])
+            if not os.path.exists(path):
+                logger.warning(f"Arquivo de histórico ausente: {path}")
+                continue
+            seen = set()
+            with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+                for line in archive_file:
+                    row = json.loads(line)
+                    if row["user_id"] != user_id or row["id"] in seen:
+                        continue
+                    if (since and row["created_at"] < since) or (until and row["created_at"] >= until):
+                        continue
+                    seen.add(row["id"])
+                    yield row
+
+    def iter_all_archived(self):
+        """Todas as interações arquivadas deste banco, mês a mês (ex.: reconstruir agregados).
+
+        Com shards os arquivos mensais são compartilhados: ficam só as linhas dos
+        usuários que o resumo deste banco registra naquele mês.
+        """
+        months = self.pool.fetch_all("SELECT month FROM interaction_archive_files ORDER BY month")
+        for entry in months:
+            users = {
+                row["user_id"] for row in self.pool.fetch_all(
+                    "SELECT user_id FROM interaction_archive_summary WHERE month = ?", (entry["month"],)
+                )
+            }
+            path = archive_path(self.archive_dir, entry["month"])
+            if not os.path.exists(path):
+                logger.warning(f"Arquivo de histórico ausente: {path}")
+                continue
+            seen = set()
+            with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+                for line in archive_file:
+                    row = json.loads(line)
+                    if row["user_id"] not in users or row["id"] in seen:
+                        continue
+                    seen.add(row["id"])
+                    yield row
+
+    def get_user_summary(self, user_id):
+        """Resumo mensal do histórico arquivado do usuário"""
+        return self.pool.fetch_all(
+            "SELECT month, interactions, first_at, last_at FROM interaction_archive_summary "
+            "WHERE user_id = ? ORDER BY month",
+            (user_id,)
+        )
+
+
+class ArchivedHistoryManager:
+    """Expõe no DatabaseManager o histórico completo do aluno, arquivado ou não.
+
+    As consultas do DatabaseManager só leem a tabela ``interactions`` e deixam de
+    ver o que o ``archive_history.py`` moveu para os arquivos. ``get_user_history``
+    junta os dois pelo ``InteractionArchive`` (um por shard, com ``per_shard``); os
+    demais métodos passam direto para o ``db_manager``.
+    """
+
+    def __init__(self, db_manager, archive):
+        self.db_manager = db_manager
+        self.archive = archive
+
+    def get_user_history(self, user_id, since=None, until=None, include_archived=True):
+        """Histórico do usuário em ordem cronológica (ver InteractionArchive.get_user_history)"""
+        return self.archive.get_user_history(user_id, since, until, include_archived)
+
+    def __getattr__(self, name):
+        return getattr(self.db_manager, name)
@@ -0,0 +1,140 @@
+import copy
+import json
+import re
+
+from app.database.sharding import current_phone
+from app.utils.cache import TTLCache
+
+# Tabela alvo de uma instrução de escrita (INSERT/REPLACE/UPDATE/DELETE)
+_WRITE_TABLE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE
+)
+
+# Métodos que apenas leem ou que não tocam nas tabelas em cache
+_READ_PREFIXES = ("get_", "is_", "has_", "count_", "list_", "fetch_")
+_UNCACHED_TOPICS = ("interaction", "history", "progress", "message")
+
+# Argumentos que identificam o usuário afetado por uma escrita
+_PHONE_KWARGS = ("phone_number", "phone", "sender")
+_USER_ID_KWARGS = ("user_id",)
+
+
+class CachedDatabaseManager:
+    """Cache de leitura na frente do DatabaseManager para usuários e sessões de avaliação.
+
+    O cache é local ao processo: em implantações com vários processos não há
+    invalidação compartilhada, então ele deve ser desligado nesse cenário.
+    """
+
+    def __init__(self, db_manager, max_size=10000, ttl=300):
+        self.db_manager = db_manager
+        self.user_cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.session_cache = TTLCache(max_size=max_size, ttl=ttl)
+        # user_id -> telefone, para invalidar o usuário quando a escrita vem só com o id
+        self._phones = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get_user_by_phone(self, phone_number):
+        """Busca o usuário pelo telefone, usando o cache quando possível"""
+        user = self.user_cache.get(phone_number)
+        if user is None:
+            user = self.db_manager.get_user_by_phone(phone_number)
+            if user is None:
+                return None
+            self.user_cache.set(phone_number, user)
+            if user.get("id") is not None:
+                self._phones.set(user["id"], phone_number)
+        return dict(user)
+
+    def get_assessment_session(self, user_id):
+        """Busca a sessão de avaliação já com ``questions`` decodificado"""
+        session = self.session_cache.get(user_id)
+        if session is None:
+            session = self.db_manager.get_assessment_session(user_id)
+            if session is None:
+                return None
+            session = dict(session)
+            # Mantém questions_data original por compatibilidade e guarda a versão decodificada
+            questions_data = session.get("questions_data")
+            if isinstance(questions_data, str):
+                session["questions"] = json.loads(questions_data)
+            self.session_cache.set(user_id, session)
+        # Cópia profunda: quem altera ``questions`` não corrompe a entrada em cache
+        return copy.deepcopy(session)
+
+    def execute_query(self, query, params=()):
+        """Executa a consulta e invalida o cache da tabela alterada"""
+        result = self.db_manager.execute_query(query, params)
+        match = _WRITE_TABLE.match(query)
+        if match:
+            self._invalidate_table(match.group(1).lower())
+        return result
+
+    def _invalidate_table(self, table):
+        if table == "users":
+            self.user_cache.clear()
+        elif "assessment" in table or "session" in table:
+            self.session_cache.clear()
+
+    def invalidate_user(self, phone_number):
+        """Remove o usuário do cache"""
+        self.user_cache.invalidate(phone_number)
+
+    def _invalidate_call(self, args, kwargs):
+        """Invalida só o usuário afetado pela chamada; sem chave identificável, esvazia tudo"""
+        phones = [kwargs[key] for key in _PHONE_KWARGS if isinstance(kwargs.get(key), str)]
+        user_ids = [kwargs[key] for key in _USER_ID_KWARGS if kwargs.get(key) is not None]
+        if args and isinstance(args[0], str):
+            phones.append(args[0])
+        elif args and isinstance(args[0], int) and not isinstance(args[0], bool):
+            user_ids.append(args[0])
+        # Dentro de uma mensagem (sharding.routed) o remetente é o usuário afetado
+        if current_phone() is not None:
+            phones.append(current_phone())
+        if not phones and not user_ids:
+            self.clear()
+            return
+
+        for user_id in user_ids:
+            phone_number = self._phones.get(user_id)
+            if phone_number is not None:
+                phones.append(phone_number)
+        for phone_number in phones:
+            user = self.user_cache.get(phone_number)
+            if user is not None and user.get("id") is not None:
+                user_ids.append(user["id"])
+            self.user_cache.invalidate(phone_number)
+        for user_id in user_ids:
+            self.session_cache.invalidate(user_id)
+
+    def invalidate_session(self, user_id):
+        """Remove a sessão de avaliação do cache"""
+        self.session_cache.invalidate(user_id)
+
+    def clear(self):
+        """Esvazia todos os caches"""
+        self.user_cache.clear()
+        self.session_cache.clear()
+
+    def stats(self):
+        """Contadores dos caches de usuário e de sessão"""
+        return {
+            "users": self.user_cache.stats(),
+            "assessment_sessions": self.session_cache.stats()
+        }
+
+    def __getattr__(self, name):
+        attr = getattr(self.db_manager, name)
+        if not callable(attr) or name.startswith(_READ_PREFIXES) or any(
+            topic in name for topic in _UNCACHED_TOPICS
+        ):
+            return attr
+
+        # Demais métodos podem alterar usuários ou sessões: invalidar o usuário após a chamada
+        def write_through(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._invalidate_call(args, kwargs)
+
+        return write_through
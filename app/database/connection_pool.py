@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Banco usado quando DATABASE_PATH não está definido (aplicação e scripts)
+DEFAULT_DATABASE_PATH = "database/alex_bot.db"
+
+
+class PoolTimeoutError(Exception):
+    """Exceção lançada quando nenhuma conexão fica disponível a tempo"""
+
+
+class SQLitePool:
+    """Pool de conexões SQLite em modo WAL com pragmas ajustados.
+
+    As conexões ficam abertas durante toda a vida do pool, então o cache de
+    prepared statements do sqlite3 (``cached_statements``) é reaproveitado entre
+    chamadas: consultas quentes como a busca de usuário por telefone, a sessão de
+    avaliação e a inserção de histórico são compiladas uma única vez por conexão,
+    desde que o texto SQL seja constante.
+    """
+
+    def __init__(self, db_path, size=5, busy_timeout=5000, cache_size_kb=16384,
+                 mmap_size=268435456, synchronous="NORMAL", cached_statements=256,
+                 acquire_timeout=10):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self.acquire_timeout = acquire_timeout
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite-pool")
+
+    def _connect(self):
+        """Abre uma conexão nova com os pragmas de desempenho"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        # Conexões são criadas sob demanda até o tamanho máximo do pool
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._pool.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"Nenhuma conexão disponível em {self.acquire_timeout}s")
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool (modo autocommit)"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Empresta uma conexão dentro de uma transação com commit/rollback automático"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def execute_query(self, query, params=()):
+        """Executa uma consulta: retorna lista de dicts para leituras e lastrowid para escritas"""
+        with self.connection() as conn:
+            cursor = conn.execute(query, params)
+            if cursor.description is not None:
+                return [dict(row) for row in cursor.fetchall()]
+            return cursor.lastrowid
+
+    def fetch_one(self, query, params=()):
+        """Retorna a primeira linha como dict ou None"""
+        with self.connection() as conn:
+            row = conn.execute(query, params).fetchone()
+            return dict(row) if row else None
+
+    def fetch_all(self, query, params=()):
+        """Retorna todas as linhas como lista de dicts"""
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    def executemany(self, query, seq_of_params):
+        """Executa a mesma instrução para vários parâmetros em uma única transação"""
+        with self.transaction() as conn:
+            return conn.executemany(query, seq_of_params).rowcount
+
+    async def run(self, func, *args, **kwargs):
+        """Executa uma função bloqueante no pool de threads do banco"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def aexecute_query(self, query, params=()):
+        """Versão assíncrona de execute_query"""
+        return await self.run(self.execute_query, query, params)
+
+    async def afetch_one(self, query, params=()):
+        """Versão assíncrona de fetch_one"""
+        return await self.run(self.fetch_one, query, params)
+
+    async def afetch_all(self, query, params=()):
+        """Versão assíncrona de fetch_all"""
+        return await self.run(self.fetch_all, query, params)
+
+    async def aexecutemany(self, query, seq_of_params):
+        """Versão assíncrona de executemany"""
+        return await self.run(self.executemany, query, seq_of_params)
+
+    def close(self):
+        """Fecha todas as conexões ociosas e o pool de threads"""
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
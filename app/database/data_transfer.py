@@ -0,0 +1,353 @@
+import base64
+import gzip
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLES = ("users", "assessment_sessions", "interactions")
+
+# Colunas com JSON em texto: exportadas já decodificadas e recodificadas na importação
+JSON_COLUMNS = {"assessment_sessions": ("questions_data",)}
+
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_FILE = "export-checkpoint.json"
+
+IMPORT_PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_import_progress (
+    import_id TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (import_id, table_name)
+);
+"""
+
+
+class TargetNotEmptyError(RuntimeError):
+    """O banco de destino já tem linhas nas tabelas importadas (e não foi pedido ``replace``)"""
+
+
+def table_path(directory, table):
+    return os.path.join(directory, f"{table}.jsonl.gz")
+
+
+def connect(database_path):
+    """Conexão dedicada ao job (WAL, autocommit e transações explícitas)"""
+    conn = sqlite3.connect(database_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+
+
+def _write_json(path, data):
+    """Grava o JSON de forma atômica (arquivo temporário + rename)"""
+    partial = f"{path}.part"
+    with open(partial, "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file, ensure_ascii=False, indent=2)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+    os.replace(partial, path)
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def if_not_exists(statement):
+    """Torna um CREATE TABLE/INDEX exportado idempotente"""
+    head = statement.split("(", 1)[0].upper()
+    if "IF NOT EXISTS" in head:
+        return statement
+    for prefix in ("CREATE TABLE ", "CREATE INDEX ", "CREATE UNIQUE INDEX "):
+        if head.startswith(prefix):
+            return f"{statement[:len(prefix)]}IF NOT EXISTS {statement[len(prefix):]}"
+    return statement
+
+
+def encode_value(value):
+    """Valor SQLite -> JSON (BLOBs viram {"$base64": ...})"""
+    if isinstance(value, bytes):
+        return {"$base64": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict) and "$base64" in value:
+        return base64.b64decode(value["$base64"])
+    return value
+
+
+class TableExporter:
+    """Exporta tabelas para JSONL comprimido, uma linha por registro.
+
+    Cada tabela é lida por um único cursor (``fetchmany``) e escrita em lotes;
+    cada lote vira um membro gzip acrescentado ao arquivo, seguido do checkpoint
+    com o último rowid exportado e o tamanho do arquivo até ali. Uma exportação
+    interrompida corta o arquivo nesse tamanho (descartando um lote gravado pela
+    metade) e retoma do último lote confirmado; a memória fica limitada ao
+    tamanho do lote.
+    """
+
+    def __init__(self, database_path, directory, tables=DEFAULT_TABLES, batch_size=5000):
+        self.database_path = database_path
+        self.directory = directory
+        self.tables = tuple(tables)
+        self.batch_size = batch_size
+
+    def run(self, restart=False):
+        """Exporta (ou retoma) todas as tabelas; retorna o manifesto"""
+        os.makedirs(self.directory, exist_ok=True)
+        checkpoint_path = os.path.join(self.directory, CHECKPOINT_FILE)
+        conn = connect(self.database_path)
+        try:
+            if restart or not os.path.exists(checkpoint_path):
+                checkpoint = self._start(conn)
+            else:
+                checkpoint = _read_json(checkpoint_path)
+                logger.info(f"Retomando exportação {checkpoint['export_id']}")
+
+            for table in self.tables:
+                state = checkpoint["tables"].get(table)
+                if state is None:
+                    logger.warning(f"Tabela {table} não existe no banco de origem, ignorada")
+                    continue
+                if not state["done"]:
+                    self._export_table(conn, table, state, checkpoint, checkpoint_path)
+        finally:
+            conn.close()
+
+        manifest = {
+            "export_id": checkpoint["export_id"],
+            "exported_at": checkpoint["started_at"],
+            "tables": {
+                table: {key: state[key] for key in ("rows", "columns", "schema")}
+                for table, state in checkpoint["tables"].items()
+            }
+        }
+        _write_json(os.path.join(self.directory, MANIFEST_FILE), manifest)
+        return manifest
+
+    def _start(self, conn):
+        checkpoint = {"export_id": uuid.uuid4().hex, "started_at": time.strftime("%Y-%m-%d %H:%M:%S"), "tables": {}}
+        for table in self.tables:
+            columns = table_columns(conn, table)
+            if not columns:
+                continue
+            schema = [
+                row[0] for row in conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+                    "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END",
+                    (table,)
+                ).fetchall()
+            ]
+            checkpoint["tables"][table] = {
+                "columns": columns, "schema": schema, "last_rowid": 0, "rows": 0, "bytes": 0, "done": False
+            }
+            path = table_path(self.directory, table)
+            if os.path.exists(path):
+                os.remove(path)
+        return checkpoint
+
+    def _export_table(self, conn, table, state, checkpoint, checkpoint_path):
+        columns = state["columns"]
+        json_columns = [columns.index(column) for column in JSON_COLUMNS.get(table, ()) if column in columns]
+        path = table_path(self.directory, table)
+        if "bytes" in state and os.path.exists(path) and os.path.getsize(path) > state["bytes"]:
+            # Lote gravado (talvez pela metade) depois do último checkpoint: sai do arquivo
+            # antes de continuar, senão o gzip truncado quebra a leitura da importação
+            os.truncate(path, state["bytes"])
+        cursor = conn.execute(
+            f'SELECT rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid', (state["last_rowid"],)
+        )
+        start = time.perf_counter()
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            lines = []
+            for row in rows:
+                values = [encode_value(value) for value in row[1:]]
+                for index in json_columns:
+                    if isinstance(values[index], str):
+                        try:
+                            values[index] = json.loads(values[index])
+                        except ValueError:
+                            pass
+                lines.append(json.dumps(dict(zip(columns, values)), ensure_ascii=False, default=str))
+
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab", compresslevel=6) as table_file:
+                    table_file.write(("\n".join(lines) + "\n").encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+                size = raw.tell()
+
+            state["last_rowid"] = rows[-1][0]
+            state["rows"] += len(rows)
+            state["bytes"] = size
+            _write_json(checkpoint_path, checkpoint)
+            logger.info(f"{table}: {state['rows']} linhas exportadas ({time.perf_counter() - start:.1f}s)")
+
+        state["done"] = True
+        _write_json(checkpoint_path, checkpoint)
+
+
+def import_table(database_path, directory, table, manifest_entry, import_id, batch_size=5000, replace=False):
+    """Importa uma tabela do JSONL; cada lote e o checkpoint são gravados na mesma transação.
+
+    Função de módulo para poder rodar num processo separado (importação paralela).
+    """
+    conn = connect(database_path)
+    try:
+        conn.executescript(IMPORT_PROGRESS_SCHEMA)
+        for statement in manifest_entry["schema"]:
+            conn.execute(if_not_exists(statement))
+
+        conn.execute(
+            "INSERT OR IGNORE INTO data_import_progress (import_id, table_name) VALUES (?, ?)", (import_id, table)
+        )
+        lines_done, done = conn.execute(
+            "SELECT lines, done FROM data_import_progress WHERE import_id = ? AND table_name = ?",
+            (import_id, table)
+        ).fetchone()
+        if done:
+            return 0
+
+        target_columns = set(table_columns(conn, table))
+        columns = [column for column in manifest_entry["columns"] if column in target_columns]
+        json_columns = set(JSON_COLUMNS.get(table, ()))
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        insert = f'{verb} INTO "{table}" ({column_list}) VALUES ({", ".join("?" for _ in columns)})'
+
+        def row_values(record):
+            values = []
+            for column in columns:
+                value = decode_value(record.get(column))
+                if column in json_columns and value is not None and not isinstance(value, str):
+                    # Mesma serialização padrão usada ao gravar questions_data
+                    value = json.dumps(value)
+                values.append(value)
+            return values
+
+        def flush(batch, lines):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(insert, batch)
+                conn.execute(
+                    "UPDATE data_import_progress SET lines = ?, updated_at = CURRENT_TIMESTAMP "
+                    "WHERE import_id = ? AND table_name = ?",
+                    (lines, import_id, table)
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+        imported = 0
+        lines = lines_done
+        batch = []
+        with gzip.open(table_path(directory, table), "rt", encoding="utf-8") as table_file:
+            # Linhas já confirmadas numa execução anterior
+            for line in itertools.islice(table_file, lines_done, None):
+                batch.append(row_values(json.loads(line)))
+                lines += 1
+                if len(batch) >= batch_size:
+                    flush(batch, lines)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                flush(batch, lines)
+                imported += len(batch)
+
+        conn.execute(
+            "UPDATE data_import_progress SET done = 1, updated_at = CURRENT_TIMESTAMP "
+            "WHERE import_id = ? AND table_name = ?",
+            (import_id, table)
+        )
+        return imported
+    finally:
+        conn.close()
+
+
+class TableImporter:
+    """Importa uma exportação do ``TableExporter``, opcionalmente uma tabela por processo"""
+
+    def __init__(self, database_path, directory, batch_size=5000, jobs=1, replace=False):
+        self.database_path = database_path
+        self.directory = directory
+        self.batch_size = batch_size
+        self.jobs = jobs
+        self.replace = replace
+
+    def run(self, tables=None, restart=False):
+        """Importa (ou retoma) as tabelas do manifesto; retorna as linhas importadas por tabela"""
+        manifest = _read_json(os.path.join(self.directory, MANIFEST_FILE))
+        tables = [table for table in (tables or manifest["tables"]) if table in manifest["tables"]]
+        import_id = manifest["export_id"]
+        conn = connect(self.database_path)
+        try:
+            conn.executescript(IMPORT_PROGRESS_SCHEMA)
+            if restart:
+                conn.execute("DELETE FROM data_import_progress WHERE import_id = ?", (import_id,))
+            if not self.replace:
+                self._check_empty(conn, tables, import_id)
+        finally:
+            conn.close()
+
+        arguments = [
+            (self.database_path, self.directory, table, manifest["tables"][table], import_id,
+             self.batch_size, self.replace)
+            for table in tables
+        ]
+        if self.jobs <= 1 or len(tables) <= 1:
+            return {table: import_table(*args) for table, args in zip(tables, arguments)}
+
+        # Um processo por tabela: descompressão e JSON em paralelo; o SQLite serializa só os commits
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(tables))) as executor:
+            futures = {table: executor.submit(import_table, *args) for table, args in zip(tables, arguments)}
+            return {table: future.result() for table, future in futures.items()}
+
+    @staticmethod
+    def _check_empty(conn, tables, import_id):
+        """Recusa importar por cima de linhas existentes.
+
+        Os registros mantêm os ids de origem: num destino com outros usuários, um
+        usuário com id repetido seria ignorado, mas o histórico e as sessões dele
+        entrariam no usuário do destino que tem o mesmo id. Tabelas desta
+        importação já iniciadas (retomada) não contam.
+        """
+        started = {
+            row[0] for row in conn.execute(
+                "SELECT table_name FROM data_import_progress WHERE import_id = ? AND (lines > 0 OR done = 1)",
+                (import_id,)
+            ).fetchall()
+        }
+        filled = []
+        for table in tables:
+            if table in started:
+                continue
+            try:
+                if conn.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone():
+                    filled.append(table)
+            except sqlite3.OperationalError:
+                # Tabela ainda não existe no destino
+                continue
+        if filled:
+            raise TargetNotEmptyError(
+                f"O banco de destino já tem linhas em {', '.join(filled)}; importe num banco vazio "
+                "ou use --replace para substituir as linhas com a mesma chave"
+            )
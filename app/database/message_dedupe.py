@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+
+from app.utils.cache import LeaderCancelledError, TTLCache
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_DEDUPE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_messages (
+    message_sid TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    reply TEXT,
+    started_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_processed_messages_expires ON processed_messages (expires_at);
+"""
+
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+_CLAIMED = "claimed"
+
+
+def create_message_dedupe_tables(conn):
+    """Cria a tabela de mensagens já recebidas (idempotência do webhook)"""
+    conn.executescript(MESSAGE_DEDUPE_SCHEMA)
+
+
+class MessageDeduplicator:
+    """Idempotência do webhook pelo ``MessageSid`` da Twilio.
+
+    Nível quente em memória (respostas recentes e futures das mensagens em
+    andamento neste processo) e nível persistido no SQLite, compartilhado entre
+    workers e podado por TTL. Uma repetição de mensagem em andamento aguarda o
+    primeiro resultado; a de uma mensagem concluída recebe a resposta gravada.
+    """
+
+    def __init__(self, pool, ttl=86400, memory_size=10000, memory_ttl=600,
+                 processing_timeout=120, poll_interval=0.2, prune_interval=600):
+        self.pool = pool
+        self.ttl = ttl
+        self.processing_timeout = processing_timeout
+        self.poll_interval = poll_interval
+        self.prune_interval = prune_interval
+        self.memory = TTLCache(max_size=memory_size, ttl=memory_ttl)
+        self._inflight = {}
+        self._prune_task = None
+        self.processed = 0
+        self.memory_hits = 0
+        self.coalesced = 0
+        self.stored_hits = 0
+        self.waited_other_worker = 0
+
+    def ensure_schema(self):
+        """Cria a tabela se ainda não existir"""
+        with self.pool.connection() as conn:
+            create_message_dedupe_tables(conn)
+
+    async def start(self):
+        """Inicia a poda periódica das entradas expiradas"""
+        self._prune_task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        if self._prune_task:
+            self._prune_task.cancel()
+            await asyncio.gather(self._prune_task, return_exceptions=True)
+            self._prune_task = None
+
+    async def process(self, message_sid, compute):
+        """Executa ``compute()`` (corrotina) uma única vez por ``message_sid``"""
+        if not message_sid:
+            return await compute()
+
+        entry = self.memory.get(message_sid)
+        if entry is not None:
+            self.memory_hits += 1
+            return entry[0]
+
+        inflight = self._inflight.get(message_sid)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LeaderCancelledError:
+                # Quem processava foi cancelado (a mensagem foi liberada): assumir o processamento
+                return await self.process(message_sid, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[message_sid] = future
+        try:
+            reply = await self._process_once(message_sid, compute)
+            self.memory.set(message_sid, (reply,))
+            future.set_result(reply)
+            return reply
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita aviso de exceção não recuperada quando ninguém aguardava
+            future.exception()
+            raise
+        finally:
+            del self._inflight[message_sid]
+
+    async def claim(self, message_sid):
+        """Marca a mensagem como recebida; retorna False se ela já tinha sido vista.
+
+        Usado no modo assíncrono, em que a resposta vai pela API REST e a
+        confirmação ao webhook é sempre vazia. Uma mensagem reivindicada deve
+        terminar em ``complete`` (processada pela fila) ou ``release`` (não
+        enfileirada), senão fica em processamento até ``processing_timeout``.
+        """
+        if not message_sid:
+            return True
+        if self.memory.get(message_sid) is not None or message_sid in self._inflight:
+            return False
+        state, _ = await self.pool.run(self._claim, message_sid)
+        self.memory.set(message_sid, (None,))
+        return state == _CLAIMED
+
+    async def complete(self, message_sid, reply=None):
+        """Marca como concluída uma mensagem reivindicada com ``claim``"""
+        if not message_sid:
+            return
+        await self.pool.run(self._complete, message_sid, reply)
+        self.memory.set(message_sid, (reply,))
+        self.processed += 1
+
+    async def release(self, message_sid):
+        """Desfaz o ``claim`` (ex.: fila cheia) para que ``process`` trate a mensagem"""
+        if not message_sid:
+            return
+        self.memory.invalidate(message_sid)
+        await self.pool.run(self._release, message_sid)
+
+    async def _process_once(self, message_sid, compute):
+        waited = False
+        while True:
+            state, reply = await self.pool.run(self._claim, message_sid)
+            if state == STATUS_DONE:
+                self.stored_hits += 1
+                return reply
+            if state == STATUS_PROCESSING:
+                # Outro worker está processando: aguardar o resultado gravado
+                if not waited:
+                    self.waited_other_worker += 1
+                    waited = True
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            try:
+                reply = await compute()
+            except BaseException:
+                # Libera a mensagem para que uma nova tentativa da Twilio a processe
+                await self.pool.run(self._release, message_sid)
+                raise
+            await self.pool.run(self._complete, message_sid, reply)
+            self.processed += 1
+            return reply
+
+    def _claim(self, message_sid):
+        """Reivindica a mensagem; retorna ("claimed" | "processing" | "done", resposta)"""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                "SELECT status, reply, started_at FROM processed_messages "
+                "WHERE message_sid = ? AND expires_at > ?",
+                (message_sid, now)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO processed_messages (message_sid, status, started_at, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (message_sid, STATUS_PROCESSING, now, now + self.ttl)
+                )
+                return _CLAIMED, None
+            if row["status"] == STATUS_DONE:
+                return STATUS_DONE, row["reply"]
+            if row["started_at"] < now - self.processing_timeout:
+                # O worker que reivindicou a mensagem morreu: assumir o processamento
+                logger.warning(f"Reprocessando mensagem {message_sid} abandonada")
+                conn.execute(
+                    "UPDATE processed_messages SET started_at = ? WHERE message_sid = ?",
+                    (now, message_sid)
+                )
+                return _CLAIMED, None
+            return STATUS_PROCESSING, None
+
+    def _complete(self, message_sid, reply):
+        self.pool.execute_query(
+            "UPDATE processed_messages SET status = ?, reply = ? WHERE message_sid = ?",
+            (STATUS_DONE, reply, message_sid)
+        )
+
+    def _release(self, message_sid):
+        self.pool.execute_query(
+            "DELETE FROM processed_messages WHERE message_sid = ? AND status = ?",
+            (message_sid, STATUS_PROCESSING)
+        )
+
+    def prune_expired(self):
+        """Remove do SQLite as mensagens expiradas"""
+        with self.pool.connection() as conn:
+            return conn.execute("DELETE FROM processed_messages WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            try:
+                removed = await self.pool.run(self.prune_expired)
+                if removed:
+                    logger.info(f"{removed} mensagens expiradas removidas da tabela de idempotência")
+            except Exception as e:
+                logger.error(f"Erro ao podar mensagens processadas: {str(e)}")
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "memory_hits": self.memory_hits,
+            "coalesced": self.coalesced,
+            "stored_hits": self.stored_hits,
+            "waited_other_worker": self.waited_other_worker,
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,123 @@
+import importlib
+import logging
+import sqlite3
+import time
+
+from app.database.sharding import reserve_id_ranges
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# (versão, nome, "módulo:função"). A função recebe a conexão e cria suas tabelas;
+# o módulo só é importado quando a migração ainda não foi aplicada. A versão 1
+# (None) é o esquema base do DatabaseManager. Novas migrações entram no final.
+MIGRATIONS = (
+    (1, "base", None),
+    (2, "question_bank", "app.database.question_bank:create_question_bank_tables"),
+    (3, "completion_cache", "app.services.completion_cache:create_completion_cache_tables"),
+    (4, "conversation_context", "app.services.conversation_context:create_conversation_context_tables"),
+    (5, "message_dedupe", "app.database.message_dedupe:create_message_dedupe_tables"),
+    (6, "broadcast", "app.services.lesson_broadcaster:create_broadcast_tables"),
+    (7, "progress_aggregates", "app.database.progress_aggregates:create_progress_tables"),
+    (8, "interaction_archive", "app.database.archive:create_archive_tables"),
+    (9, "media_transcripts", "app.services.media_pipeline:create_media_tables"),
+    (10, "mistake_index", "app.database.mistake_index:create_mistake_tables"),
+    (11, "drop_grammar_accuracy", "app.database.progress_aggregates:drop_grammar_accuracy"),
+    (12, "mistake_pending_reviews", "app.database.mistake_index:add_pending_reviews"),
+    (13, "purge_mistake_false_positives", "app.database.mistake_index:purge_false_positives"),
+    (14, "broadcast_deliveries", "app.services.lesson_broadcaster:create_broadcast_tables"),
+)
+
+
+def create_base_tables(database_path):
+    """Esquema base (usuários, sessões de avaliação, histórico) do DatabaseManager"""
+    from app.database.db_manager import DatabaseManager
+
+    DatabaseManager(database_path).create_tables()
+
+
+def _resolve(target):
+    module_name, function_name = target.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class MigrationRunner:
+    """Aplica as migrações pendentes e registra cada versão em ``schema_version``.
+
+    Com o esquema em dia, ``migrate()`` faz uma única consulta e não executa DDL
+    nem importa os módulos das migrações. Todas as migrações são idempotentes
+    (``CREATE ... IF NOT EXISTS``), então workers iniciando juntos podem aplicá-las
+    ao mesmo tempo sem erro, e bancos anteriores ao runner são adotados na
+    primeira execução.
+    """
+
+    def __init__(self, database_path, migrations=MIGRATIONS, base_schema=create_base_tables):
+        self.database_path = database_path
+        self.migrations = tuple(migrations)
+        self.base_schema = base_schema
+
+    def applied_versions(self, conn):
+        try:
+            return {row[0] for row in conn.execute("SELECT version FROM schema_version").fetchall()}
+        except sqlite3.OperationalError:
+            # Banco novo ou anterior ao controle de versão
+            return set()
+
+    def pending(self):
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            applied = self.applied_versions(conn)
+        finally:
+            conn.close()
+        return [(version, name) for version, name, _ in self.migrations if version not in applied]
+
+    def migrate(self):
+        """Aplica as migrações pendentes em ordem; retorna os nomes aplicados"""
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            applied = self.applied_versions(conn)
+            pending = [migration for migration in self.migrations if migration[0] not in applied]
+            if not pending:
+                return []
+
+            conn.executescript(SCHEMA_VERSION_SCHEMA)
+            names = []
+            for version, name, target in pending:
+                start = time.perf_counter()
+                if target is None:
+                    self.base_schema(self.database_path)
+                else:
+                    _resolve(target)(conn)
+                conn.execute("INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+                conn.commit()
+                names.append(name)
+                logger.info(f"Migração {version} ({name}) aplicada em {(time.perf_counter() - start) * 1000:.0f} ms")
+            return names
+        finally:
+            conn.close()
+
+
+def migrate_databases(database_path, shard_paths=None, base_schema=create_base_tables):
+    """Migra o banco principal e, no modo particionado, cada shard.
+
+    Nos shards, a faixa de ids é reservada sempre que alguma migração é aplicada
+    (ver sharding.reserve_id_ranges). Retorna as migrações aplicadas por arquivo.
+    """
+    applied = {database_path: MigrationRunner(database_path, base_schema=base_schema).migrate()}
+    shard_paths = [path for path in (shard_paths or ()) if path != database_path]
+    for index, path in enumerate(shard_paths):
+        applied[path] = MigrationRunner(path, base_schema=base_schema).migrate()
+        if applied[path]:
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                reserve_id_ranges(conn, index)
+            finally:
+                conn.close()
+    return applied
@@ -0,0 +1,430 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from app.utils.cache import TTLCache
+
+MISTAKE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_mistakes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    original TEXT NOT NULL,
+    corrected TEXT NOT NULL,
+    explanation TEXT,
+    context TEXT,
+    embedding BLOB NOT NULL,
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    interval_days REAL NOT NULL DEFAULT 1,
+    review_due REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_user_mistakes_user ON user_mistakes (user_id, id);
+"""
+
+# Travas da matriz em cache, escolhidas pelo usuário: alunos diferentes não se bloqueiam
+LOCK_STRIPES = 64
+
+DAY = 86400
+MIN_EASE = 1.3
+
+_CATEGORY_LABELS = {
+    "irregular_past": "passado irregular",
+    "subject_verb_agreement": "concordância verbal"
+}
+
+_TOKEN = re.compile(r"[a-z']+")
+
+
+def create_mistake_tables(conn):
+    """Cria a tabela do índice de erros por usuário"""
+    conn.executescript(MISTAKE_SCHEMA)
+
+
+def add_pending_reviews(conn):
+    """Coluna ``shown_at``: erro mostrado numa revisão e ainda sem resposta do aluno"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(user_mistakes)").fetchall()]
+    if "shown_at" not in columns:
+        conn.execute("ALTER TABLE user_mistakes ADD COLUMN shown_at REAL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_mistakes_pending ON user_mistakes (user_id) "
+        "WHERE shown_at IS NOT NULL"
+    )
+
+
+def purge_false_positives(conn):
+    """Remove os erros que as regras corrigidas de gramática não apontam mais.
+
+    A mensagem original (``context``) passa de novo pelo ``check_grammar``; sem
+    ela, o passado irregular ainda é conferido pela tabela de verbos.
+    """
+    from app.services.grammar_check import IRREGULAR_PAST, check_grammar
+
+    stale = []
+    for mistake_id, category, original, context in conn.execute(
+        "SELECT id, category, original, context FROM user_mistakes"
+    ).fetchall():
+        if context:
+            found = {(c.category, c.original.lower()) for c in check_grammar(context)[1]}
+            valid = (category, original.lower()) in found
+        else:
+            valid = category != "irregular_past" or original.lower() in IRREGULAR_PAST
+        if not valid:
+            stale.append((mistake_id,))
+    conn.executemany("DELETE FROM user_mistakes WHERE id = ?", stale)
+
+
+class HashedNgramVectorizer:
+    """Vetorizador local por hashing de n-gramas de palavras e de caracteres.
+
+    Não precisa de vocabulário nem de rede: cada n-grama cai numa das
+    ``dimensions`` posições pelo CRC32, com sinal pelo bit mais alto para que
+    colisões tendam a se cancelar. O vetor é normalizado (produto interno = cosseno).
+    """
+
+    def __init__(self, dimensions=128, char_ngram=3):
+        self.dimensions = dimensions
+        self.char_ngram = char_ngram
+
+    def features(self, text):
+        words = _TOKEN.findall((text or "").lower())
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + self.char_ngram]}" for i in range(len(padded) - self.char_ngram + 1)]
+        return features
+
+    def transform(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self.features(text):
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            vector[hashed % self.dimensions] += 1.0 if hashed & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _UserMistakes:
+    """Erros de um usuário em memória: ids, matriz de embeddings e vencimentos.
+
+    Os arrays têm folga e dobram de capacidade quando enchem, então incluir um
+    erro custa O(1) amortizado; ``ids``, ``matrix`` e ``due`` são views das
+    linhas ocupadas.
+    """
+
+    def __init__(self, ids, matrix, due):
+        self._count = len(ids)
+        self._ids = ids
+        self._matrix = matrix
+        self._due = due
+
+    @property
+    def ids(self):
+        return self._ids[:self._count]
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._count]
+
+    @property
+    def due(self):
+        return self._due[:self._count]
+
+    def append(self, mistake_id, vector, due):
+        if self._count == len(self._ids):
+            self._grow(max(8, 2 * self._count))
+        self._ids[self._count] = mistake_id
+        self._matrix[self._count] = vector
+        self._due[self._count] = due
+        self._count += 1
+
+    def _grow(self, capacity):
+        ids = np.zeros(capacity, dtype=self._ids.dtype)
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=self._matrix.dtype)
+        due = np.zeros(capacity, dtype=self._due.dtype)
+        ids[:self._count] = self.ids
+        matrix[:self._count] = self.matrix
+        due[:self._count] = self.due
+        self._ids, self._matrix, self._due = ids, matrix, due
+
+    def position(self, mistake_id):
+        positions = np.flatnonzero(self.ids == mistake_id)
+        return int(positions[0]) if len(positions) else None
+
+
+def mistake_text(category, original, corrected):
+    """Texto embutido de uma correção (categoria e as duas formas)"""
+    return f"{category.replace('_', ' ')} {original} {corrected}"
+
+
+def format_review(mistakes):
+    """Seção de revisão anexada às lições e práticas enviadas pelo WhatsApp"""
+    lines = ["🔁 *Revisão dos seus erros*"]
+    for mistake in mistakes:
+        label = _CATEGORY_LABELS.get(mistake["category"], mistake["category"])
+        lines.append(f"• ~{mistake['original']}~ → *{mistake['corrected']}* ({label})")
+    lines.append("Use as formas corretas nas suas próximas mensagens: a revisão só avança quando você acerta.")
+    return "\n".join(lines)
+
+
+def uses_phrase(text, phrase):
+    """``phrase`` aparece em ``text`` como sequência de palavras inteiras"""
+    words = " ".join(_TOKEN.findall((phrase or "").lower()))
+    return bool(words) and f" {words} " in f" {' '.join(_TOKEN.findall((text or '').lower()))} "
+
+
+def prompt_context(mistakes):
+    """Trecho para prompts de lição/prática com os erros mais relevantes do aluno"""
+    if not mistakes:
+        return ""
+    lines = ["The student often makes these mistakes (wrong -> right):"]
+    for mistake in mistakes:
+        lines.append(
+            f"- {mistake['original']} -> {mistake['corrected']} "
+            f"({mistake['category']}, {mistake['occurrences']}x)"
+        )
+    return "\n".join(lines)
+
+
+class MistakeIndex:
+    """Índice de erros por usuário com busca por similaridade e revisão espaçada.
+
+    Cada correção vira uma linha com o embedding em float16 (256 bytes com 128
+    dimensões). Na primeira consulta de um usuário os embeddings são carregados
+    numa matriz float32 mantida em cache; a busca é um produto matriz-vetor e um
+    ``argpartition``. Uma correção muito parecida com um erro já indexado conta
+    como recaída (volta o intervalo para um dia). Erros mostrados numa revisão
+    ficam pendentes (``shown_at``) e só têm o intervalo ampliado no estilo SM-2
+    quando o aluno usa a forma correta numa mensagem seguinte; sem resposta,
+    voltam a aparecer no dia seguinte com o mesmo intervalo.
+
+    O cache é local ao processo: com vários workers, erros gravados por outro
+    processo aparecem depois de ``cache_ttl`` segundos.
+    """
+
+    def __init__(self, pool, vectorizer=None, repeat_threshold=0.85, cache_size=2000, cache_ttl=300):
+        self.pool = pool
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.repeat_threshold = repeat_threshold
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        # Protegem a matriz em cache de cada usuário, que cresce a cada erro novo
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def ensure_schema(self):
+        """Cria a tabela se ainda não existir"""
+        with self.pool.connection() as conn:
+            create_mistake_tables(conn)
+            add_pending_reviews(conn)
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % LOCK_STRIPES]
+
+    def clear(self):
+        """Esvazia o cache em memória"""
+        self.cache.clear()
+
+    def _load(self, user_id):
+        entry = self.cache.get(user_id)
+        if entry is not None:
+            return entry
+        rows = self.pool.fetch_all(
+            "SELECT id, embedding, review_due FROM user_mistakes WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+        dimensions = self.vectorizer.dimensions
+        if rows:
+            matrix = np.frombuffer(b"".join(row["embedding"] for row in rows), dtype=np.float16)
+            matrix = matrix.reshape(len(rows), dimensions).astype(np.float32)
+        else:
+            matrix = np.zeros((0, dimensions), dtype=np.float32)
+        entry = _UserMistakes(
+            np.fromiter((row["id"] for row in rows), dtype=np.int64, count=len(rows)),
+            matrix,
+            np.fromiter((row["review_due"] for row in rows), dtype=np.float64, count=len(rows))
+        )
+        self.cache.set(user_id, entry)
+        return entry
+
+    # -- Gravação ----------------------------------------------------------
+
+    def record(self, user_id, category, original, corrected, explanation=None, context=None, now=None):
+        """Indexa uma correção; retorna o id do erro (novo ou a recaída de um existente)"""
+        now = now or time.time()
+        vector = self.vectorizer.transform(mistake_text(category, original, corrected))
+        with self._lock_for(user_id):
+            entry = self._load(user_id)
+            if len(entry.ids):
+                scores = entry.matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.repeat_threshold:
+                    mistake_id = int(entry.ids[best])
+                    # Recaída: o erro volta para revisão no dia seguinte (e responde a revisão pendente)
+                    self.pool.execute_query(
+                        "UPDATE user_mistakes SET occurrences = occurrences + 1, repetitions = 0, "
+                        "ease = MAX(?, ease - 0.2), interval_days = 1, review_due = ?, last_seen = ?, "
+                        "shown_at = NULL WHERE id = ?",
+                        (MIN_EASE, now + DAY, now, mistake_id)
+                    )
+                    entry.due[best] = now + DAY
+                    return mistake_id
+
+            mistake_id = self.pool.execute_query(
+                "INSERT INTO user_mistakes (user_id, category, original, corrected, explanation, context, "
+                "embedding, review_due, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, category, original, corrected, explanation, context,
+                 vector.astype(np.float16).tobytes(), now + DAY, now)
+            )
+            entry.append(mistake_id, vector, now + DAY)
+            return mistake_id
+
+    def record_corrections(self, user_id, corrections, context=None, now=None):
+        """Indexa as correções do ``check_grammar`` (a categoria vem da regra)"""
+        return [
+            self.record(user_id, correction.category, correction.original, correction.corrected,
+                        correction.explanation, context, now)
+            for correction in corrections
+        ]
+
+    async def arecord_corrections(self, user_id, corrections, context=None, now=None):
+        return await self.pool.run(self.record_corrections, user_id, corrections, context, now)
+
+    def record_message(self, user_id, text, corrections=(), now=None):
+        """Indexa as correções de uma mensagem do aluno e corrige as revisões pendentes.
+
+        Um erro pendente repetido na mensagem é uma recaída (``record``); um erro
+        pendente cuja forma correta aparece na mensagem conta como acerto.
+        Retorna os ids acertados.
+        """
+        now = now or time.time()
+        self.record_corrections(user_id, corrections, context=text, now=now)
+        pending = self.pool.fetch_all(
+            "SELECT id, corrected FROM user_mistakes WHERE user_id = ? AND shown_at IS NOT NULL", (user_id,)
+        )
+        answered = [row["id"] for row in pending if uses_phrase(text, row["corrected"])]
+        if answered:
+            self.review(user_id, answered, correct=True, now=now)
+        return answered
+
+    async def arecord_message(self, user_id, text, corrections=(), now=None):
+        return await self.pool.run(self.record_message, user_id, text, corrections, now)
+
+    def mark_shown(self, user_id, mistake_ids, now=None):
+        """Marca os erros mostrados numa revisão como pendentes, sem ampliar o intervalo.
+
+        Voltam a vencer no dia seguinte, para não aparecerem em toda lição do dia.
+        """
+        now = now or time.time()
+        if not mistake_ids:
+            return
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "UPDATE user_mistakes SET shown_at = ?, review_due = ? WHERE id = ?",
+                [(now, now + DAY, mistake_id) for mistake_id in mistake_ids]
+            )
+        self._set_due(user_id, [(mistake_id, now + DAY) for mistake_id in mistake_ids])
+
+    async def amark_shown(self, user_id, mistake_ids, now=None):
+        await self.pool.run(self.mark_shown, user_id, mistake_ids, now)
+
+    def review(self, user_id, mistake_ids, correct=True, now=None):
+        """Atualiza o agendamento dos erros respondidos pelo aluno (SM-2 simplificado)"""
+        now = now or time.time()
+        rows = self._fetch(mistake_ids)
+        updates = []
+        for row in rows:
+            if correct:
+                repetitions = row["repetitions"] + 1
+                ease = row["ease"]
+                interval = 1 if repetitions == 1 else 3 if repetitions == 2 else row["interval_days"] * ease
+            else:
+                repetitions, ease, interval = 0, max(MIN_EASE, row["ease"] - 0.2), 1
+            updates.append((repetitions, ease, interval, now + interval * DAY, row["id"]))
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "UPDATE user_mistakes SET repetitions = ?, ease = ?, interval_days = ?, review_due = ?, "
+                "shown_at = NULL WHERE id = ?",
+                updates
+            )
+        self._set_due(user_id, [(mistake_id, due) for _, _, _, due, mistake_id in updates])
+
+    def _set_due(self, user_id, dues):
+        """Atualiza os vencimentos na matriz em cache (se o usuário estiver carregado)"""
+        with self._lock_for(user_id):
+            entry = self.cache.get(user_id)
+            if entry is None:
+                return
+            for mistake_id, due in dues:
+                position = entry.position(mistake_id)
+                if position is not None:
+                    entry.due[position] = due
+
+    async def areview(self, user_id, mistake_ids, correct=True, now=None):
+        await self.pool.run(self.review, user_id, mistake_ids, correct, now)
+
+    # -- Busca -------------------------------------------------------------
+
+    def similar(self, user_id, text, k=5):
+        """Os ``k`` erros mais parecidos com ``text``, como lista de (id, similaridade)"""
+        query = self.vectorizer.transform(text)
+        with self._lock_for(user_id):
+            entry = self._load(user_id)
+            if not len(entry.ids):
+                return []
+            scores = entry.matrix @ query
+            top = self._top_k(scores, k)
+            return [(int(entry.ids[i]), float(scores[i])) for i in top]
+
+    def relevant(self, user_id, text, k=3):
+        """Linhas dos ``k`` erros mais parecidos com ``text`` (para ``prompt_context``)"""
+        return self._fetch([mistake_id for mistake_id, _ in self.similar(user_id, text, k)])
+
+    async def arelevant(self, user_id, text, k=3):
+        return await self.pool.run(self.relevant, user_id, text, k)
+
+    def select_for_review(self, user_id, text=None, k=3, now=None):
+        """Erros vencidos para revisar, priorizando atraso e semelhança com ``text``"""
+        now = now or time.time()
+        query = self.vectorizer.transform(text) if text else None
+        with self._lock_for(user_id):
+            entry = self._load(user_id)
+            due = entry.due <= now
+            if not due.any():
+                return []
+            scores = np.log1p((now - entry.due) / DAY)
+            if query is not None:
+                scores = scores + entry.matrix @ query
+            scores = np.where(due, scores, -np.inf)
+            top = self._top_k(scores, min(k, int(due.sum())))
+            mistake_ids = [int(entry.ids[i]) for i in top]
+        return self._fetch(mistake_ids)
+
+    async def aselect_for_review(self, user_id, text=None, k=3, now=None):
+        return await self.pool.run(self.select_for_review, user_id, text, k, now)
+
+    @staticmethod
+    def _top_k(scores, k):
+        if k <= 0:
+            return []
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates])]
+
+    def _fetch(self, mistake_ids):
+        """Linhas dos erros na ordem dos ids pedidos"""
+        if not mistake_ids:
+            return []
+        placeholders = ", ".join("?" for _ in mistake_ids)
+        rows = self.pool.fetch_all(
+            "SELECT id, category, original, corrected, explanation, occurrences, repetitions, ease, "
+            f"interval_days, review_due FROM user_mistakes WHERE id IN ({placeholders})",
+            list(mistake_ids)
+        )
+        by_id = {row["id"]: row for row in rows}
+        return [by_id[mistake_id] for mistake_id in mistake_ids if mistake_id in by_id]
@@ -0,0 +1,217 @@
+from datetime import date, timedelta
+
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_progress (
+    user_id INTEGER PRIMARY KEY,
+    interactions INTEGER NOT NULL DEFAULT 0,
+    lessons_completed INTEGER NOT NULL DEFAULT 0,
+    practice_sessions INTEGER NOT NULL DEFAULT 0,
+    assessments_completed INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    last_active_date TEXT,
+    current_level TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_skill_accuracy (
+    user_id INTEGER NOT NULL,
+    skill TEXT NOT NULL,
+    correct INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, skill)
+);
+
+CREATE TABLE IF NOT EXISTS user_level_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_level_history_user ON user_level_history (user_id, id);
+"""
+
+# Tipos de interação contabilizados nos agregados
+KIND_CONVERSATION = "conversation"
+KIND_LESSON = "lesson"
+KIND_PRACTICE = "practice"
+KIND_ASSESSMENT = "assessment"
+
+_KIND_COLUMNS = {
+    KIND_LESSON: "lessons_completed",
+    KIND_PRACTICE: "practice_sessions",
+    KIND_ASSESSMENT: "assessments_completed"
+}
+
+_SKILL_LABELS = {
+    "grammar": "Gramática",
+    "vocabulary": "Vocabulário",
+    "reading": "Leitura",
+    "assessment": "Avaliação"
+}
+
+
+def classify_message(body):
+    """Tipo de interação a partir da mensagem do aluno"""
+    command = (body or "").strip().split(" ", 1)[0].lower()
+    if command == "/licao":
+        return KIND_LESSON
+    if command == "/pratica":
+        return KIND_PRACTICE
+    return KIND_CONVERSATION
+
+
+def create_progress_tables(conn):
+    """Cria as tabelas de agregados de progresso"""
+    conn.executescript(PROGRESS_SCHEMA)
+
+
+def drop_grammar_accuracy(conn):
+    """Remove a "acurácia gramatical" gravada pelas versões anteriores.
+
+    Ela vinha das regras locais de gramática, que não medem acerto do aluno
+    (falsos positivos contavam como erro), e deixou de ser mostrada.
+    """
+    conn.execute("DELETE FROM user_skill_accuracy WHERE skill = 'grammar'")
+
+
+def _next_streak(row, day):
+    """Sequência de dias ativos após uma interação em ``day`` (data ISO)"""
+    if row is None or not row["last_active_date"]:
+        return 1
+    last = date.fromisoformat(row["last_active_date"])
+    current = date.fromisoformat(day)
+    if current <= last:
+        return row["current_streak"]
+    if current - last == timedelta(days=1):
+        return row["current_streak"] + 1
+    return 1
+
+
+def apply_interaction(conn, user_id, kind=KIND_CONVERSATION, day=None, level=None, skills=()):
+    """Atualiza os agregados de uma interação usando a conexão (e transação) do chamador.
+
+    ``skills`` é uma sequência de ``(skill, correct)``. Deve ser chamada na mesma
+    transação que grava a interação para que histórico e agregados nunca divirjam.
+    """
+    day = day or date.today().isoformat()
+    row = conn.execute(
+        "SELECT current_streak, longest_streak, last_active_date, current_level "
+        "FROM user_progress WHERE user_id = ?",
+        (user_id,)
+    ).fetchone()
+    streak = _next_streak(row, day)
+    last_active = max(day, row["last_active_date"] or day) if row else day
+    kind_column = _KIND_COLUMNS.get(kind)
+
+    conn.execute(
+        "INSERT INTO user_progress (user_id, interactions, current_streak, longest_streak, "
+        "last_active_date, current_level) VALUES (?, 1, ?, ?, ?, ?) "
+        "ON CONFLICT (user_id) DO UPDATE SET interactions = interactions + 1, "
+        "current_streak = excluded.current_streak, "
+        "longest_streak = MAX(longest_streak, excluded.current_streak), "
+        "last_active_date = excluded.last_active_date, "
+        "current_level = COALESCE(excluded.current_level, current_level), "
+        "updated_at = CURRENT_TIMESTAMP",
+        (user_id, streak, streak, last_active, level)
+    )
+    if kind_column:
+        conn.execute(
+            f"UPDATE user_progress SET {kind_column} = {kind_column} + 1 WHERE user_id = ?",
+            (user_id,)
+        )
+    if level and (row is None or row["current_level"] != level):
+        conn.execute(
+            "INSERT INTO user_level_history (user_id, level, changed_at) VALUES (?, ?, ?)",
+            (user_id, level, day)
+        )
+    if skills:
+        conn.executemany(
+            "INSERT INTO user_skill_accuracy (user_id, skill, correct, total) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (user_id, skill) DO UPDATE SET correct = correct + excluded.correct, "
+            "total = total + 1",
+            [(user_id, skill, int(bool(correct))) for skill, correct in skills]
+        )
+
+
+def format_progress(progress):
+    """Monta a resposta do /progresso a partir dos agregados"""
+    lines = [
+        "📊 *Seu progresso*",
+        "",
+        f"🎯 Nível atual: {progress['current_level'] or 'não avaliado'}",
+        f"📚 Lições concluídas: {progress['lessons_completed']}",
+        f"🗣️ Práticas: {progress['practice_sessions']}",
+        f"📝 Avaliações concluídas: {progress['assessments_completed']}",
+        f"💬 Mensagens trocadas: {progress['interactions']}",
+        f"🔥 Sequência atual: {progress['current_streak']} dia(s) (recorde: {progress['longest_streak']})"
+    ]
+    if progress["skills"]:
+        lines += ["", "✅ *Acertos por habilidade*"]
+        for skill in progress["skills"]:
+            accuracy = skill["correct"] * 100 // skill["total"] if skill["total"] else 0
+            label = _SKILL_LABELS.get(skill["skill"], skill["skill"])
+            lines.append(f"• {label}: {accuracy}% ({skill['correct']}/{skill['total']})")
+    if len(progress["level_history"]) > 1:
+        lines += ["", "📈 Evolução: " + " → ".join(entry["level"] for entry in progress["level_history"])]
+    return "\n".join(lines)
+
+
+class ProgressAggregates:
+    """Agregados de progresso por usuário, mantidos incrementalmente.
+
+    O ``/progresso`` deixa de varrer o histórico: é uma busca pela chave primária
+    em ``user_progress`` mais as linhas do usuário nas tabelas de habilidades e
+    de níveis, todas indexadas por ``user_id``.
+    """
+
+    def __init__(self, pool, level_history_limit=10):
+        self.pool = pool
+        self.level_history_limit = level_history_limit
+
+    def ensure_schema(self):
+        """Cria as tabelas se ainda não existirem"""
+        with self.pool.connection() as conn:
+            create_progress_tables(conn)
+
+    def record(self, user_id, kind=KIND_CONVERSATION, day=None, level=None, skills=(),
+               interaction_query=None, interaction_params=()):
+        """Grava a interação (opcional) e atualiza os agregados na mesma transação"""
+        with self.pool.transaction() as conn:
+            if interaction_query:
+                conn.execute(interaction_query, interaction_params)
+            apply_interaction(conn, user_id, kind, day, level, skills)
+
+    async def arecord(self, user_id, kind=KIND_CONVERSATION, day=None, level=None, skills=(),
+                      interaction_query=None, interaction_params=()):
+        """Versão assíncrona de record, executada no pool de threads do banco"""
+        await self.pool.run(self.record, user_id, kind, day, level, skills, interaction_query, interaction_params)
+
+    def get(self, user_id):
+        """Agregados do usuário ou None se ele ainda não tem interações"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            skills = conn.execute(
+                "SELECT skill, correct, total FROM user_skill_accuracy WHERE user_id = ? ORDER BY skill",
+                (user_id,)
+            ).fetchall()
+            history = conn.execute(
+                "SELECT level, changed_at FROM user_level_history WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, self.level_history_limit)
+            ).fetchall()
+        progress = dict(row)
+        progress["skills"] = [dict(skill) for skill in skills]
+        progress["level_history"] = [dict(entry) for entry in reversed(history)]
+        return progress
+
+    async def aget(self, user_id):
+        return await self.pool.run(self.get, user_id)
+
+    def clear(self):
+        """Apaga todos os agregados (usado antes de uma reconstrução completa)"""
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM user_progress")
+            conn.execute("DELETE FROM user_skill_accuracy")
+            conn.execute("DELETE FROM user_level_history")
@@ -0,0 +1,145 @@
+import json
+
+CEFR_LEVELS = ("A1", "A2", "B1", "B2", "C1", "C2")
+ITEM_KINDS = ("lesson", "practice", "assessment_question")
+
+QUESTION_BANK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS question_bank (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    level TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_question_bank_level_kind
+    ON question_bank (level, kind, id);
+
+CREATE TABLE IF NOT EXISTS question_bank_cursor (
+    user_key TEXT NOT NULL,
+    level TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    last_item_id INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_key, level, kind)
+);
+"""
+
+_NEXT_ITEMS = """
+SELECT id, level, kind, topic, content FROM question_bank
+WHERE level = ? AND kind = ? AND id > COALESCE(
+    (SELECT last_item_id FROM question_bank_cursor WHERE user_key = ? AND level = ? AND kind = ?), 0)
+ORDER BY id LIMIT ?
+"""
+
+_ADVANCE_CURSOR = """
+INSERT INTO question_bank_cursor (user_key, level, kind, last_item_id) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_key, level, kind)
+DO UPDATE SET last_item_id = excluded.last_item_id, updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def create_question_bank_tables(conn):
+    """Cria as tabelas do banco de lições e perguntas"""
+    conn.executescript(QUESTION_BANK_SCHEMA)
+
+
+class QuestionBank:
+    """Banco de lições e perguntas pré-geradas, indexado por nível CEFR e tipo.
+
+    Cada usuário tem um cursor por (nível, tipo) que aponta para o último item
+    servido; o próximo item é uma busca indexada ``id > cursor``, então o custo
+    não cresce com o histórico e nenhum item se repete para o mesmo usuário.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def ensure_schema(self):
+        """Cria as tabelas se ainda não existirem"""
+        with self.pool.connection() as conn:
+            create_question_bank_tables(conn)
+
+    def add_items(self, items):
+        """Insere itens ``{"level", "kind", "topic", "content"}`` em uma transação"""
+        return self.pool.executemany(
+            "INSERT INTO question_bank (level, kind, topic, content) VALUES (?, ?, ?, ?)",
+            [
+                (item["level"], item["kind"], item["topic"], json.dumps(item["content"], ensure_ascii=False))
+                for item in items
+            ]
+        )
+
+    def next_item(self, user_key, level, kind):
+        """Retorna o próximo item inédito para o usuário ou None se o banco do nível acabou"""
+        with self.pool.transaction() as conn:
+            row = conn.execute(_NEXT_ITEMS, (level, kind, user_key, level, kind, 1)).fetchone()
+            if row is None:
+                return None
+            conn.execute(_ADVANCE_CURSOR, (user_key, level, kind, row["id"]))
+        item = dict(row)
+        item["content"] = json.loads(item["content"])
+        return item
+
+    async def anext_item(self, user_key, level, kind):
+        """Versão assíncrona de next_item"""
+        return await self.pool.run(self.next_item, user_key, level, kind)
+
+    def assessment_questions(self, user_key, count, levels=CEFR_LEVELS):
+        """Perguntas inéditas de avaliação, da mais fácil à mais difícil, espalhadas por ``levels``.
+
+        Retorna a lista no formato do ``questions_data`` (com o nível de cada
+        pergunta) ou None, sem avançar nenhum cursor, se faltar pergunta em algum nível.
+        """
+        wanted = {}
+        for i in range(count):
+            level = levels[i * len(levels) // count]
+            wanted[level] = wanted.get(level, 0) + 1
+        questions = []
+        with self.pool.transaction() as conn:
+            rows_by_level = {}
+            for level, amount in wanted.items():
+                rows = conn.execute(
+                    _NEXT_ITEMS, (level, "assessment_question", user_key, level, "assessment_question", amount)
+                ).fetchall()
+                if len(rows) < amount:
+                    return None
+                rows_by_level[level] = rows
+            for level, rows in rows_by_level.items():
+                conn.execute(_ADVANCE_CURSOR, (user_key, level, "assessment_question", rows[-1]["id"]))
+                questions.extend(dict(json.loads(row["content"]), level=level) for row in rows)
+        return questions
+
+    async def aassessment_questions(self, user_key, count, levels=CEFR_LEVELS):
+        """Versão assíncrona de assessment_questions"""
+        return await self.pool.run(self.assessment_questions, user_key, count, levels)
+
+    def count(self, level=None, kind=None):
+        """Quantidade de itens armazenados, opcionalmente por nível e tipo"""
+        query = "SELECT COUNT(*) AS total FROM question_bank WHERE 1 = 1"
+        params = []
+        if level:
+            query += " AND level = ?"
+            params.append(level)
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        return self.pool.fetch_one(query, params)["total"]
+
+
+def format_item(item):
+    """Converte um item do banco no texto enviado pelo WhatsApp"""
+    content = item["content"]
+    if item["kind"] == "lesson":
+        parts = [f"📚 *{content.get('title', item['topic'])}*", content.get("explanation", "")]
+        examples = content.get("examples") or []
+        if examples:
+            parts.append("\n".join(f"• {example}" for example in examples))
+        if content.get("exercise"):
+            parts.append(f"✍️ {content['exercise']}")
+        return "\n\n".join(part for part in parts if part)
+    if item["kind"] == "assessment_question":
+        lines = [content.get("question", "")]
+        lines.extend(content.get("options") or [])
+        return "\n".join(lines)
+    return content.get("prompt") or content.get("text", "")
@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Faixa de ids reservada para cada shard: ids novos continuam únicos entre os arquivos
+ID_STRIDE = 10 ** 12
+
+# Métodos executados em todos os shards (criação de tabelas e manutenção)
+FAN_OUT_METHODS = ("create_tables", "init_database", "ensure_schema", "clear", "close")
+
+# Chaves nomeadas que identificam o usuário em uma chamada
+_PHONE_KWARGS = ("phone_number", "phone", "sender", "user_key")
+_USER_ID_KWARGS = ("user_id",)
+
+# SQL livre (execute_query etc.): não há chave na chamada, vale o shard da mensagem atual
+_RAW_SQL_METHODS = ("execute_query", "executemany", "fetch_one", "fetch_all")
+
+_current_key = ContextVar("shard_key", default=None)
+
+
+class ShardRoutingError(RuntimeError):
+    """Chamada de escopo de usuário sem telefone para escolher o shard"""
+
+
+def normalize_phone(phone_number):
+    """Apenas os dígitos do telefone (``whatsapp:+55 11...`` e ``5511...`` são o mesmo usuário)"""
+    return re.sub(r"\D", "", phone_number or "")
+
+
+def shard_for(phone_number, shard_count):
+    """Índice do shard do telefone: hash estável entre processos e reinicializações"""
+    if shard_count <= 1:
+        return 0
+    digest = hashlib.blake2b(normalize_phone(phone_number).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def shard_paths(database_path, shard_count):
+    """Arquivos dos shards: ``users.db`` vira ``users.shard-00-of-04.db`` e assim por diante.
+
+    O número total de shards faz parte do nome, então uma redistribuição para
+    outra quantidade grava arquivos novos sem tocar nos atuais.
+    """
+    if shard_count <= 1:
+        return [database_path]
+    root, ext = os.path.splitext(database_path)
+    return [f"{root}.shard-{index:02d}-of-{shard_count:02d}{ext or '.db'}" for index in range(shard_count)]
+
+
+@contextmanager
+def routed(phone_number):
+    """Associa as chamadas sem telefone explícito (por ``user_id`` ou SQL) ao shard deste usuário"""
+    token = _current_key.set(phone_number)
+    try:
+        yield
+    finally:
+        _current_key.reset(token)
+
+
+def current_phone():
+    return _current_key.get()
+
+
+def next_id_generation(conns):
+    """Primeira faixa de ids acima de tudo o que já foi usado nos bancos (0 se estão vazios).
+
+    Numa redistribuição as linhas mantêm os ids antigos, que vêm das faixas dos
+    shards de origem e caem em qualquer destino. Os destinos então passam a gerar
+    ids a partir de ``(geração + índice) * ID_STRIDE``, acima de todos os antigos.
+    """
+    highest = 0
+    for conn in conns:
+        try:
+            row = conn.execute("SELECT MAX(seq) FROM sqlite_sequence").fetchone()
+        except sqlite3.OperationalError:
+            # Sem tabelas AUTOINCREMENT ainda não existe sqlite_sequence
+            continue
+        highest = max(highest, row[0] or 0)
+    return highest // ID_STRIDE + 1 if highest else 0
+
+
+def reserve_id_ranges(conn, index, generation=0):
+    """Faz as tabelas AUTOINCREMENT do shard ``index`` gerarem ids a partir de ``(generation + index) * ID_STRIDE``"""
+    floor = (generation + index) * ID_STRIDE
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'"
+        ).fetchall()
+    ]
+    if not tables or floor == 0:
+        return
+    with conn:
+        for table in tables:
+            updated = conn.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (floor, table)
+            ).rowcount
+            if not updated:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, floor))
+
+
+class ShardRouter:
+    """Encaminha as chamadas de um serviço para a instância do shard certo.
+
+    Recebe uma instância por shard (``DatabaseManager``, ``ProgressAggregates``...)
+    e escolhe o destino pela chamada:
+
+    * ``FAN_OUT_METHODS`` rodam em todos os shards;
+    * telefone (primeiro argumento texto ou ``phone_number=``) decide pelo hash;
+    * ``user_id`` e SQL livre usam o shard do telefone associado com ``routed()``.
+    """
+
+    def __init__(self, instances):
+        self.instances = list(instances)
+        self.shard_count = len(self.instances)
+
+    def instance_for(self, phone_number):
+        return self.instances[shard_for(phone_number, self.shard_count)]
+
+    def _bound_instance(self, name):
+        phone_number = _current_key.get()
+        if phone_number is None:
+            raise ShardRoutingError(f"{name}: chamada sem telefone fora de routed()")
+        return self.instance_for(phone_number)
+
+    def _route(self, name, args, kwargs):
+        if name in _RAW_SQL_METHODS:
+            return self._bound_instance(name)
+        for key in _PHONE_KWARGS:
+            if isinstance(kwargs.get(key), str):
+                return self.instance_for(kwargs[key])
+        if args and isinstance(args[0], str):
+            return self.instance_for(args[0])
+        return self._bound_instance(name)
+
+    def __getattr__(self, name):
+        attr = getattr(self.instances[0], name)
+        if not callable(attr):
+            return attr
+
+        if name in FAN_OUT_METHODS:
+            def fan_out(*args, **kwargs):
+                return [getattr(instance, name)(*args, **kwargs) for instance in self.instances]
+            return fan_out
+
+        def routed_call(*args, **kwargs):
+            return getattr(self._route(name, args, kwargs), name)(*args, **kwargs)
+        return routed_call
+
+
+class ShardedDatabaseManager(ShardRouter):
+    """``DatabaseManager`` particionado por hash do telefone em vários arquivos SQLite"""
+
+    def __init__(self, managers, paths):
+        super().__init__(managers)
+        self.paths = list(paths)
+
+    def get_user_by_phone(self, phone_number):
+        return self.instance_for(phone_number).get_user_by_phone(phone_number)
+
+    def get_assessment_session(self, user_id):
+        return self._bound_instance("get_assessment_session").get_assessment_session(user_id)
+
+    def create_tables(self):
+        """Cria as tabelas em todos os shards e reserva a faixa de ids de cada um"""
+        for manager in self.instances:
+            manager.create_tables()
+        self.reserve_id_ranges()
+
+    def init_database(self):
+        for manager in self.instances:
+            manager.init_database()
+        self.reserve_id_ranges()
+
+    def reserve_id_ranges(self):
+        for index, path in enumerate(self.paths):
+            conn = sqlite3.connect(path)
+            try:
+                reserve_id_ranges(conn, index)
+            finally:
+                conn.close()
+
+
+def per_shard(instances):
+    """A própria instância quando há um único shard; senão um ``ShardRouter``"""
+    instances = list(instances)
+    return instances[0] if len(instances) == 1 else ShardRouter(instances)
@@ -0,0 +1,194 @@
+import logging
+import re
+import threading
+import time
+
+from app.database.sharding import ShardRoutingError, current_phone, shard_for
+
+logger = logging.getLogger(__name__)
+
+# Tabelas append-only cujos INSERTs via execute_query vão para o buffer
+BUFFERED_TABLES = ("interactions",)
+
+# Métodos que leem essas tabelas: gravam antes o que estiver pendente
+_HISTORY_TOPICS = ("interaction", "history", "progress", "conversation")
+
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+INTO\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+class WriteBehindBuffer:
+    """Buffer write-behind para escritas append-only (histórico e progresso).
+
+    As escritas são acumuladas em memória e gravadas em uma única transação a
+    cada ``max_rows`` linhas ou ``max_delay_ms`` milissegundos, o que vier
+    primeiro. Leituras de um usuário devem chamar ``sync(key)`` antes de
+    consultar o banco para enxergar as próprias escritas pendentes.
+    """
+
+    def __init__(self, pool, max_rows=200, max_delay_ms=50):
+        self.pool = pool
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []
+        self._pending_keys = {}
+        self._inflight_keys = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.batches = 0
+        self.rows_written = 0
+        self.max_batch_size = 0
+        self.failed_rows = 0
+        self.total_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def add(self, query, params=(), key=None):
+        """Enfileira uma escrita; ``key`` identifica o usuário para leitura das próprias escritas"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Buffer de escrita encerrado")
+            self._pending.append((query, tuple(params), key))
+            if key is not None:
+                self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+            full = len(self._pending) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def has_pending(self, key):
+        """Indica se há escritas pendentes para a chave"""
+        with self._lock:
+            return key in self._pending_keys or key in self._inflight_keys
+
+    def sync(self, key=None):
+        """Grava as escritas pendentes (de todos) se a chave tiver algo pendente"""
+        if key is None or self.has_pending(key):
+            self.flush()
+
+    async def async_sync(self, key=None):
+        """Versão assíncrona de sync, executada no pool de threads do banco"""
+        if key is None or self.has_pending(key):
+            await self.pool.run(self.flush)
+
+    def flush(self):
+        """Grava todas as escritas pendentes em uma única transação"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                # Chaves do lote em gravação continuam "pendentes" até o commit
+                self._inflight_keys, self._pending_keys = self._pending_keys, {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                with self.pool.transaction() as conn:
+                    for query, params in self._group(batch):
+                        conn.executemany(query, params)
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de {len(batch)} escritas, tentando uma a uma: {str(e)}")
+                self._write_individually(batch)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._inflight_keys = {}
+
+            self.batches += 1
+            self.rows_written += len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.total_flush_seconds += elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return len(batch)
+
+    @staticmethod
+    def _group(batch):
+        """Agrupa escritas consecutivas com o mesmo SQL preservando a ordem"""
+        groups = []
+        for query, params, _ in batch:
+            if groups and groups[-1][0] == query:
+                groups[-1][1].append(params)
+            else:
+                groups.append((query, [params]))
+        return groups
+
+    def _write_individually(self, batch):
+        """Isola linhas inválidas para que não descartem o lote inteiro"""
+        for query, params, key in batch:
+            try:
+                self.pool.execute_query(query, params)
+            except Exception as e:
+                self.failed_rows += 1
+                logger.error(f"Escrita descartada (chave {key}): {str(e)}")
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro no flush do buffer de escrita: {str(e)}")
+
+    def close(self):
+        """Encerra o buffer gravando tudo o que estiver pendente"""
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Métricas de tamanho de lote e latência de flush"""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "avg_batch_size": self.rows_written / self.batches if self.batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "failed_rows": self.failed_rows,
+            "avg_flush_ms": self.total_flush_seconds * 1000 / self.batches if self.batches else 0,
+            "max_flush_ms": self.max_flush_seconds * 1000
+        }
+
+
+class WriteBufferedManager:
+    """Encaminha as escritas de histórico do ``DatabaseManager`` para o buffer.
+
+    ``execute_query`` com ``INSERT INTO`` numa das ``tables`` é enfileirado no
+    buffer do shard da mensagem atual (ver ``sharding.routed``) e retorna None;
+    os demais comandos passam direto. Antes de qualquer método que leia histórico
+    ou progresso, as escritas pendentes do usuário são gravadas.
+    """
+
+    def __init__(self, db_manager, buffers, tables=BUFFERED_TABLES):
+        self.db_manager = db_manager
+        self.buffers = list(buffers)
+        self.tables = tuple(tables)
+
+    def buffer(self):
+        """Buffer do shard do usuário da mensagem atual"""
+        phone_number = current_phone()
+        if phone_number is None and len(self.buffers) > 1:
+            raise ShardRoutingError("escrita de histórico fora de routed()")
+        return self.buffers[shard_for(phone_number, len(self.buffers))]
+
+    def execute_query(self, query, params=()):
+        match = _INSERT_TABLE.match(query)
+        if match and match.group(1).lower() in self.tables:
+            self.buffer().add(query, params, key=current_phone())
+            return None
+        return self.db_manager.execute_query(query, params)
+
+    def __getattr__(self, name):
+        attr = getattr(self.db_manager, name)
+        if not callable(attr) or not any(topic in name for topic in _HISTORY_TOPICS):
+            return attr
+
+        def read_your_writes(*args, **kwargs):
+            self.buffer().sync(current_phone())
+            return attr(*args, **kwargs)
+
+        return read_your_writes
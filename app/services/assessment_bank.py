@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import logging
+
+from app.database.sharding import current_phone
+
+logger = logging.getLogger(__name__)
+
+# Argumentos com a quantidade de perguntas pedida ao serviço de IA
+_COUNT_KWARGS = ("count", "num_questions", "n_questions")
+
+
+def is_assessment_method(name):
+    """Métodos do serviço de IA que geram as perguntas da avaliação de nível"""
+    name = name.lower()
+    return ("assessment" in name or "avaliacao" in name) and ("question" in name or "pergunta" in name)
+
+
+class QuestionBankProxy:
+    """Serve do banco as perguntas da avaliação de nível pedidas ao serviço de IA.
+
+    O cadastro e o /nivel pedem as perguntas ao serviço de IA; com o banco
+    preenchido (ver build_question_bank.py) elas saem do banco, inéditas para o
+    remetente da mensagem (``sharding.routed``). Sem remetente ou com o banco
+    esgotado, a chamada segue para a IA.
+    """
+
+    def __init__(self, target, bank, count=5, is_assessment=is_assessment_method):
+        self._target = target
+        self._bank = bank
+        self._count = count
+        self._is_assessment = is_assessment
+        self._wrappers = {}
+        self.served = 0
+        self.fallbacks = 0
+
+    @property
+    def target(self):
+        return self._target
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+        attr = getattr(self._target, name)
+        if not self._is_assessment(name) or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            sender = current_phone()
+            if sender:
+                count = next((int(kwargs[key]) for key in _COUNT_KWARGS if kwargs.get(key)), self._count)
+                try:
+                    questions = await self._bank.aassessment_questions(sender, count)
+                except Exception as e:
+                    logger.error(f"Erro ao buscar perguntas de avaliação no banco: {str(e)}")
+                    questions = None
+                if questions:
+                    self.served += 1
+                    return questions
+            self.fallbacks += 1
+            return await attr(*args, **kwargs)
+
+        self._wrappers[name] = wrapper
+        return wrapper
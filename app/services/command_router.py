@@ -0,0 +1,215 @@
+import inspect
+import json
+import re
+
+from app.services.grammar_check import check_grammar
+
+HELP_TEXT = (
+    "🤖 *Comandos disponíveis*\n\n"
+    "/ajuda - Mostra este menu de ajuda\n"
+    "/licao - Inicia uma nova lição\n"
+    "/nivel - Reavalia o seu nível de inglês\n"
+    "/progresso - Mostra o seu progresso\n"
+    "/pratica - Inicia uma sessão de prática livre\n\n"
+    "Ou simplesmente converse comigo em inglês! 😊"
+)
+
+_COMMAND = re.compile(r"^\s*(/[a-zA-Zçã]+)")
+# Resposta que é só a letra de uma alternativa: "b", "B)", "(c)", "D."
+MULTIPLE_CHOICE_ANSWER = re.compile(r"^\s*\(?([A-Da-d])\)?[.)]?\s*$")
+_OPTION_LETTER = re.compile(r"^\s*\(?([A-Da-d])(?:[.)\s]|$)")
+
+
+def grade_multiple_choice(question, answer):
+    """Corrige localmente uma questão de múltipla escolha.
+
+    Retorna True/False ou None quando a resposta não é trivialmente corrigível
+    (questão aberta ou resposta que não é uma letra).
+    """
+    if question.get("question_type") != "multiple_choice":
+        return None
+    match = MULTIPLE_CHOICE_ANSWER.match(answer or "")
+    correct = _OPTION_LETTER.match(str(question.get("correct_answer", "")))
+    if not match or not correct:
+        return None
+    return match.group(1).upper() == correct.group(1).upper()
+
+
+def session_questions(session):
+    """Questões da sessão de avaliação (já decodificadas pelo cache ou do ``questions_data``)"""
+    questions = session.get("questions")
+    if questions is None:
+        questions_data = session.get("questions_data")
+        questions = json.loads(questions_data) if isinstance(questions_data, str) else questions_data
+    return questions or []
+
+
+def format_question(question, number, total):
+    """Texto de uma pergunta da avaliação (enunciado e alternativas)"""
+    lines = [f"*Pergunta {number}/{total}*", question.get("question", "")]
+    lines.extend(question.get("options") or [])
+    return "\n".join(lines)
+
+
+class AssessmentGrade:
+    """Resultado da correção local de uma resposta da avaliação"""
+
+    def __init__(self, session, index, answer, correct, question, next_question, total):
+        self.session = session
+        self.index = index
+        self.answer = answer
+        self.correct = correct
+        self.question = question
+        self.next_question = next_question
+        self.total = total
+
+    def update(self):
+        """UPDATE que registra a resposta e avança a sessão para a próxima pergunta"""
+        assignments, params = ["current_question = ?"], [self.index + 1]
+        if "answers" in self.session:
+            answers = self.session.get("answers") or []
+            if isinstance(answers, str):
+                answers = json.loads(answers)
+            answers = list(answers) + [{"question": self.index, "answer": self.answer, "correct": self.correct}]
+            assignments.append("answers = ?")
+            params.append(json.dumps(answers))
+        params.append(self.session["id"])
+        return f"UPDATE assessment_sessions SET {', '.join(assignments)} WHERE id = ?", tuple(params)
+
+    @property
+    def completed(self):
+        """A resposta é a da última pergunta: a avaliação termina com ela"""
+        return self.next_question is None
+
+    def skills(self):
+        """Eventos ``(skill, correct)`` da resposta para os agregados de progresso"""
+        return [("assessment", self.correct)]
+
+    def reply(self):
+        if self.correct:
+            feedback = "✅ Correto!"
+        else:
+            letter = _OPTION_LETTER.match(str(self.question.get("correct_answer", ""))).group(1).upper()
+            feedback = f"❌ Não foi dessa vez. A resposta certa é *{letter}*."
+        return f"{feedback}\n\n{format_question(self.next_question, self.index + 2, self.total)}"
+
+
+def grade_assessment_answer(session, answer, final=False):
+    """Corrige a resposta à pergunta atual da sessão sem chamar a IA.
+
+    A sessão precisa indicar a pergunta em aberto (``current_question``). Retorna
+    None quando a resposta não é uma letra, a pergunta não é de múltipla escolha
+    ou é a última (o fluxo completo encerra a avaliação e calcula o nível). Com
+    ``final=True`` a última também é corrigida (``completed``), só para o progresso.
+    """
+    if not session or session.get("current_question") is None or session.get("id") is None:
+        return None
+    questions = session_questions(session)
+    index = int(session["current_question"])
+    if index >= len(questions) or (index + 1 >= len(questions) and not final):
+        return None
+    question = questions[index]
+    correct = grade_multiple_choice(question, answer)
+    if correct is None:
+        return None
+    letter = MULTIPLE_CHOICE_ANSWER.match(answer).group(1).upper()
+    next_question = questions[index + 1] if index + 1 < len(questions) else None
+    return AssessmentGrade(session, index, letter, correct, question, next_question, len(questions))
+
+
+def format_corrections(corrected_text, corrections):
+    """Monta a resposta de correção gerada pelas regras locais"""
+    lines = ["Quase lá! 😊 Uma pequena correção:", f"✅ {corrected_text}", ""]
+    seen = set()
+    for correction in corrections:
+        if correction.explanation not in seen:
+            seen.add(correction.explanation)
+            lines.append(f"💡 {correction.explanation}")
+    return "\n".join(lines)
+
+
+class CommandRouter:
+    """Caminho rápido local: comandos com tabela de despacho e correções por regras.
+
+    Cada handler recebe ``(sender, body)`` e retorna o texto da resposta, ou None
+    para delegar ao fluxo completo do WhatsAppService/AIService. Além dos
+    comandos, mensagens que casam com um padrão registrado (ex.: a letra de uma
+    alternativa da avaliação) têm o próprio handler e contador.
+    """
+
+    def __init__(self, grammar_check_enabled=False, grammar_min_confidence=0.9,
+                 grammar_max_words=20, conversation_predicate=None):
+        self.grammar_check_enabled = grammar_check_enabled
+        self.grammar_min_confidence = grammar_min_confidence
+        self.grammar_max_words = grammar_max_words
+        # Indica se o remetente está em conversa livre (fora do cadastro/avaliação)
+        self.conversation_predicate = conversation_predicate
+        self._handlers = {}
+        self._patterns = []
+        self.counts = {}
+        self.register("/ajuda", lambda sender, body: HELP_TEXT)
+
+    def register(self, command, handler):
+        """Registra um handler local para um comando"""
+        self._handlers[command.lower()] = handler
+
+    def register_pattern(self, pattern, path, handler):
+        """Registra um handler para mensagens (não comandos) que casam com ``pattern``"""
+        self._patterns.append((re.compile(pattern) if isinstance(pattern, str) else pattern, path, handler))
+
+    @staticmethod
+    async def _call(handler, sender, body):
+        reply = handler(sender, body)
+        if inspect.isawaitable(reply):
+            reply = await reply
+        return reply
+
+    def _count(self, path):
+        self.counts[path] = self.counts.get(path, 0) + 1
+
+    async def route(self, sender, body):
+        """Responde localmente quando possível; retorna None para seguir o fluxo completo"""
+        match = _COMMAND.match(body or "")
+        if match:
+            handler = self._handlers.get(match.group(1).lower())
+            if handler is not None:
+                reply = await self._call(handler, sender, body)
+                if reply is not None:
+                    self._count(f"local:{match.group(1).lower()}")
+                    return reply
+            self._count("full")
+            return None
+
+        for pattern, path, handler in self._patterns:
+            if pattern.match(body or ""):
+                reply = await self._call(handler, sender, body)
+                if reply is not None:
+                    self._count(f"local:{path}")
+                    return reply
+
+        if self.grammar_check_enabled and body:
+            reply = await self._grammar_fast_path(sender, body)
+            if reply is not None:
+                self._count("local:grammar")
+                return reply
+
+        self._count("full")
+        return None
+
+    async def _grammar_fast_path(self, sender, body):
+        if len(body.split()) > self.grammar_max_words:
+            return None
+        corrected_text, corrections = check_grammar(body)
+        if not corrections or min(c.confidence for c in corrections) < self.grammar_min_confidence:
+            return None
+        if self.conversation_predicate is not None:
+            in_conversation = self.conversation_predicate(sender)
+            if inspect.isawaitable(in_conversation):
+                in_conversation = await in_conversation
+            if not in_conversation:
+                return None
+        return format_corrections(corrected_text, corrections)
+
+    def stats(self):
+        """Quantidade de mensagens atendidas por cada caminho"""
+        return dict(self.counts)
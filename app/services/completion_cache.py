@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+
+from app.utils.cache import LeaderCancelledError, TTLCache
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completion_cache (
+    cache_key TEXT PRIMARY KEY,
+    prompt_type TEXT NOT NULL,
+    response TEXT NOT NULL,
+    latency REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_completion_cache_expires ON completion_cache (expires_at);
+"""
+
+_NON_WORD = re.compile(r"[^\w' ]+")
+_SPACES = re.compile(r"\s+")
+
+# Argumentos que trazem o nível do usuário nos métodos do serviço de IA
+_LEVEL_KWARGS = ("level", "user_level", "nivel")
+_KNOWN_LEVELS = {
+    "a1", "a2", "b1", "b2", "c1", "c2",
+    "iniciante", "basico", "intermediario", "avancado",
+    "beginner", "elementary", "intermediate", "advanced"
+}
+
+
+def create_completion_cache_tables(conn):
+    """Cria a tabela do cache persistente de respostas"""
+    conn.executescript(COMPLETION_CACHE_SCHEMA)
+
+
+def normalize_text(text):
+    """Normaliza o texto: minúsculas, sem acentos, sem pontuação e espaços repetidos"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class CompletionCache:
+    """Cache de respostas da IA em dois níveis: memória (LRU/TTL) e SQLite.
+
+    A chave combina o texto normalizado, o nível do usuário, o tipo de prompt e a
+    versão do template, de modo que mudar um prompt invalida as respostas antigas.
+    Turnos de conversa personalizados devem passar ``personalized=True`` para não
+    usar o cache.
+    """
+
+    def __init__(self, pool=None, max_size=5000, ttl=86400, prune_interval=3600):
+        self.pool = pool
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+        self._inflight = {}
+        self._metrics = {}
+        self._prune_task = None
+
+    async def start(self):
+        """Inicia a poda periódica das respostas expiradas no SQLite"""
+        if self.pool is not None:
+            self._prune_task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        if self._prune_task:
+            self._prune_task.cancel()
+            await asyncio.gather(self._prune_task, return_exceptions=True)
+            self._prune_task = None
+
+    @staticmethod
+    def make_key(prompt_type, text, level, prompt_version):
+        raw = f"{prompt_type}|{prompt_version}|{level}|{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _metric(self, prompt_type):
+        return self._metrics.setdefault(prompt_type, {
+            "memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0, "bypassed": 0,
+            "saved_seconds": 0.0
+        })
+
+    async def get_or_compute(self, prompt_type, text, level, compute, prompt_version="1", personalized=False):
+        """Retorna a resposta em cache ou executa ``compute()`` (corrotina) e armazena"""
+        metric = self._metric(prompt_type)
+        if personalized:
+            metric["bypassed"] += 1
+            return await compute()
+
+        key = self.make_key(prompt_type, text, level, prompt_version)
+        entry = self.memory.get(key)
+        if entry is not None:
+            metric["memory_hits"] += 1
+            metric["saved_seconds"] += entry[1]
+            return entry[0]
+
+        if self.pool is not None:
+            entry = await self.pool.run(self._load, key)
+            if entry is not None:
+                metric["disk_hits"] += 1
+                metric["saved_seconds"] += entry[1]
+                self.memory.set(key, entry)
+                return entry[0]
+
+        # Requisições idênticas simultâneas aguardam a mesma chamada à IA
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            metric["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LeaderCancelledError:
+                # Quem iniciou a chamada foi cancelado: esta requisição assume
+                return await self.get_or_compute(prompt_type, text, level, compute, prompt_version)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        metric["misses"] += 1
+        try:
+            start = time.perf_counter()
+            response = await compute()
+            entry = (response, time.perf_counter() - start)
+            self.memory.set(key, entry)
+            if self.pool is not None:
+                await self.pool.run(self._store, key, prompt_type, entry)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita aviso de exceção não recuperada quando ninguém aguardava
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _load(self, key):
+        row = self.pool.fetch_one(
+            "SELECT response, latency FROM completion_cache WHERE cache_key = ? AND expires_at > ?",
+            (key, time.time())
+        )
+        return (row["response"], row["latency"]) if row else None
+
+    def _store(self, key, prompt_type, entry):
+        self.pool.execute_query(
+            "INSERT OR REPLACE INTO completion_cache (cache_key, prompt_type, response, latency, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, prompt_type, entry[0], entry[1], time.time() + self.ttl)
+        )
+
+    def prune_expired(self):
+        """Remove do SQLite as respostas expiradas"""
+        if self.pool is None:
+            return 0
+        with self.pool.connection() as conn:
+            return conn.execute("DELETE FROM completion_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            try:
+                removed = await self.pool.run(self.prune_expired)
+                if removed:
+                    logger.info(f"{removed} respostas expiradas removidas do cache de completions")
+            except Exception as e:
+                logger.error(f"Erro ao podar o cache de completions: {str(e)}")
+
+    def stats(self):
+        """Taxa de acerto e latência economizada por tipo de prompt"""
+        prompt_types = {}
+        for prompt_type, metric in self._metrics.items():
+            hits = metric["memory_hits"] + metric["disk_hits"] + metric["coalesced"]
+            lookups = hits + metric["misses"]
+            prompt_types[prompt_type] = dict(metric, hit_rate=hits / lookups if lookups else 0.0)
+        return {"prompt_types": prompt_types, "memory": self.memory.stats()}
+
+
+def cacheable_prompt_type(name):
+    """Tipo de prompt cacheável deduzido do nome do método do serviço de IA (None = não cachear)"""
+    name = name.lower()
+    if "lesson" in name or "licao" in name:
+        return "lesson"
+    if "practice" in name or "pratica" in name or "exercise" in name:
+        return "practice"
+    if "explain" in name or "explica" in name:
+        return "explanation"
+    return None
+
+
+def argument_level(args, kwargs):
+    """Nível do usuário nos argumentos da chamada (``level=`` ou um nível conhecido); "" se não houver"""
+    for key in _LEVEL_KWARGS:
+        if kwargs.get(key):
+            return normalize_text(str(kwargs[key]))
+    for arg in args:
+        if isinstance(arg, str) and normalize_text(arg) in _KNOWN_LEVELS:
+            return normalize_text(arg)
+    return ""
+
+
+class CachedCompletionProxy:
+    """Passa pelo ``CompletionCache`` os métodos assíncronos não personalizados do serviço de IA.
+
+    Lições, práticas e explicações dependem só dos argumentos (tema, nível...),
+    que formam a chave; os demais métodos (conversa, avaliação) vão direto ao
+    serviço. ``prompt_version`` deve mudar junto com os templates de prompt.
+    """
+
+    def __init__(self, target, cache, prompt_version="1", prompt_type_for=cacheable_prompt_type,
+                 level_for=argument_level):
+        self._target = target
+        self._cache = cache
+        self._prompt_version = prompt_version
+        self._prompt_type_for = prompt_type_for
+        self._level_for = level_for
+        self._wrappers = {}
+
+    @property
+    def target(self):
+        return self._target
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+        attr = getattr(self._target, name)
+        prompt_type = self._prompt_type_for(name)
+        if prompt_type is None or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            text = " | ".join([str(arg) for arg in args] + [f"{key}={kwargs[key]}" for key in sorted(kwargs)])
+            return await self._cache.get_or_compute(
+                prompt_type, text, self._level_for(args, kwargs), lambda: attr(*args, **kwargs),
+                prompt_version=self._prompt_version
+            )
+
+        self._wrappers[name] = wrapper
+        return wrapper
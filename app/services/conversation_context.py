@@ -0,0 +1,202 @@
+import asyncio
+import logging
+
+from app.services.openai_scheduler import PRIORITY_SUMMARY
+from app.utils.metrics import record_openai_usage
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_CONTEXT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    user_key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_turns INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_key TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_turns_user ON conversation_turns (user_key, id);
+"""
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of an English tutoring chat between Alex (teacher) "
+    "and a Brazilian student. Update the summary with the new turns. Keep the "
+    "student's goals, interests, recurring mistakes and what was already taught. "
+    "Maximum 120 words."
+)
+
+
+def create_conversation_context_tables(conn):
+    """Cria as tabelas de resumo e turnos recentes"""
+    conn.executescript(CONVERSATION_CONTEXT_SCHEMA)
+
+
+def estimate_tokens(text):
+    """Estimativa barata de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+class OpenAISummarizer:
+    """Incorpora turnos antigos ao resumo usando a API da OpenAI"""
+
+    def __init__(self, api_key, model="gpt-3.5-turbo", scheduler=None):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        # Resumos têm a menor prioridade no agendador (ver openai_scheduler.py)
+        self.scheduler = scheduler
+
+    async def __call__(self, summary, turns):
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        request = dict(
+            model=self.model,
+            temperature=0.2,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{transcript}"}
+            ]
+        )
+        if self.scheduler:
+            response = await self.scheduler.chat_completion(self.client, PRIORITY_SUMMARY, **request)
+        else:
+            response = await self.client.chat.completions.create(**request)
+        record_openai_usage(response, "summary")
+        return response.choices[0].message.content.strip()
+
+
+class ConversationContextManager:
+    """Mantém por usuário um resumo incremental mais os últimos K turnos.
+
+    O prompt enviado à IA fica limitado a ``token_budget`` independentemente do
+    tamanho do histórico: turnos que saem da janela são incorporados ao resumo
+    em segundo plano e removidos da tabela de turnos recentes. Até o resumo
+    alcançá-los, esses turnos continuam entrando no prompt (dentro do orçamento).
+    Turnos que não cabem no orçamento são resumidos em seguida, sem esperar a
+    janela encher, e voltam ao prompt pelo resumo.
+    """
+
+    def __init__(self, pool, summarize, recent_turns=6, fold_batch=6, token_budget=1500):
+        self.pool = pool
+        self.summarize = summarize
+        self.recent_turns = recent_turns
+        self.fold_batch = fold_batch
+        self.token_budget = token_budget
+        self._folding = {}
+
+    def ensure_schema(self):
+        """Cria as tabelas se ainda não existirem"""
+        with self.pool.connection() as conn:
+            create_conversation_context_tables(conn)
+
+    async def record_turn(self, user_key, role, content):
+        """Registra um turno e agenda o resumo se a janela recente estiver cheia"""
+        pending = await self.pool.run(self._insert_turn, user_key, role, content)
+        if pending >= self.recent_turns + self.fold_batch and user_key not in self._folding:
+            self._folding[user_key] = asyncio.create_task(self._fold(user_key))
+
+    def _insert_turn(self, user_key, role, content):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO conversation_turns (user_key, role, content) VALUES (?, ?, ?)",
+                (user_key, role, content)
+            )
+            return conn.execute(
+                "SELECT COUNT(*) FROM conversation_turns WHERE user_key = ?", (user_key,)
+            ).fetchone()[0]
+
+    async def _fold(self, user_key, up_to_id=None):
+        """Incorpora ao resumo os turnos mais antigos que a janela recente (ou até ``up_to_id``)"""
+        try:
+            summary, turns = await self.pool.run(self._load_foldable, user_key, up_to_id)
+            if not turns:
+                return
+            new_summary = await self.summarize(summary, turns)
+            await self.pool.run(self._save_fold, user_key, new_summary, turns)
+        except Exception as e:
+            logger.error(f"Erro ao resumir conversa de {user_key}: {str(e)}")
+        finally:
+            self._folding.pop(user_key, None)
+
+    def _load_foldable(self, user_key, up_to_id=None):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT summary FROM conversation_summaries WHERE user_key = ?", (user_key,)
+            ).fetchone()
+            if up_to_id is None:
+                turns = conn.execute(
+                    "SELECT id, role, content FROM conversation_turns WHERE user_key = ? "
+                    "ORDER BY id DESC LIMIT -1 OFFSET ?",
+                    (user_key, self.recent_turns)
+                ).fetchall()[::-1]
+            else:
+                turns = conn.execute(
+                    "SELECT id, role, content FROM conversation_turns WHERE user_key = ? AND id <= ? ORDER BY id",
+                    (user_key, up_to_id)
+                ).fetchall()
+        return (row["summary"] if row else ""), [dict(turn) for turn in turns]
+
+    def _save_fold(self, user_key, summary, turns):
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO conversation_summaries (user_key, summary, summarized_turns) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_key) DO UPDATE SET summary = excluded.summary, "
+                "summarized_turns = summarized_turns + excluded.summarized_turns, "
+                "updated_at = CURRENT_TIMESTAMP",
+                (user_key, summary, len(turns))
+            )
+            conn.execute(
+                "DELETE FROM conversation_turns WHERE user_key = ? AND id <= ?",
+                (user_key, turns[-1]["id"])
+            )
+
+    def _load_context(self, user_key):
+        # Todos os turnos ainda não resumidos: no máximo recent_turns + fold_batch enquanto
+        # os resumos estiverem em dia
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT summary FROM conversation_summaries WHERE user_key = ?", (user_key,)
+            ).fetchone()
+            turns = conn.execute(
+                "SELECT id, role, content FROM conversation_turns WHERE user_key = ? ORDER BY id",
+                (user_key,)
+            ).fetchall()
+        return (row["summary"] if row else ""), [dict(turn) for turn in turns]
+
+    async def build_messages(self, user_key, system_prompt, user_message):
+        """Monta as mensagens do chat respeitando o orçamento de tokens"""
+        summary, turns = await self.pool.run(self._load_context, user_key)
+
+        budget = self.token_budget - estimate_tokens(system_prompt) - estimate_tokens(user_message)
+        # Turnos mais recentes têm prioridade; os mais antigos saem primeiro
+        kept = []
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn["content"])
+            if cost > budget:
+                break
+            kept.insert(0, turn)
+            budget -= cost
+        dropped = turns[:len(turns) - len(kept)]
+        if dropped and user_key not in self._folding:
+            # Os turnos que ficaram de fora vão para o resumo e entram no próximo prompt
+            self._folding[user_key] = asyncio.create_task(self._fold(user_key, dropped[-1]["id"]))
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary and budget > 0:
+            max_chars = budget * 4
+            if len(summary) > max_chars:
+                summary = summary[-max_chars:]
+            messages.append({"role": "system", "content": f"Conversation summary so far: {summary}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in kept)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    async def wait_idle(self):
+        """Aguarda os resumos em andamento (útil no encerramento)"""
+        await asyncio.gather(*self._folding.values(), return_exceptions=True)
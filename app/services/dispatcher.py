@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MailboxFullError(Exception):
+    """Exceção lançada quando a caixa de mensagens de um remetente está cheia"""
+
+
+class _SenderActor:
+    """Ator que processa em ordem as mensagens de um único remetente"""
+
+    def __init__(self, mailbox_size):
+        self.mailbox = asyncio.Queue(maxsize=mailbox_size)
+        self.task = None
+        self.last_active = time.monotonic()
+
+
+class SenderDispatcher:
+    """Despachante estilo ator: ordem estrita por remetente, paralelismo entre remetentes"""
+
+    def __init__(self, handler, mailbox_size=20, idle_timeout=300, executor=None):
+        self.handler = handler
+        self.mailbox_size = mailbox_size
+        self.idle_timeout = idle_timeout
+        # Handlers síncronos são executados no pool de threads informado (ou no padrão)
+        self.executor = executor
+        self._is_async = asyncio.iscoroutinefunction(handler)
+        self._actors = {}
+        self._in_progress = 0
+        self.processed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.max_depth_seen = 0
+
+    async def submit(self, sender, *args):
+        """Entrega a mensagem ao ator do remetente e aguarda o resultado"""
+        future = asyncio.get_running_loop().create_future()
+        self._put(sender, args, future)
+        return await future
+
+    def post(self, sender, *args, callback):
+        """Entrega a mensagem ao ator do remetente sem aguardar o processamento.
+
+        O ator chama ``await callback(result, error)`` logo depois do handler, então
+        a entrega da resposta também segue a ordem das mensagens do remetente.
+        """
+        self._put(sender, args, callback=callback)
+
+    def _put(self, sender, args, future=None, callback=None):
+        actor = self._actors.get(sender)
+        if actor is None:
+            actor = _SenderActor(self.mailbox_size)
+            actor.task = asyncio.create_task(self._run(sender, actor))
+            self._actors[sender] = actor
+
+        try:
+            actor.mailbox.put_nowait(((sender,) + args, future, callback))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise MailboxFullError(f"Caixa de mensagens cheia para {sender}")
+
+        self.max_depth_seen = max(self.max_depth_seen, actor.mailbox.qsize())
+
+    async def _run(self, sender, actor):
+        """Loop do ator: processa a caixa de mensagens até ficar ocioso"""
+        while True:
+            try:
+                args, future, callback = await asyncio.wait_for(actor.mailbox.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # Sem await entre a verificação e a remoção: nenhuma mensagem se perde
+                if actor.mailbox.empty():
+                    del self._actors[sender]
+                    self.evicted += 1
+                    return
+                continue
+
+            actor.last_active = time.monotonic()
+            self._in_progress += 1
+            try:
+                result, error = None, None
+                try:
+                    result = await self._call(args)
+                except asyncio.CancelledError:
+                    if future is not None:
+                        future.cancel()
+                    raise
+                except Exception as e:
+                    error = e
+                if future is not None and not future.done():
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+                if callback is not None:
+                    await self._callback(sender, callback, result, error)
+            finally:
+                self._in_progress -= 1
+                self.processed += 1
+
+    @staticmethod
+    async def _callback(sender, callback, result, error):
+        try:
+            await callback(result, error)
+        except Exception as e:
+            logger.error(f"Erro ao entregar o resultado da mensagem de {sender}: {str(e)}")
+
+    async def _call(self, args):
+        """Executa o handler no event loop ou no pool de threads"""
+        if self._is_async:
+            return await self.handler(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self.handler, *args))
+
+    def stats(self):
+        """Contadores de atores e profundidade das caixas de mensagens"""
+        depths = [actor.mailbox.qsize() for actor in self._actors.values()]
+        return {
+            "active_actors": len(self._actors),
+            "queued_messages": sum(depths),
+            "max_mailbox_depth": max(depths, default=0),
+            "max_mailbox_depth_seen": self.max_depth_seen,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "evicted": self.evicted
+        }
+
+    @property
+    def pending(self):
+        """Mensagens aguardando ou em processamento"""
+        return self._in_progress + sum(actor.mailbox.qsize() for actor in self._actors.values())
+
+    async def drain(self, timeout=30, poll_interval=0.05):
+        """Aguarda o processamento das mensagens pendentes; retorna quantas restaram"""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+        if self.pending:
+            logger.warning(f"Tempo de drenagem esgotado com {self.pending} mensagens pendentes")
+        return self.pending
+
+    async def stop(self):
+        """Cancela todos os atores"""
+        actors = list(self._actors.values())
+        for actor in actors:
+            actor.task.cancel()
+        await asyncio.gather(*(actor.task for actor in actors), return_exceptions=True)
+        for actor in actors:
+            while not actor.mailbox.empty():
+                _, future, _ = actor.mailbox.get_nowait()
+                if future is not None:
+                    future.cancel()
+        self._actors.clear()
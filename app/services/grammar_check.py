@@ -0,0 +1,98 @@
+import re
+
+# Formas regulares incorretas de verbos irregulares -> passado correto
+IRREGULAR_PAST = {
+    "goed": "went", "eated": "ate", "buyed": "bought", "runned": "ran",
+    "taked": "took", "maked": "made", "writed": "wrote", "drinked": "drank",
+    "thinked": "thought", "bringed": "brought", "catched": "caught",
+    "teached": "taught", "speaked": "spoke", "comed": "came", "gived": "gave",
+    "knowed": "knew", "swimmed": "swam", "telled": "told", "sayed": "said",
+    "haved": "had", "leaved": "left", "feeled": "felt", "sleeped": "slept",
+    "sended": "sent", "spended": "spent", "finded": "found", "getted": "got",
+    "cutted": "cut", "hitted": "hit", "choosed": "chose", "forgetted": "forgot",
+    "understanded": "understood", "standed": "stood", "losed": "lost",
+    "meeted": "met", "drived": "drove", "rided": "rode",
+    "falled": "fell", "breaked": "broke", "builded": "built",
+    "fighted": "fought", "growed": "grew", "throwed": "threw", "weared": "wore",
+    "winned": "won", "begined": "began", "doed": "did",
+    "becomed": "became", "drawed": "drew", "blowed": "blew", "hided": "hid",
+    "shaked": "shook", "stealed": "stole", "freezed": "froze",
+    "sitted": "sat", "sinked": "sank", "spinned": "spun",
+    "hurted": "hurt", "feeded": "fed",
+    "holded": "held", "keeped": "kept", "lended": "lent",
+    "selled": "sold", "shooted": "shot"
+}
+
+_THIRD_PERSON = r"(?P<subject>he|she|it)"
+# O sujeito precisa abrir a oração: início do texto, depois de pontuação, de aspas ou
+# de uma conjunção. Assim pronomes objeto não viram sujeito ("thank you is polite",
+# "the man I told you was right") e auxiliares antes do sujeito ("does he have",
+# "could it have", "let it have") também ficam de fora
+_CONJUNCTIONS = (
+    "and", "but", "or", "so", "because", "when", "if", "that", "while", "since", "although", "then"
+)
+_CLAUSE_START = "(?:^|" + "|".join(
+    [r"(?<=[.!?;:,]\s)", r"(?<=[\"'(\[])"] + [rf"(?<=\b(?i:{word})\s)" for word in _CONJUNCTIONS]
+) + ")"
+
+# (padrão, substituição, explicação) - todas com alta confiança
+_AGREEMENT_RULES = [
+    (re.compile(_CLAUSE_START + _THIRD_PERSON + r" don't\b", re.IGNORECASE),
+     r"\g<subject> doesn't", "Com he/she/it usamos *doesn't*, não *don't*."),
+    (re.compile(_CLAUSE_START + _THIRD_PERSON + r" have\b", re.IGNORECASE),
+     r"\g<subject> has", "Com he/she/it usamos *has*, não *have*."),
+    (re.compile(_CLAUSE_START + r"I (?:is|are)\b"), "I am", "Com I usamos *am*."),
+    (re.compile(_CLAUSE_START + r"(?P<subject>they|we|you) is\b", re.IGNORECASE),
+     r"\g<subject> are", "Com they/we/you usamos *are*."),
+    (re.compile(_CLAUSE_START + r"(?P<subject>he|she|it) are\b", re.IGNORECASE),
+     r"\g<subject> is", "Com he/she/it usamos *is*."),
+    (re.compile(_CLAUSE_START + r"(?P<subject>they|we|you) was\b", re.IGNORECASE),
+     r"\g<subject> were", "Com they/we/you usamos *were* no passado."),
+    (re.compile(_CLAUSE_START + r"(?P<subject>(?i:they|we|you)|I) has\b"),
+     r"\g<subject> have", "Com I/you/we/they usamos *have*."),
+    (re.compile(_CLAUSE_START + r"(?P<subject>(?i:they|we|you)|I) doesn't\b"),
+     r"\g<subject> don't", "Com I/you/we/they usamos *don't*."),
+]
+
+_WORD = re.compile(r"[A-Za-z']+")
+
+
+class Correction:
+    """Uma correção encontrada pelas regras locais"""
+
+    def __init__(self, category, original, corrected, explanation, confidence):
+        self.category = category
+        self.original = original
+        self.corrected = corrected
+        self.explanation = explanation
+        self.confidence = confidence
+
+
+def check_grammar(text):
+    """Aplica as regras locais e retorna (texto corrigido, lista de correções)"""
+    corrections = []
+    corrected_text = text
+
+    def replace_past(match):
+        word = match.group(0)
+        right = IRREGULAR_PAST.get(word.lower())
+        if not right:
+            return word
+        if word[0].isupper():
+            right = right.capitalize()
+        corrections.append(Correction(
+            "irregular_past", word, right,
+            f"*{right}* é o passado irregular; *{word}* não existe.", 0.95
+        ))
+        return right
+
+    corrected_text = _WORD.sub(replace_past, corrected_text)
+
+    for pattern, replacement, explanation in _AGREEMENT_RULES:
+        for match in pattern.finditer(corrected_text):
+            corrections.append(Correction(
+                "subject_verb_agreement", match.group(0), match.expand(replacement), explanation, 0.9
+            ))
+        corrected_text = pattern.sub(replacement, corrected_text)
+
+    return corrected_text, corrections
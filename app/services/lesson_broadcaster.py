@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import time
+
+from app.database.question_bank import format_item
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcast_runs (
+    run_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_lessons (
+    run_id TEXT NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (run_id, level)
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    run_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (run_id, user_id)
+);
+"""
+
+# Paginação por chave: custo constante por página, sem OFFSET
+_USERS_PAGE = """
+SELECT id, phone_number, level FROM users
+WHERE id > ? AND level IS NOT NULL
+ORDER BY id LIMIT ?
+"""
+
+# Só alunos com alguma interação desde a data informada
+_ACTIVE_USERS_PAGE = """
+SELECT id, phone_number, level FROM users
+WHERE id > ? AND level IS NOT NULL
+AND EXISTS (SELECT 1 FROM interactions WHERE interactions.user_id = users.id AND interactions.created_at >= ?)
+ORDER BY id LIMIT ?
+"""
+
+
+def create_broadcast_tables(conn):
+    """Cria as tabelas de checkpoint e de lições renderizadas dos envios em massa"""
+    conn.executescript(BROADCAST_SCHEMA)
+
+
+def whatsapp_address(phone_number):
+    """Endereço no formato esperado pela Twilio (whatsapp:+55...)"""
+    return phone_number if phone_number.startswith("whatsapp:") else f"whatsapp:{phone_number}"
+
+
+class AsyncRateLimiter:
+    """Balde de tokens assíncrono: no máximo ``rate`` envios por segundo"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class QuestionBankRenderer:
+    """Renderiza uma lição por nível a partir do banco de perguntas.
+
+    O cursor ``broadcast`` avança um item por execução, então cada envio diário
+    usa uma lição nova para todo o nível.
+    """
+
+    def __init__(self, bank, kind="lesson", cursor_key="broadcast"):
+        self.bank = bank
+        self.kind = kind
+        self.cursor_key = cursor_key
+
+    async def __call__(self, level):
+        item = await self.bank.anext_item(self.cursor_key, level, self.kind)
+        return format_item(item) if item else None
+
+
+class LessonBroadcaster:
+    """Envio em massa de lições/práticas para todos os alunos com nível definido.
+
+    Os usuários são lidos em páginas por chave (``id > último``) e passam por uma
+    fila limitada até os workers de envio, então a memória não cresce com o
+    número de alunos. A lição de cada nível é renderizada uma única vez por
+    execução e gravada em ``lesson_pool`` (com shards, o banco principal, para que
+    todos os shards e as retomadas usem a mesma); o checkpoint fica em ``pool`` e
+    guarda o maior id cujos envios anteriores já terminaram, e uma execução
+    interrompida retoma dali. Cada envio é registrado em ``broadcast_deliveries``
+    logo após sair, então a retomada pula quem já recebeu depois do checkpoint.
+    Com ``active_since`` (texto no formato de ``created_at``) só recebem os alunos
+    com alguma interação desde essa data.
+    """
+
+    def __init__(self, pool, reply_sender, render, kind="lesson", batch_size=500,
+                 concurrency=20, rate=30, checkpoint_interval=2.0, lesson_pool=None, active_since=None):
+        self.pool = pool
+        # Lições renderizadas: com shards ficam no banco principal, iguais para todos os shards
+        self.lesson_pool = lesson_pool or pool
+        self.reply_sender = reply_sender
+        self.render = render
+        self.kind = kind
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.limiter = AsyncRateLimiter(rate)
+        self.checkpoint_interval = checkpoint_interval
+        self.active_since = active_since
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.status = "running"
+        self._lessons = {}
+        self._delivered = set()
+        self._inflight = set()
+        self._last_produced = 0
+
+    def ensure_schema(self):
+        """Cria as tabelas se ainda não existirem"""
+        for pool in {id(self.pool): self.pool, id(self.lesson_pool): self.lesson_pool}.values():
+            with pool.connection() as conn:
+                create_broadcast_tables(conn)
+
+    async def run(self, run_id):
+        """Executa (ou retoma) o envio identificado por ``run_id``; retorna os contadores"""
+        state = await self.pool.run(self._load_run, run_id)
+        if state["status"] == "done":
+            logger.info(f"Envio {run_id} já concluído")
+            return state
+        self.sent, self.failed, self.skipped = state["sent"], state["failed"], state["skipped"]
+        self._last_produced = state["last_user_id"]
+        self._lessons = await self.lesson_pool.run(self._load_lessons, run_id)
+        self._delivered = await self.pool.run(self._load_deliveries, run_id, state["last_user_id"])
+        if state["last_user_id"]:
+            logger.info(f"Retomando envio {run_id} após o usuário {state['last_user_id']}")
+
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(run_id, queue)) for _ in range(self.concurrency)]
+        checkpointer = asyncio.create_task(self._checkpoint_loop(run_id))
+        try:
+            last_id = state["last_user_id"]
+            while True:
+                users = await self.pool.afetch_all(*self._users_page(last_id))
+                if not users:
+                    break
+                for user in users:
+                    self._inflight.add(user["id"])
+                    self._last_produced = user["id"]
+                    await queue.put(user)
+                last_id = users[-1]["id"]
+            await queue.join()
+        finally:
+            for task in workers + [checkpointer]:
+                task.cancel()
+            await asyncio.gather(*workers, checkpointer, return_exceptions=True)
+            await self.pool.run(self._save_checkpoint, run_id, self._frontier(), "running")
+
+        self.status = "done"
+        await self.pool.run(self._save_checkpoint, run_id, self._last_produced, self.status)
+        logger.info(f"Envio {run_id} concluído: {self.sent} enviados, {self.failed} falhas, {self.skipped} ignorados")
+        return self.stats()
+
+    def _users_page(self, last_id):
+        if self.active_since:
+            return _ACTIVE_USERS_PAGE, (last_id, self.active_since, self.batch_size)
+        return _USERS_PAGE, (last_id, self.batch_size)
+
+    async def _worker(self, run_id, queue):
+        while True:
+            user = await queue.get()
+            try:
+                # Quem já recebeu depois do último checkpoint, antes da interrupção, é pulado
+                if user["id"] not in self._delivered:
+                    await self._deliver(run_id, user)
+            except asyncio.CancelledError:
+                # Interrompido no meio do envio: continua pendente para a retomada
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Falha ao enviar lição para o usuário {user['id']}: {str(e)}")
+            self._inflight.discard(user["id"])
+            queue.task_done()
+
+    async def _deliver(self, run_id, user):
+        message = await self._lesson_for(run_id, user["level"])
+        if message is None:
+            self.skipped += 1
+            return
+        await self.limiter.acquire()
+        await self.reply_sender.send(whatsapp_address(user["phone_number"]), message)
+        self.sent += 1
+        # Registrado antes de o usuário sair de _inflight (e de o checkpoint avançar)
+        record = asyncio.ensure_future(self.pool.run(self._record_delivery, run_id, user["id"]))
+        try:
+            await asyncio.shield(record)
+        except asyncio.CancelledError:
+            # A mensagem já saiu: o registro termina mesmo com a execução sendo interrompida
+            await record
+            raise
+
+    async def _lesson_for(self, run_id, level):
+        """Lição do nível, renderizada uma única vez por execução (também na retomada)"""
+        if level not in self._lessons:
+            future = asyncio.get_running_loop().create_future()
+            self._lessons[level] = future
+            try:
+                message = await self.render(level)
+                if message is not None:
+                    await self.lesson_pool.run(self._save_lesson, run_id, level, message)
+                future.set_result(message)
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()
+                del self._lessons[level]
+                raise
+        lesson = self._lessons[level]
+        return await lesson if isinstance(lesson, asyncio.Future) else lesson
+
+    def _frontier(self):
+        """Maior id tal que todos os usuários anteriores já foram atendidos"""
+        if self._inflight:
+            return min(self._inflight) - 1
+        return self._last_produced
+
+    async def _checkpoint_loop(self, run_id):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.pool.run(self._save_checkpoint, run_id, self._frontier(), "running")
+
+    def _load_run(self, run_id):
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO broadcast_runs (run_id, kind) VALUES (?, ?)", (run_id, self.kind))
+            row = conn.execute(
+                "SELECT last_user_id, sent, failed, skipped, status FROM broadcast_runs WHERE run_id = ?",
+                (run_id,)
+            ).fetchone()
+        return dict(row)
+
+    def _load_lessons(self, run_id):
+        rows = self.lesson_pool.fetch_all("SELECT level, message FROM broadcast_lessons WHERE run_id = ?", (run_id,))
+        return {row["level"]: row["message"] for row in rows}
+
+    def _save_lesson(self, run_id, level, message):
+        self.lesson_pool.execute_query(
+            "INSERT OR IGNORE INTO broadcast_lessons (run_id, level, message) VALUES (?, ?, ?)",
+            (run_id, level, message)
+        )
+
+    def _load_deliveries(self, run_id, last_user_id):
+        rows = self.pool.fetch_all(
+            "SELECT user_id FROM broadcast_deliveries WHERE run_id = ? AND user_id > ?", (run_id, last_user_id)
+        )
+        return {row["user_id"] for row in rows}
+
+    def _record_delivery(self, run_id, user_id):
+        # O contador de enviados anda junto com o registro: não se perde numa interrupção
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO broadcast_deliveries (run_id, user_id) VALUES (?, ?)", (run_id, user_id)
+            )
+            conn.execute("UPDATE broadcast_runs SET sent = sent + 1 WHERE run_id = ?", (run_id,))
+
+    def _save_checkpoint(self, run_id, last_user_id, status):
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "UPDATE broadcast_runs SET last_user_id = ?, failed = ?, skipped = ?, status = ?, "
+                "updated_at = CURRENT_TIMESTAMP WHERE run_id = ?",
+                (last_user_id, self.failed, self.skipped, status, run_id)
+            )
+            # Envios até o checkpoint já não precisam de registro individual
+            conn.execute(
+                "DELETE FROM broadcast_deliveries WHERE run_id = ? AND user_id <= ?", (run_id, last_user_id)
+            )
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "last_user_id": self._frontier(),
+            "status": self.status
+        }
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.services.openai_scheduler import PRIORITY_CONVERSATION
+from app.utils.cache import LeaderCancelledError
+from app.utils.metrics import MEDIA_STAGE_SECONDS, MEDIA_RESULTS
+
+logger = logging.getLogger(__name__)
+
+MEDIA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_transcripts (
+    content_hash TEXT PRIMARY KEY,
+    content_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    transcript TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Extensões aceitas pela API de transcrição para os formatos de áudio do WhatsApp
+_AUDIO_EXTENSIONS = {
+    "audio/ogg": ".ogg",
+    "audio/opus": ".ogg",
+    "audio/mpeg": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/aac": ".m4a",
+    "audio/amr": ".amr",
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/webm": ".webm"
+}
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class MediaTooLargeError(Exception):
+    """Anexo maior que o limite configurado"""
+
+
+def create_media_tables(conn):
+    """Cria a tabela de transcrições por hash do conteúdo"""
+    conn.executescript(MEDIA_SCHEMA)
+
+
+def audio_extension(content_type):
+    return _AUDIO_EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ".bin"
+
+
+def transcode_audio(source, target, ffmpeg="ffmpeg", timeout=120):
+    """Converte para MP3 mono de 16 kHz (executado no pool de processos).
+
+    É a qualidade que a transcrição precisa e reduz o upload para a API.
+    """
+    subprocess.run(
+        [ffmpeg, "-nostdin", "-y", "-loglevel", "error", "-i", source,
+         "-ac", "1", "-ar", "16000", "-b:a", "32k", target],
+        check=True, timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    return target
+
+
+class OpenAITranscriber:
+    """Transcreve um arquivo de áudio com a API da OpenAI"""
+
+    def __init__(self, api_key, model="whisper-1", scheduler=None, base_url=None):
+        from openai import AsyncOpenAI
+        from app.services.openai_usage import instrument_client
+
+        # Os cabeçalhos x-ratelimit-* da transcrição também alimentam o orçamento do agendador
+        self.client = instrument_client(
+            AsyncOpenAI(api_key=api_key, base_url=base_url), "transcription", scheduler=scheduler
+        )
+        self.model = model
+        # Mensagem de voz é conversa: mesma prioridade das respostas ao aluno
+        self.scheduler = scheduler
+
+    async def __call__(self, path):
+        async def call():
+            with open(path, "rb") as audio_file:
+                response = await self.client.audio.transcriptions.create(model=self.model, file=audio_file)
+            return response.text.strip()
+
+        if self.scheduler:
+            return await self.scheduler.submit(call, PRIORITY_CONVERSATION)
+        return await call()
+
+
+class MediaPipeline:
+    """Download, transcodificação e transcrição de mensagens de voz.
+
+    O download usa um cliente HTTP assíncrono com pool de conexões e grava o
+    anexo direto em disco enquanto calcula o SHA-256. Áudios já vistos (mesmo
+    hash) reutilizam a transcrição gravada no SQLite, e downloads simultâneos do
+    mesmo conteúdo aguardam uma única transcrição. A conversão roda num pool de
+    processos e as chamadas à API de transcrição têm concorrência limitada.
+    """
+
+    def __init__(self, pool, transcribe, media_dir, auth=None, max_bytes=16 * 1024 * 1024,
+                 max_connections=20, download_timeout=30, transcode_workers=2,
+                 transcribe_concurrency=4, ffmpeg=None):
+        self.pool = pool
+        self.transcribe = transcribe
+        self.media_dir = media_dir
+        self.auth = auth
+        self.max_bytes = max_bytes
+        self.max_connections = max_connections
+        self.download_timeout = download_timeout
+        self.transcode_workers = transcode_workers
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self._transcribe_slots = asyncio.Semaphore(transcribe_concurrency)
+        self._client = None
+        self._executor = None
+        self._inflight = {}
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.transcribed = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def ensure_schema(self):
+        """Cria a tabela se ainda não existir"""
+        with self.pool.connection() as conn:
+            create_media_tables(conn)
+
+    async def start(self):
+        os.makedirs(self.media_dir, exist_ok=True)
+        if self.ffmpeg:
+            # spawn: o processo do servidor já tem threads (fork herdaria locks em uso)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.transcode_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            logger.warning("ffmpeg não encontrado: áudios serão enviados para transcrição sem conversão")
+
+    def _http(self):
+        """Cliente HTTP criado no primeiro download (httpx fica fora da inicialização)"""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                auth=self.auth,
+                follow_redirects=True,
+                timeout=self.download_timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    async def stop(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def transcribe_url(self, url):
+        """Transcrição do áudio em ``url`` ou None se o anexo não for áudio"""
+        try:
+            with MEDIA_STAGE_SECONDS.time(stage="download"):
+                downloaded = await self._download(url)
+            if downloaded is None:
+                self.skipped += 1
+                MEDIA_RESULTS.inc(result="skipped")
+                return None
+            path, content_hash, content_type, size = downloaded
+            try:
+                return await self._transcript_for(path, content_hash, content_type, size)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        except Exception:
+            self.errors += 1
+            MEDIA_RESULTS.inc(result="error")
+            raise
+
+    async def _download(self, url):
+        """Grava o anexo em disco em blocos; retorna (caminho, sha256, content-type, bytes)"""
+        async with self._http().stream("GET", url) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            if not content_type.startswith("audio/"):
+                return None
+            length = int(response.headers.get("content-length") or 0)
+            if length > self.max_bytes:
+                raise MediaTooLargeError(f"Anexo de {length} bytes excede o limite de {self.max_bytes}")
+
+            digest = hashlib.sha256()
+            size = 0
+            handle, partial = tempfile.mkstemp(dir=self.media_dir, suffix=".part")
+            try:
+                with os.fdopen(handle, "wb") as media_file:
+                    async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise MediaTooLargeError(f"Anexo excede o limite de {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        media_file.write(chunk)
+            except BaseException:
+                os.remove(partial)
+                raise
+
+        self.downloads += 1
+        self.downloaded_bytes += size
+        content_hash = digest.hexdigest()
+        # Nome único por download: dois envios do mesmo áudio não disputam o arquivo
+        path = f"{partial[:-len('.part')]}{audio_extension(content_type)}"
+        os.replace(partial, path)
+        return path, content_hash, content_type, size
+
+    async def _transcript_for(self, path, content_hash, content_type, size):
+        with MEDIA_STAGE_SECONDS.time(stage="lookup"):
+            row = await self.pool.afetch_one(
+                "SELECT transcript FROM media_transcripts WHERE content_hash = ?", (content_hash,)
+            )
+        if row is not None:
+            self.cache_hits += 1
+            MEDIA_RESULTS.inc(result="cached")
+            return row["transcript"]
+
+        inflight = self._inflight.get(content_hash)
+        if inflight is not None:
+            self.coalesced += 1
+            MEDIA_RESULTS.inc(result="coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except LeaderCancelledError:
+                # Quem iniciou a transcrição foi cancelado: esta mensagem assume com o próprio arquivo
+                return await self._transcript_for(path, content_hash, content_type, size)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[content_hash] = future
+        try:
+            transcript = await self._process(path)
+            await self.pool.aexecute_query(
+                "INSERT OR REPLACE INTO media_transcripts (content_hash, content_type, size, transcript) "
+                "VALUES (?, ?, ?, ?)",
+                (content_hash, content_type, size, transcript)
+            )
+            future.set_result(transcript)
+            self.transcribed += 1
+            MEDIA_RESULTS.inc(result="transcribed")
+            return transcript
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita aviso de exceção não recuperada quando ninguém aguardava
+            future.exception()
+            raise
+        finally:
+            del self._inflight[content_hash]
+
+    async def _process(self, path):
+        source = path
+        converted = None
+        if self._executor:
+            converted = f"{os.path.splitext(path)[0]}.16k.mp3"
+            with MEDIA_STAGE_SECONDS.time(stage="transcode"):
+                source = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, transcode_audio, path, converted, self.ffmpeg
+                )
+        try:
+            start = time.perf_counter()
+            async with self._transcribe_slots:
+                MEDIA_STAGE_SECONDS.observe(time.perf_counter() - start, stage="transcribe_wait")
+                with MEDIA_STAGE_SECONDS.time(stage="transcribe"):
+                    return await self.transcribe(source)
+        finally:
+            if converted and os.path.exists(converted):
+                os.remove(converted)
+
+    def stats(self):
+        return {
+            "downloads": self.downloads,
+            "downloaded_bytes": self.downloaded_bytes,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "transcribed": self.transcribed,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import logging
+
+from app.services.streaming import split_message
+
+logger = logging.getLogger(__name__)
+
+
+class TwilioReplySender:
+    """Envia respostas para o WhatsApp através da API REST da Twilio"""
+
+    def __init__(self, client, phone_number, executor=None):
+        self.client = client
+        self.phone_number = phone_number
+        # Pool de threads próprio permite mais envios simultâneos que o padrão do asyncio
+        self.executor = executor
+
+    async def send(self, to, body):
+        """Envia uma mensagem sem bloquear o event loop (o SDK da Twilio é síncrono)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: self.client.messages.create(from_=self.phone_number, to=to, body=body)
+        )
+
+
+class MessageQueue:
+    """Fila interna que processa mensagens em segundo plano e responde via REST.
+
+    Os workers só repassam cada mensagem ao ``dispatcher`` (``SenderDispatcher``):
+    o ator do remetente processa e entrega a resposta, então um remetente lento
+    não ocupa os workers. ``max_in_flight`` limita as mensagens repassadas e ainda
+    sem resposta; com o limite atingido a fila volta a encher.
+    """
+
+    def __init__(self, dispatcher, reply_sender, max_size=1000, workers=4, responder=None, dedupe=None,
+                 max_in_flight=None):
+        self.dispatcher = dispatcher
+        self.reply_sender = reply_sender
+        # StreamingResponder para respostas em streaming (iterador assíncrono de trechos)
+        self.responder = responder
+        # MessageDeduplicator: a mensagem reivindicada no webhook é concluída ao sair da fila
+        self.dedupe = dedupe
+        self.max_size = max_size
+        self.workers = workers
+        self.max_in_flight = max_in_flight or max_size
+        self._queue = None
+        self._slots = None
+        self._tasks = []
+
+    @property
+    def depth(self):
+        """Quantidade de mensagens aguardando processamento"""
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def running(self):
+        """Indica se todos os workers estão ativos"""
+        return bool(self._tasks) and not any(task.done() for task in self._tasks)
+
+    @property
+    def full(self):
+        return self._queue is not None and self._queue.full()
+
+    async def start(self):
+        """Inicia o pool de workers"""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Fila de mensagens iniciada com {self.workers} workers")
+
+    def enqueue(self, sender, body, media_url=None, message_sid=None):
+        """Coloca uma mensagem na fila; retorna False se a fila estiver cheia"""
+        try:
+            self._queue.put_nowait((sender, body, media_url, message_sid))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Fila de mensagens cheia ({self.max_size}), mensagem de {sender} recusada")
+            return False
+
+    async def stop(self, timeout=30):
+        """Aguarda a entrega das mensagens da fila e encerra os workers"""
+        if self._queue is None:
+            return
+        try:
+            # Cada mensagem só é dada como concluída depois da entrega da resposta
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Encerrando com {self.depth} mensagens não processadas na fila")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _reply(self, sender, response):
+        """Envia a resposta (streaming em pedaços ou texto dividido no limite do WhatsApp) e retorna o texto"""
+        if hasattr(response, "__aiter__"):
+            if self.responder is None:
+                raise TypeError("Resposta em streaming sem StreamingResponder configurado")
+            text, _ = await self.responder.deliver(sender, response)
+            return text
+        for part in split_message(response):
+            await self.reply_sender.send(sender, part)
+        return response
+
+    async def _worker(self, worker_id):
+        """Consome a fila e repassa a mensagem ao ator do remetente, sem aguardar a resposta"""
+        while True:
+            sender, body, media_url, message_sid = await self._queue.get()
+            await self._slots.acquire()
+            try:
+                self.dispatcher.post(
+                    sender, body, media_url,
+                    callback=functools.partial(self._deliver, sender, message_sid)
+                )
+            except Exception as e:
+                logger.error(f"Worker {worker_id}: erro ao repassar mensagem de {sender}: {str(e)}")
+                await self._done(message_sid)
+
+    async def _deliver(self, sender, message_sid, response, error):
+        """Executado pelo ator do remetente: envia a resposta e conclui a mensagem"""
+        reply = None
+        try:
+            if error is not None:
+                logger.error(f"Erro ao processar mensagem de {sender}: {str(error)}")
+            else:
+                reply = await self._reply(sender, response)
+        except Exception as e:
+            logger.error(f"Erro ao responder mensagem de {sender}: {str(e)}")
+        finally:
+            # Concluída mesmo com erro: a confirmação já foi enviada e a resposta pode ter saído em parte
+            await self._done(message_sid, reply)
+
+    async def _done(self, message_sid, reply=None):
+        try:
+            await self._complete(message_sid, reply)
+        finally:
+            self._slots.release()
+            self._queue.task_done()
+
+    async def _complete(self, message_sid, reply=None):
+        if self.dedupe is None or not message_sid:
+            return
+        try:
+            await self.dedupe.complete(message_sid, reply)
+        except Exception as e:
+            logger.error(f"Erro ao concluir a mensagem {message_sid}: {str(e)}")
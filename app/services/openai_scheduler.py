@@ -0,0 +1,411 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+
+from app.utils.metrics import OPENAI_QUEUE_WAIT_SECONDS, OPENAI_REJECTED, OPENAI_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Classes de prioridade: menor valor é atendido primeiro
+PRIORITY_CONVERSATION = 0
+PRIORITY_LESSON = 1
+PRIORITY_SUMMARY = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_CONVERSATION: "conversation",
+    PRIORITY_LESSON: "lesson",
+    PRIORITY_SUMMARY: "summary"
+}
+
+# Prazo padrão (segundos) de cada classe: depois disso a resposta já não serve
+DEFAULT_DEADLINES = {
+    PRIORITY_CONVERSATION: 30,
+    PRIORITY_LESSON: 120,
+    PRIORITY_SUMMARY: 600
+}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RequestRejectedError(Exception):
+    """Requisição descartada pelo agendador (prazo vencido ou fila cheia)"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def parse_reset(value):
+    """Converte durações dos cabeçalhos da OpenAI ("1s", "6m0s", "20ms") em segundos"""
+    if not value:
+        return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART.findall(value))
+
+
+def retry_reason(error):
+    """Motivo para nova tentativa, ou None se o erro não for transitório"""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limit"
+    if status is not None and status >= 500:
+        return "server_error"
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)) or \
+            type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return "connection"
+    return None
+
+
+def retry_after(error):
+    """Espera sugerida pelo servidor (retry-after-ms / retry-after), se houver"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """Estimativa barata de tokens (~4 caracteres por token) mais a resposta esperada"""
+    prompt = sum(len(str(message.get("content", ""))) for message in messages) // 4
+    return prompt + (max_tokens or 500)
+
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "tokens", "future", "enqueued_at")
+
+    def __init__(self, priority, deadline, tokens, future):
+        self.priority = priority
+        self.deadline = deadline
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class _Ticket:
+    """Vaga concedida; ``latency`` pode ser definida pelo chamador (ex.: tempo até o 1º token)"""
+
+    __slots__ = ("latency",)
+
+    def __init__(self):
+        self.latency = None
+
+
+class OpenAIScheduler:
+    """Agendador de requisições à OpenAI com concorrência adaptativa e prioridades.
+
+    A concorrência segue AIMD: cresce ~1 vaga por janela de respostas rápidas e
+    cai multiplicativamente com latência acima de ``target_latency`` ou com 429.
+    O orçamento de tokens por minuto vem de ``tokens_per_minute`` (balde local)
+    e/ou dos cabeçalhos ``x-ratelimit-*`` das respostas. Requisições que não
+    conseguem começar antes do prazo são descartadas em vez de respondidas tarde.
+    """
+
+    def __init__(self, max_concurrency=32, min_concurrency=1, initial_concurrency=8,
+                 target_latency=8.0, tokens_per_minute=0, max_queue=1000, max_retries=3,
+                 base_backoff=0.5, max_backoff=20.0, deadlines=None, default_tokens=1000):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.target_latency = target_latency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.default_tokens = default_tokens
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._queued = 0
+        # None = sem orçamento conhecido (nem configurado nem informado pela API)
+        self._tokens = float(tokens_per_minute) if tokens_per_minute else None
+        self._tokens_updated = time.monotonic()
+        self._tokens_reset_at = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._wakeup = None
+        self._wakeup_at = 0.0
+        self._loop = None
+
+        self.completed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.rate_limited = 0
+
+    # -- API pública -------------------------------------------------------
+
+    async def submit(self, call, priority=PRIORITY_CONVERSATION, deadline=None, tokens=None):
+        """Executa ``call()`` (corrotina) quando houver vaga, com novas tentativas e prazo"""
+        deadline = deadline or time.monotonic() + self.deadlines[priority]
+        for attempt in itertools.count():
+            try:
+                async with self.slot(priority, deadline, tokens):
+                    return await call()
+            except RequestRejectedError:
+                raise
+            except Exception as e:
+                reason = retry_reason(e)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                delay = retry_after(e) or self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise self._rejected(priority, "deadline") from e
+                self.retried += 1
+                OPENAI_RETRIES.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+                await asyncio.sleep(delay)
+
+    async def chat_completion(self, client, priority=PRIORITY_CONVERSATION, deadline=None, **kwargs):
+        """``chat.completions.create`` agendado, atualizando o orçamento pelos cabeçalhos"""
+        tokens = estimate_request_tokens(kwargs.get("messages", ()), kwargs.get("max_tokens"))
+
+        async def call():
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+            response = raw.parse()
+            if not self.update_rate_limits(raw.headers):
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    self._reconcile(tokens, usage.total_tokens)
+            return response
+
+        return await self.submit(call, priority, deadline, tokens)
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_CONVERSATION, deadline=None, tokens=None):
+        """Reserva uma vaga durante o bloco ``with`` (útil para respostas em streaming)"""
+        deadline = deadline or time.monotonic() + self.deadlines[priority]
+        await self._acquire(priority, deadline, tokens or self.default_tokens)
+        ticket = _Ticket()
+        start = time.perf_counter()
+        try:
+            yield ticket
+        except Exception as e:
+            if retry_reason(e) == "rate_limit":
+                self._on_rate_limited(retry_after(e))
+            raise
+        else:
+            self.completed += 1
+            self._on_success(ticket.latency if ticket.latency is not None else time.perf_counter() - start)
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    def update_rate_limits(self, headers):
+        """Ajusta o orçamento pelos cabeçalhos x-ratelimit-*; retorna True se havia tokens"""
+        now = time.monotonic()
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None and int(remaining_requests) <= 0:
+            self._block(now + parse_reset(headers.get("x-ratelimit-reset-requests")))
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is None:
+            return False
+        self._refill(now)
+        self._tokens = float(remaining_tokens)
+        self._tokens_reset_at = now + parse_reset(headers.get("x-ratelimit-reset-tokens"))
+        self._dispatch()
+        return True
+
+    def observe_headers(self, headers):
+        """``update_rate_limits`` chamável de qualquer thread (hooks de clientes HTTP síncronos)"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self.update_rate_limits, dict(headers))
+            return
+        self.update_rate_limits(headers)
+
+    def stats(self):
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "active": self._active,
+            "queued": self._queued,
+            "tokens_available": self._tokens,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited
+        }
+
+    # -- Fila e vagas ------------------------------------------------------
+
+    async def _acquire(self, priority, deadline, tokens):
+        self._loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if deadline <= now:
+            raise self._rejected(priority, "deadline")
+        if self._queued >= self.max_queue:
+            raise self._rejected(priority, "queue_full")
+
+        waiter = _Waiter(priority, deadline, tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+        self._queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), deadline - now)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            raise self._rejected(priority, "deadline")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        finally:
+            self._queued -= 1
+            OPENAI_QUEUE_WAIT_SECONDS.observe(
+                time.monotonic() - waiter.enqueued_at, priority=PRIORITY_NAMES[priority]
+            )
+
+    def _abandon(self, waiter):
+        """Retira o pedido da fila; se a vaga já tinha sido concedida, devolve-a"""
+        if waiter.future.cancel():
+            return
+        if waiter.future.exception() is None:
+            self._active -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """Concede vagas por ordem de prioridade respeitando limite, pausa e orçamento"""
+        now = time.monotonic()
+        self._refill(now)
+        while self._heap and self._active < int(self.limit):
+            waiter = self._heap[0][2]
+            if waiter.future.done():
+                heapq.heappop(self._heap)
+                continue
+            if waiter.deadline <= now:
+                heapq.heappop(self._heap)
+                waiter.future.set_exception(self._rejected(waiter.priority, "deadline"))
+                continue
+            wait = max(self._blocked_until - now, self._token_wait(waiter.tokens, now))
+            if wait > 0:
+                self._schedule_wakeup(wait)
+                return
+            heapq.heappop(self._heap)
+            self._active += 1
+            if self._tokens is not None:
+                self._tokens -= waiter.tokens
+            waiter.future.set_result(None)
+
+    def _token_wait(self, tokens, now):
+        """Segundos até haver tokens suficientes para o pedido"""
+        if self._tokens is None:
+            return 0.0
+        needed = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else tokens
+        if self._tokens >= needed:
+            return 0.0
+        if self.tokens_per_minute:
+            return (needed - self._tokens) / (self.tokens_per_minute / 60)
+        return max(self._tokens_reset_at - now, 0.05)
+
+    def _refill(self, now):
+        if self.tokens_per_minute and self._tokens is not None:
+            elapsed = now - self._tokens_updated
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        elif self._tokens is not None and now >= self._tokens_reset_at:
+            # Janela da API renovada: sem limite conhecido até o próximo cabeçalho
+            self._tokens = None
+        self._tokens_updated = now
+
+    def _reconcile(self, estimated, actual):
+        if self._tokens is not None:
+            self._tokens += estimated - actual
+
+    def _schedule_wakeup(self, delay):
+        loop = asyncio.get_running_loop()
+        wake_at = loop.time() + delay
+        if self._wakeup is not None and self._wakeup_at <= wake_at:
+            return
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup_at = wake_at
+        self._wakeup = loop.call_at(wake_at, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    # -- Controle adaptativo -----------------------------------------------
+
+    def _on_success(self, latency):
+        if latency > self.target_latency:
+            self._decrease(0.9)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _on_rate_limited(self, delay):
+        self.rate_limited += 1
+        self._decrease(0.5)
+        self._block(time.monotonic() + (delay or self.base_backoff))
+
+    def _decrease(self, factor):
+        # No máximo uma redução por janela de latência, para não zerar com uma rajada de erros
+        now = time.monotonic()
+        if now - self._last_decrease < min(self.target_latency, 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * factor)
+        logger.info(f"Concorrência da OpenAI reduzida para {self.limit:.1f}")
+
+    def _block(self, until):
+        self._blocked_until = max(self._blocked_until, until)
+
+    def _backoff(self, attempt):
+        """Backoff exponencial com jitter completo"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _rejected(self, priority, reason):
+        self.rejected += 1
+        OPENAI_REJECTED.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+        return RequestRejectedError(f"Requisição {PRIORITY_NAMES[priority]} descartada: {reason}", reason)
+
+
+def method_priority(name):
+    """Classe de prioridade deduzida do nome do método do serviço de IA"""
+    name = name.lower()
+    if "summar" in name or "resum" in name:
+        return PRIORITY_SUMMARY
+    if "lesson" in name or "licao" in name:
+        return PRIORITY_LESSON
+    return PRIORITY_CONVERSATION
+
+
+class ScheduledProxy:
+    """Encaminha pelo agendador os métodos assíncronos do objeto envolvido"""
+
+    def __init__(self, target, scheduler, priority_for=method_priority):
+        self._target = target
+        self._scheduler = scheduler
+        self._priority_for = priority_for
+        self._wrappers = {}
+
+    @property
+    def target(self):
+        return self._target
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+        attr = getattr(self._target, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        priority = self._priority_for(name)
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self._scheduler.submit(lambda: attr(*args, **kwargs), priority)
+
+        self._wrappers[name] = wrapper
+        return wrapper
@@ -0,0 +1,73 @@
+import logging
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.services.openai_scheduler import retry_reason
+from app.utils.metrics import OPENAI_CLIENT_RETRIES, record_openai_usage
+
+logger = logging.getLogger(__name__)
+
+
+def _record_response(response, prompt_type):
+    """Contabiliza a resposta HTTP: nova tentativa do SDK ou tokens do ``usage``"""
+    if response.headers.get("x-should-retry") != "false":
+        reason = retry_reason(response)
+        if reason is not None:
+            # O SDK repete 429/5xx sozinho (até max_retries); a última falha também conta
+            OPENAI_CLIENT_RETRIES.inc(prompt_type=prompt_type, reason=reason)
+            return
+    if response.status_code != 200:
+        return
+    try:
+        record_openai_usage(response.json(), prompt_type)
+    except ValueError as e:
+        logger.warning(f"Resposta da OpenAI sem JSON válido: {str(e)}")
+
+
+def _has_json_body(response):
+    # Streaming (text/event-stream) não é lido aqui: consumir o corpo atrasaria o 1º trecho
+    return "application/json" in response.headers.get("content-type", "")
+
+
+def usage_event_hooks(prompt_type, asynchronous=True, scheduler=None):
+    """Hooks de resposta do httpx que contabilizam tokens e novas tentativas de toda chamada.
+
+    Com ``scheduler`` (OpenAIScheduler) os cabeçalhos ``x-ratelimit-*`` de cada
+    resposta, inclusive das novas tentativas do SDK e dos streams, atualizam o
+    orçamento de tokens do agendador.
+    """
+    if asynchronous:
+        async def on_response(response):
+            if scheduler is not None:
+                scheduler.observe_headers(response.headers)
+            if _has_json_body(response):
+                await response.aread()
+            _record_response(response, prompt_type)
+    else:
+        def on_response(response):
+            if scheduler is not None:
+                scheduler.observe_headers(response.headers)
+            if _has_json_body(response):
+                response.read()
+            _record_response(response, prompt_type)
+    return {"response": [on_response]}
+
+
+def instrument_client(client, prompt_type, scheduler=None, **http_options):
+    """Cópia do cliente da OpenAI (síncrono ou assíncrono) com os hooks de uso.
+
+    Objetos que não são clientes da OpenAI são devolvidos sem alteração.
+    """
+    if isinstance(client, AsyncOpenAI):
+        http_client = httpx.AsyncClient(
+            event_hooks=usage_event_hooks(prompt_type, scheduler=scheduler), follow_redirects=True, **http_options
+        )
+    elif isinstance(client, OpenAI):
+        http_client = httpx.Client(
+            event_hooks=usage_event_hooks(prompt_type, asynchronous=False, scheduler=scheduler),
+            follow_redirects=True, **http_options
+        )
+    else:
+        return client
+    return client.with_options(http_client=http_client)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+
+from app.services.openai_scheduler import PRIORITY_LESSON
+from app.utils.metrics import record_openai_usage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOPICS = (
+    "daily routine", "family", "food", "travel", "work",
+    "hobbies", "shopping", "health", "weather", "technology"
+)
+
+_KIND_INSTRUCTIONS = {
+    "lesson": (
+        'Create a short English lesson. Reply only with JSON: {"title": str, '
+        '"explanation": str (in Portuguese), "examples": [str], "exercise": str}'
+    ),
+    "practice": (
+        'Create a free conversation practice prompt for the student. Reply only '
+        'with JSON: {"prompt": str}'
+    ),
+    "assessment_question": (
+        'Create one multiple choice question to assess English level. Reply only '
+        'with JSON: {"question": str, "options": ["A) ...", "B) ...", "C) ...", '
+        '"D) ..."], "correct_answer": "A"|"B"|"C"|"D", "question_type": "multiple_choice"}'
+    )
+}
+
+
+class OpenAIContentGenerator:
+    """Gera lições e perguntas em JSON diretamente pela API da OpenAI"""
+
+    def __init__(self, api_key, model="gpt-3.5-turbo", scheduler=None):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.scheduler = scheduler
+
+    async def __call__(self, level, kind, topic):
+        request = dict(
+            model=self.model,
+            temperature=0.8,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are Alex, a friendly English teacher for Brazilian students."
+                },
+                {
+                    "role": "user",
+                    "content": f"CEFR level: {level}. Topic: {topic}. {_KIND_INSTRUCTIONS[kind]}"
+                }
+            ]
+        )
+        if self.scheduler:
+            response = await self.scheduler.chat_completion(self.client, PRIORITY_LESSON, **request)
+        else:
+            response = await self.client.chat.completions.create(**request)
+        record_openai_usage(response, "question_bank")
+        text = response.choices[0].message.content.strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return {"text": text}
+
+
+class QuestionBankBuilder:
+    """Preenche o banco de perguntas offline com concorrência limitada"""
+
+    def __init__(self, bank, generate, concurrency=4, batch_size=50):
+        self.bank = bank
+        self.generate = generate
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.generated = 0
+        self.failed = 0
+
+    async def build(self, levels, kinds, topics=DEFAULT_TOPICS, per_topic=1):
+        """Gera ``per_topic`` itens para cada combinação de nível, tipo e tópico"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = []
+
+        async def generate_one(level, kind, topic):
+            async with semaphore:
+                try:
+                    content = await self.generate(level, kind, topic)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Falha ao gerar {kind} {level}/{topic}: {str(e)}")
+                    return
+            pending.append({"level": level, "kind": kind, "topic": topic, "content": content})
+            self.generated += 1
+            if len(pending) >= self.batch_size:
+                await self._flush(pending)
+
+        await asyncio.gather(*(
+            generate_one(level, kind, topic)
+            for level in levels
+            for kind in kinds
+            for topic in topics
+            for _ in range(per_topic)
+        ))
+        await self._flush(pending)
+        return self.generated
+
+    async def _flush(self, pending):
+        if not pending:
+            return
+        batch = pending[:]
+        del pending[:]
+        await self.bank.pool.run(self.bank.add_items, batch)
+        logger.info(f"{len(batch)} itens gravados no banco de perguntas")
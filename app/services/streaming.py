@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import re
+import time
+
+from app.services.openai_scheduler import PRIORITY_CONVERSATION, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+# Limite de caracteres por mensagem do WhatsApp via Twilio
+WHATSAPP_MAX_CHARS = 1600
+
+_SENTENCE_END = re.compile(r"[.!?…](?:[\"')\]]*)\s+")
+
+
+class MessageChunker:
+    """Corta um texto em streaming em mensagens do tamanho do WhatsApp.
+
+    O primeiro pedaço é liberado cedo (no primeiro limite de parágrafo ou de
+    frase após ``first_chars``); os seguintes são maiores, para não inundar o
+    usuário com mensagens curtas.
+    """
+
+    def __init__(self, first_chars=200, target_chars=1000, max_chars=WHATSAPP_MAX_CHARS):
+        self.first_chars = first_chars
+        self.target_chars = target_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, text):
+        """Acrescenta texto e retorna a lista de pedaços prontos para envio"""
+        self._buffer += text
+        chunks = []
+        while True:
+            chunk = self._take()
+            if chunk is None:
+                return chunks
+            chunks.append(chunk)
+
+    def flush(self):
+        """Retorna o restante do texto (no fim do streaming)"""
+        chunks = []
+        while len(self._buffer) > self.max_chars:
+            chunks.append(self._cut(self._boundary(self.max_chars) or self.max_chars))
+        if self._buffer.strip():
+            chunks.append(self._cut(len(self._buffer)))
+        self._buffer = ""
+        return chunks
+
+    def _take(self):
+        wanted = self.first_chars if self._emitted == 0 else self.target_chars
+        if len(self._buffer) < wanted:
+            # O primeiro pedaço pode sair antes se um parágrafo já terminou
+            paragraph = self._buffer.find("\n\n")
+            if self._emitted == 0 and paragraph > 0:
+                return self._cut(paragraph + 2)
+            return None
+        cut = self._boundary(min(len(self._buffer), self.max_chars), start=wanted)
+        if cut is None:
+            if len(self._buffer) < self.max_chars:
+                return None
+            cut = self._boundary(self.max_chars) or self.max_chars
+        return self._cut(cut)
+
+    def _boundary(self, limit, start=0):
+        """Último limite de parágrafo ou frase dentro de ``limit`` (e depois de ``start``)"""
+        window = self._buffer[:limit]
+        paragraph = window.rfind("\n\n")
+        if paragraph >= start and paragraph > 0:
+            return paragraph + 2
+        last = None
+        for match in _SENTENCE_END.finditer(window):
+            if match.end() >= start:
+                last = match.end()
+        return last
+
+    def _cut(self, position):
+        chunk, self._buffer = self._buffer[:position], self._buffer[position:]
+        self._emitted += 1
+        return chunk.strip()
+
+
+def split_message(text, max_chars=WHATSAPP_MAX_CHARS):
+    """Divide uma resposta pronta em mensagens de até ``max_chars`` (limites de parágrafo ou frase)"""
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
+    chunker = MessageChunker(first_chars=max_chars, target_chars=max_chars, max_chars=max_chars)
+    return chunker.feed(text) + chunker.flush()
+
+
+async def _stream_deltas(client, model, messages, temperature):
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True
+    )
+    async for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+
+
+async def stream_completion(client, model, messages, temperature=0.7, scheduler=None):
+    """Gera os trechos de texto de uma completion em streaming (AsyncOpenAI)
+
+    Com ``scheduler`` (OpenAIScheduler) a vaga de conversa fica reservada até o
+    fim do streaming e a latência observada é o tempo até o primeiro trecho.
+    """
+    if scheduler is None:
+        async for delta in _stream_deltas(client, model, messages, temperature):
+            yield delta
+        return
+
+    async with scheduler.slot(PRIORITY_CONVERSATION, tokens=estimate_request_tokens(messages)) as ticket:
+        start = time.perf_counter()
+        async for delta in _stream_deltas(client, model, messages, temperature):
+            if ticket.latency is None:
+                ticket.latency = time.perf_counter() - start
+            yield delta
+
+
+async def finish_with(deltas, on_complete):
+    """Repassa os trechos e, ao fim do streaming, chama ``on_complete(texto completo)``.
+
+    Se a geração falhar no meio, o erro segue para quem consome e ``on_complete``
+    não é chamado.
+    """
+    parts = []
+    async for delta in deltas:
+        parts.append(delta)
+        yield delta
+    await on_complete("".join(parts))
+
+
+async def collect_text(response):
+    """Texto completo de uma resposta; trechos de streaming são concatenados"""
+    if hasattr(response, "__aiter__"):
+        return "".join([delta async for delta in response])
+    return response
+
+
+CONVERSATION_PROMPT = (
+    "You are Alex, a friendly English teacher chatting on WhatsApp with a Brazilian "
+    "student whose English level is {level}. Reply in English adapted to that level, "
+    "keep the conversation going with a question and gently point out mistakes, "
+    "explaining them in Portuguese."
+)
+
+
+class StreamingConversation:
+    """Respostas de conversa livre em streaming (modo async do webhook).
+
+    O prompt vem do resumo incremental (``conversation_context.build_messages``)
+    quando ele está habilitado; sem ele, só a mensagem atual é enviada.
+    """
+
+    def __init__(self, api_key, model="gpt-3.5-turbo", scheduler=None, conversation_context=None,
+                 temperature=0.7):
+        from openai import AsyncOpenAI
+        from app.services.openai_usage import instrument_client
+
+        # Os cabeçalhos x-ratelimit-* do stream também alimentam o orçamento do agendador
+        self.client = instrument_client(AsyncOpenAI(api_key=api_key), "conversation", scheduler=scheduler)
+        self.model = model
+        self.scheduler = scheduler
+        self.conversation_context = conversation_context
+        self.temperature = temperature
+
+    async def reply(self, sender, level, body, extra_context=""):
+        """Iterador assíncrono com os trechos da resposta (``extra_context`` vai no prompt de sistema)"""
+        system_prompt = CONVERSATION_PROMPT.format(level=level)
+        if extra_context:
+            system_prompt = f"{system_prompt}\n\n{extra_context}"
+        if self.conversation_context:
+            messages = await self.conversation_context.build_messages(sender, system_prompt, body)
+        else:
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": body}]
+        return stream_completion(self.client, self.model, messages, self.temperature, self.scheduler)
+
+
+class StreamingResponder:
+    """Entrega uma resposta em streaming como várias mensagens, na ordem"""
+
+    def __init__(self, reply_sender, chunker_factory=MessageChunker):
+        self.reply_sender = reply_sender
+        self.chunker_factory = chunker_factory
+        self.deliveries = 0
+        self.total_first_message_seconds = 0.0
+        self.total_generation_seconds = 0.0
+        self.max_first_message_seconds = 0.0
+
+    async def deliver(self, to, deltas):
+        """Consome ``deltas`` (iterador assíncrono) e envia cada pedaço assim que fica pronto"""
+        start = time.perf_counter()
+        chunker = self.chunker_factory()
+        outbox = asyncio.Queue()
+        timings = {"first_message": None, "generation": None, "messages": 0}
+
+        async def send_in_order():
+            while True:
+                chunk = await outbox.get()
+                if chunk is None:
+                    return
+                await self.reply_sender.send(to, chunk)
+                timings["messages"] += 1
+                if timings["first_message"] is None:
+                    timings["first_message"] = time.perf_counter() - start
+
+        # O envio corre em paralelo para que a geração não espere a Twilio
+        sender_task = asyncio.create_task(send_in_order())
+        parts = []
+        try:
+            async for delta in deltas:
+                if sender_task.done():
+                    # O envio falhou: não adianta continuar gerando (o erro sai no await abaixo)
+                    break
+                parts.append(delta)
+                for chunk in chunker.feed(delta):
+                    outbox.put_nowait(chunk)
+            for chunk in chunker.flush():
+                outbox.put_nowait(chunk)
+            timings["generation"] = time.perf_counter() - start
+        except BaseException:
+            outbox.put_nowait(None)
+            # O erro da geração prevalece sobre uma eventual falha de envio
+            await asyncio.gather(sender_task, return_exceptions=True)
+            raise
+        outbox.put_nowait(None)
+        await sender_task
+
+        self._record(timings)
+        return "".join(parts), timings
+
+    def _record(self, timings):
+        if timings["first_message"] is None:
+            return
+        self.deliveries += 1
+        self.total_first_message_seconds += timings["first_message"]
+        self.total_generation_seconds += timings["generation"] or 0.0
+        self.max_first_message_seconds = max(self.max_first_message_seconds, timings["first_message"])
+
+    def stats(self):
+        """Tempo até a primeira mensagem e tempo total de geração"""
+        count = self.deliveries or 1
+        return {
+            "deliveries": self.deliveries,
+            "avg_first_message_ms": self.total_first_message_seconds * 1000 / count,
+            "max_first_message_ms": self.max_first_message_seconds * 1000,
+            "avg_generation_ms": self.total_generation_seconds * 1000 / count
+        }
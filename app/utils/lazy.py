@@ -0,0 +1,39 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyObject:
+    """Constrói o objeto na primeira vez que ele é usado.
+
+    Serviços que carregam SDKs pesados (OpenAI, Twilio) ficam fora do caminho de
+    inicialização: o custo de importar e construir cai na primeira chamada.
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "objeto")
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        """Retorna a instância, construindo-a se necessário"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    logger.info(f"{self._name} inicializado em {(time.perf_counter() - start) * 1000:.0f} ms")
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
@@ -0,0 +1,399 @@
+import asyncio
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Contador monotônico"""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor instantâneo"""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Histograma com buckets cumulativos (formato Prometheus)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede a duração do bloco ``with``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = ("le", _format_value(bound) if bound != float("inf") else "+Inf")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro de métricas com exportação no formato texto do Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector):
+        """Registra uma função chamada a cada exportação (ex.: copiar stats() para gauges)"""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Exporta todas as métricas no formato texto do Prometheus"""
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Estado de todas as métricas em formato JSON (para agregar entre processos)"""
+        for collector in self._collectors:
+            collector()
+        snapshot = {}
+        for metric in list(self._metrics.values()):
+            with metric._lock:
+                values = [[list(key), value] for key, value in metric._values.items()]
+            snapshot[metric.name] = {
+                "type": metric.type_name,
+                "documentation": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(metric.buckets[:-1]) if isinstance(metric, Histogram) else None,
+                "values": values
+            }
+        return snapshot
+
+
+def merge_snapshots(snapshots):
+    """Combina os snapshots de vários processos no formato texto do Prometheus.
+
+    ``snapshots`` é uma lista de ``(pid, snapshot, live)``. Contadores e
+    histogramas são somados; gauges ganham o rótulo ``pid`` e os de processos
+    que pararam de atualizar (``live`` falso) são descartados.
+    """
+    merged = {}
+    for pid, snapshot, live in snapshots:
+        for name, data in snapshot.items():
+            metric = merged.get(name)
+            if metric is None:
+                if data["type"] == "histogram":
+                    metric = Histogram(name, data["documentation"], data["labelnames"], data["buckets"])
+                elif data["type"] == "gauge":
+                    metric = Gauge(name, data["documentation"], data["labelnames"] + ["pid"])
+                else:
+                    metric = Counter(name, data["documentation"], data["labelnames"])
+                merged[name] = metric
+            for key, value in data["values"]:
+                key = tuple(key)
+                if data["type"] == "gauge":
+                    if live:
+                        metric._values[key + (str(pid),)] = value
+                elif data["type"] == "histogram":
+                    state = metric._values.setdefault(key, [[0] * len(metric.buckets), 0.0, 0])
+                    state[0] = [a + b for a, b in zip(state[0], value[0])]
+                    state[1] += value[1]
+                    state[2] += value[2]
+                else:
+                    metric._values[key] = metric._values.get(key, 0) + value
+    lines = []
+    for metric in merged.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MultiProcessMetrics:
+    """Métricas de todos os workers do uvicorn num único /metrics.
+
+    Cada processo tem o seu ``REGISTRY``; sem agregação o Prometheus leria os
+    contadores do worker que atendesse a coleta. Cada worker grava o próprio
+    snapshot em ``directory/<pid>.json`` a cada ``interval`` segundos (e a cada
+    coleta que atende), e o ``/metrics`` soma os arquivos de todos. Contadores de
+    workers encerrados continuam somados para que os totais não regridam.
+    """
+
+    def __init__(self, directory, registry=None, interval=5.0, pid=None):
+        self.directory = directory
+        self.registry = registry or REGISTRY
+        self.interval = interval
+        self.pid = pid or os.getpid()
+        self.path = os.path.join(directory, f"{self.pid}.json")
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def reset(directory):
+        """Remove os snapshots de uma execução anterior (chamar antes de iniciar os workers)"""
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+
+    def write(self):
+        """Grava o snapshot deste processo (troca atômica do arquivo)"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as snapshot_file:
+            json.dump(self.registry.snapshot(), snapshot_file)
+        os.replace(tmp_path, self.path)
+
+    def render(self):
+        """Métricas agregadas de todos os workers no formato texto do Prometheus"""
+        self.write()
+        now = time.time()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+                live = now - os.path.getmtime(path) <= 3 * self.interval
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot de métricas ignorado ({path}): {str(e)}")
+                continue
+            pid = os.path.splitext(os.path.basename(path))[0]
+            snapshots.append((pid, snapshot, live or path == self.path))
+        return merge_snapshots(snapshots)
+
+    async def run(self):
+        """Grava o snapshot periodicamente até ser cancelado"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Erro ao gravar snapshot de métricas: {str(e)}")
+
+
+REGISTRY = MetricsRegistry()
+
+EXTERNAL_CALL_SECONDS = REGISTRY.histogram(
+    "alex_external_call_seconds",
+    "Duração das chamadas ao banco de dados e à IA",
+    ("component", "method")
+)
+EXTERNAL_CALL_ERRORS = REGISTRY.counter(
+    "alex_external_call_errors_total",
+    "Erros nas chamadas ao banco de dados e à IA",
+    ("component", "method")
+)
+WEBHOOK_STAGE_SECONDS = REGISTRY.histogram(
+    "alex_webhook_stage_seconds",
+    "Duração de cada etapa do processamento do webhook",
+    ("stage",)
+)
+MESSAGE_SECONDS = REGISTRY.histogram(
+    "alex_message_seconds",
+    "Duração do processamento de uma mensagem (máquina de estados ou caminho rápido)",
+    ("command", "level", "path")
+)
+MESSAGES_TOTAL = REGISTRY.counter(
+    "alex_messages_total",
+    "Mensagens processadas",
+    ("command", "level", "path")
+)
+OPENAI_TOKENS = REGISTRY.counter(
+    "alex_openai_tokens_total",
+    "Tokens consumidos na OpenAI",
+    ("prompt_type", "kind")
+)
+OPENAI_CLIENT_RETRIES = REGISTRY.counter(
+    "alex_openai_client_retries_total",
+    "Respostas transitórias (429/5xx) que o SDK da OpenAI tenta de novo",
+    ("prompt_type", "reason")
+)
+OPENAI_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "alex_openai_queue_wait_seconds",
+    "Tempo de espera na fila do agendador da OpenAI",
+    ("priority",)
+)
+OPENAI_REJECTED = REGISTRY.counter(
+    "alex_openai_rejected_total",
+    "Requisições à OpenAI descartadas pelo agendador",
+    ("priority", "reason")
+)
+OPENAI_RETRIES = REGISTRY.counter(
+    "alex_openai_retries_total",
+    "Novas tentativas de requisições à OpenAI",
+    ("priority", "reason")
+)
+
+MEDIA_STAGE_SECONDS = REGISTRY.histogram(
+    "alex_media_stage_seconds",
+    "Duração de cada etapa do processamento de mensagens de voz",
+    ("stage",)
+)
+
+MEDIA_RESULTS = REGISTRY.counter(
+    "alex_media_results_total",
+    "Mensagens de voz por resultado (transcrita, reaproveitada, ignorada, erro)",
+    ("result",)
+)
+
+
+def record_openai_usage(response, prompt_type):
+    """Contabiliza tokens de prompt/completion de uma resposta da OpenAI (objeto do SDK ou JSON)"""
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    OPENAI_TOKENS.inc(usage.get("prompt_tokens") or 0, prompt_type=prompt_type, kind="prompt")
+    OPENAI_TOKENS.inc(usage.get("completion_tokens") or 0, prompt_type=prompt_type, kind="completion")
+
+
+class InstrumentedProxy:
+    """Mede a duração e os erros de cada método chamado no objeto envolvido"""
+
+    def __init__(self, target, component, histogram=EXTERNAL_CALL_SECONDS, errors=EXTERNAL_CALL_ERRORS):
+        self._target = target
+        self._component = component
+        self._histogram = histogram
+        self._errors = errors
+        self._wrappers = {}
+
+    @property
+    def target(self):
+        return self._target
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        labels = {"component": self._component, "method": name}
+        if asyncio.iscoroutinefunction(attr):
+            @functools.wraps(attr)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await attr(*args, **kwargs)
+                except Exception:
+                    self._errors.inc(**labels)
+                    raise
+                finally:
+                    self._histogram.observe(time.perf_counter() - start, **labels)
+        else:
+            @functools.wraps(attr)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                except Exception:
+                    self._errors.inc(**labels)
+                    raise
+                finally:
+                    self._histogram.observe(time.perf_counter() - start, **labels)
+
+        self._wrappers[name] = wrapper
+        return wrapper
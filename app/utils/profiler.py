@@ -0,0 +1,89 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SlowRequestProfiler:
+    """Profiler por amostragem da thread do event loop, ativado em tempo de execução.
+
+    Enquanto ligado, uma thread de fundo amostra a pilha da thread do event loop
+    a cada ``interval`` segundos, mas apenas quando alguma requisição está em
+    andamento há mais de ``threshold`` segundos. As pilhas são acumuladas no
+    formato "collapsed" (compatível com flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, threshold=1.0, interval=0.005, max_depth=40):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._active = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target_thread_id = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id=None):
+        """Liga o profiler para a thread informada (padrão: a thread atual)"""
+        if self.enabled:
+            return
+        self._target_thread_id = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Desliga o profiler mantendo as amostras coletadas"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def request_started(self):
+        """Marca o início de uma requisição; retorna o identificador a passar para request_finished"""
+        with self._lock:
+            self._next_id += 1
+            self._active[self._next_id] = time.monotonic()
+            return self._next_id
+
+    def request_finished(self, request_id):
+        with self._lock:
+            self._active.pop(request_id, None)
+
+    def _has_slow_request(self):
+        limit = time.monotonic() - self.threshold
+        with self._lock:
+            return any(started <= limit for started in self._active.values())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._has_slow_request():
+                continue
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            with self._lock:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self, top=50):
+        """Pilhas mais frequentes no formato "collapsed" (uma por linha)"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(top)) + "\n"
@@ -0,0 +1,50 @@
+import os
+import argparse
+from dotenv import load_dotenv
+
+from app.database.connection_pool import SQLitePool
+from app.database.archive import InteractionArchive
+from app.database.sharding import shard_paths
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Arquiva o histórico antigo de interações e compacta o banco")
+    parser.add_argument("--retention-days", type=int, default=int(os.getenv("ARCHIVE_RETENTION_DAYS", "90")),
+                        help="Interações mais novas que isso ficam no banco")
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "database/archive"),
+                        help="Diretório dos arquivos mensais .jsonl.gz")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Interações movidas por transação")
+    parser.add_argument("--vacuum-seconds", type=float, default=60,
+                        help="Tempo máximo do VACUUM incremental após o arquivamento (0 desativa)")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Ativa auto_vacuum incremental (faz um VACUUM completo uma única vez)")
+    return parser.parse_args()
+
+
+def archive_database(path, args):
+    """Arquiva e compacta um arquivo de banco (o banco único ou um dos shards)"""
+    pool = SQLitePool(path)
+    try:
+        archive = InteractionArchive(pool, args.archive_dir, args.retention_days, args.batch_size)
+        archive.ensure_schema()
+        if args.enable_incremental_vacuum:
+            archive.enable_incremental_vacuum()
+        moved = archive.archive()
+        print(f"{path}: interações arquivadas: {moved}")
+        if args.vacuum_seconds:
+            released = archive.incremental_vacuum(max_seconds=args.vacuum_seconds)
+            print(f"{path}: páginas liberadas pelo VACUUM incremental: {released}")
+    finally:
+        pool.close()
+
+
+def main(args):
+    database_path = os.getenv("DATABASE_PATH", "database/alex_bot.db")
+    for path in shard_paths(database_path, int(os.getenv("DATABASE_SHARDS", "1"))):
+        archive_database(path, args)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main(parse_args())
@@ -0,0 +1,113 @@
+import os
+import time
+import argparse
+from itertools import islice
+from dotenv import load_dotenv
+
+from app.database.archive import InteractionArchive
+from app.database.connection_pool import SQLitePool
+from app.database.sharding import shard_paths
+from app.database.progress_aggregates import ProgressAggregates, apply_interaction, classify_message
+
+_INTERACTIONS_PAGE = """
+SELECT id, user_id, message, created_at FROM interactions
+WHERE id > ? AND id <= ?
+ORDER BY id LIMIT ?
+"""
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Reconstrói os agregados de progresso a partir do histórico")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Interações processadas por transação")
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "database/archive"),
+                        help="Diretório dos arquivos mensais gerados pelo archive_history.py")
+    return parser.parse_args()
+
+
+def backfill(args):
+    """Reconstrói os agregados do banco único ou de cada shard"""
+    database_path = os.getenv("DATABASE_PATH", "database/alex_bot.db")
+    for path in shard_paths(database_path, int(os.getenv("DATABASE_SHARDS", "1"))):
+        print(f"Banco {path}")
+        backfill_database(path, args)
+
+
+def hot_ids(pool, ids, chunk=500):
+    """Ids que ainda estão na tabela interactions (consultas com até ``chunk`` parâmetros)"""
+    found = set()
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        rows = pool.fetch_all(f"SELECT id FROM interactions WHERE id IN ({','.join('?' * len(part))})", part)
+        found.update(row["id"] for row in rows)
+    return found
+
+
+def apply_rows(conn, rows):
+    """Aplica um lote de interações (do banco ou do arquivo) aos agregados"""
+    for row in rows:
+        day = (row["created_at"] or "")[:10] or None
+        apply_interaction(conn, row["user_id"], classify_message(row["message"]), day)
+
+
+def backfill_database(path, args):
+    """Apaga os agregados e reaplica o histórico em lotes, em ordem cronológica"""
+    pool = SQLitePool(path)
+    try:
+        aggregates = ProgressAggregates(pool)
+        aggregates.ensure_schema()
+        aggregates.clear()
+
+        # Interações gravadas depois deste ponto já atualizam os agregados ao vivo
+        high_water = pool.fetch_one("SELECT COALESCE(MAX(id), 0) AS max_id FROM interactions")["max_id"]
+        start = time.perf_counter()
+
+        # Primeiro o histórico arquivado (mais antigo), que já saiu da tabela interactions
+        archive = InteractionArchive(pool, args.archive_dir)
+        archive.ensure_schema()
+        archived_rows = archive.iter_all_archived()
+        archived = 0
+        while True:
+            rows = list(islice(archived_rows, args.batch_size))
+            if not rows:
+                break
+            # Um arquivamento interrompido deixa o lote no arquivo e no banco: conta só pelo banco
+            still_hot = hot_ids(pool, [row["id"] for row in rows])
+            rows = [row for row in rows if row["id"] not in still_hot]
+            with pool.transaction() as conn:
+                apply_rows(conn, rows)
+            archived += len(rows)
+            print(f"  {archived} interações arquivadas processadas")
+
+        last_id, total = 0, archived
+        while True:
+            rows = pool.fetch_all(_INTERACTIONS_PAGE, (last_id, high_water, args.batch_size))
+            if not rows:
+                break
+            with pool.transaction() as conn:
+                apply_rows(conn, rows)
+            last_id = rows[-1]["id"]
+            total += len(rows)
+            print(f"  {total} interações processadas (id {last_id}/{high_water})")
+
+        # Nível atual de cada usuário (o histórico não guarda o nível de cada interação)
+        with pool.transaction() as conn:
+            conn.execute(
+                "UPDATE user_progress SET current_level = "
+                "(SELECT level FROM users WHERE users.id = user_progress.user_id)"
+            )
+            conn.execute(
+                "INSERT INTO user_level_history (user_id, level, changed_at) "
+                "SELECT user_id, current_level, COALESCE(last_active_date, DATE('now')) "
+                "FROM user_progress WHERE current_level IS NOT NULL"
+            )
+        print(f"Agregados reconstruídos: {total} interações em {time.perf_counter() - start:.1f}s")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    if not os.getenv("DATABASE_PATH"):
+        print("Aviso: DATABASE_PATH não configurado, usando database/alex_bot.db")
+    backfill(parse_args())
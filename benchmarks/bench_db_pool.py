@@ -0,0 +1,113 @@
+"""Micro-benchmark: conexão por chamada vs. SQLitePool em modo WAL.
+
+Uso:
+    python benchmarks/bench_db_pool.py [--users 2000] [--ops 5000] [--threads 8]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection_pool import SQLitePool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone_number TEXT UNIQUE NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    message TEXT,
+    response TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+GET_USER = "SELECT * FROM users WHERE phone_number = ?"
+INSERT_HISTORY = "INSERT INTO interactions (user_id, message, response) VALUES (?, ?, ?)"
+
+
+def prepare_database(path, users):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO users (phone_number, name) VALUES (?, ?)",
+        [(f"whatsapp:+55{i:011d}", f"Aluno {i}") for i in range(users)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def per_call_operation(path, phone, user_id):
+    """Comportamento atual: uma conexão nova por consulta"""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute(GET_USER, (phone,)).fetchone()
+    finally:
+        conn.close()
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute(INSERT_HISTORY, (user_id, "hello", "Hi there!"))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled_operation(pool, phone, user_id):
+    pool.fetch_one(GET_USER, (phone,))
+    pool.execute_query(INSERT_HISTORY, (user_id, "hello", "Hi there!"))
+
+
+def run(label, operation, users, ops, threads):
+    workload = [
+        (f"whatsapp:+55{i:011d}", i + 1)
+        for i in (random.randrange(users) for _ in range(ops))
+    ]
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(operation, phone, user_id) for phone, user_id in workload]
+        for future in futures:
+            try:
+                future.result()
+            except sqlite3.OperationalError:
+                errors += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {ops / elapsed:>10.0f} ops/s  {elapsed * 1000 / ops:>8.3f} ms/op  erros: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_path = os.path.join(tmp, "per_call.db")
+        pooled_path = os.path.join(tmp, "pooled.db")
+        prepare_database(baseline_path, args.users)
+        prepare_database(pooled_path, args.users)
+
+        print(f"{args.ops} operações (busca de usuário + inserção de histórico), {args.threads} threads")
+        run("conexão por chamada", lambda p, u: per_call_operation(baseline_path, p, u),
+            args.users, args.ops, args.threads)
+
+        pool = SQLitePool(pooled_path, size=args.threads)
+        try:
+            run("SQLitePool (WAL)", lambda p, u: pooled_operation(pool, p, u),
+                args.users, args.ops, args.threads)
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
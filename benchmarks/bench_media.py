@@ -0,0 +1,99 @@
+"""Benchmark do pipeline de mensagens de voz contra servidores falsos (sem rede externa).
+
+Sobe o servidor de mídia e a OpenAI falsos (benchmarks/fake_services.py), envia
+``--messages`` mensagens de voz com ``--unique`` áudios distintos e mostra a
+latência total e a duração média de cada etapa.
+
+Uso:
+    python benchmarks/bench_media.py [--messages 200] [--unique 50] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.database.connection_pool import SQLitePool
+from app.services.media_pipeline import MediaPipeline, OpenAITranscriber
+from app.utils.metrics import REGISTRY
+from benchmarks.fake_services import LatencyProfile, start_fake_media, start_fake_openai
+
+_STAGE_SAMPLE = re.compile(r'^alex_media_stage_seconds_(sum|count)\{stage="(\w+)"\} (\S+)$')
+
+
+def stage_means():
+    """Duração média por etapa a partir do histograma exportado"""
+    totals = {}
+    for line in REGISTRY.render().splitlines():
+        match = _STAGE_SAMPLE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {})[kind] = float(value)
+    return {stage: values["sum"] / values["count"] for stage, values in totals.items() if values.get("count")}
+
+
+async def run(args):
+    media_server = start_fake_media(profile=LatencyProfile(args.media_latency_ms))
+    openai_server = start_fake_openai(profile=LatencyProfile(args.transcribe_latency_ms))
+    workdir = tempfile.mkdtemp(prefix="bench_media_")
+    pool = SQLitePool(os.path.join(workdir, "bench.db"))
+    pipeline = MediaPipeline(
+        pool,
+        OpenAITranscriber("sk-fake", base_url=f"{openai_server.url}/v1"),
+        media_dir=os.path.join(workdir, "media"),
+        transcode_workers=args.transcode_workers,
+        transcribe_concurrency=args.transcribe_concurrency
+    )
+    pipeline.ensure_schema()
+    await pipeline.start()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def voice_message(index):
+        url = f"{media_server.url}/media/note-{index % args.unique}?seconds={args.seconds}"
+        async with semaphore:
+            start = time.perf_counter()
+            await pipeline.transcribe_url(url)
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(voice_message(i) for i in range(args.messages)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await pipeline.stop()
+        pool.close()
+        media_server.stop()
+        openai_server.stop()
+
+    latencies.sort()
+    print(f"{args.messages} mensagens de voz ({args.unique} áudios distintos) em {elapsed:.2f}s")
+    print(f"  latência p50 {statistics.median(latencies) * 1000:.0f} ms | "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+    for stage, mean in sorted(stage_means().items()):
+        print(f"  {stage:<16} média {mean * 1000:.1f} ms")
+    print(f"  {pipeline.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--unique", type=int, default=50, help="Áudios distintos (o resto são repetições)")
+    parser.add_argument("--seconds", type=float, default=5, help="Duração de cada áudio")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--transcode-workers", type=int, default=2)
+    parser.add_argument("--transcribe-concurrency", type=int, default=4)
+    parser.add_argument("--media-latency-ms", type=float, default=50)
+    parser.add_argument("--transcribe-latency-ms", type=float, default=400)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
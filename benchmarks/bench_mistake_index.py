@@ -0,0 +1,76 @@
+"""Micro-benchmark do índice de erros: busca por similaridade e seleção para revisão.
+
+Uso:
+    python benchmarks/bench_mistake_index.py [--mistakes 20000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection_pool import SQLitePool
+from app.database.mistake_index import DAY, MistakeIndex, mistake_text
+from app.services.grammar_check import IRREGULAR_PAST
+
+QUERIES = ["I goed to the beach", "past tense of eat", "she don't like it", "irregular verbs", "we was late"]
+
+
+def populate(index, user_id, mistakes):
+    """Grava erros sintéticos com vencimentos espalhados pelos últimos dez dias"""
+    words = list(IRREGULAR_PAST.items())
+    now = time.time()
+    rows = []
+    for i in range(mistakes):
+        wrong, right = random.choice(words)
+        original = f"{wrong} {i}"
+        vector = index.vectorizer.transform(mistake_text("irregular_past", original, right))
+        rows.append((user_id, "irregular_past", original, right, vector.astype("float16").tobytes(),
+                     now - random.random() * 10 * DAY, now))
+    index.pool.executemany(
+        "INSERT INTO user_mistakes (user_id, category, original, corrected, embedding, review_due, last_seen) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def measure(operation, queries):
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        operation(QUERIES[i % len(QUERIES)])
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mistakes", type=int, default=20000, help="Erros gravados para o usuário")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pool = SQLitePool(os.path.join(workdir, "bench.db"))
+        index = MistakeIndex(pool)
+        index.ensure_schema()
+        populate(index, 1, args.mistakes)
+
+        start = time.perf_counter()
+        index.similar(1, "warm up")
+        print(f"{args.mistakes} erros | carga inicial da matriz: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        for name, operation in (
+            ("similar (top 5)", lambda text: index.similar(1, text, k=5)),
+            ("select_for_review (top 3)", lambda text: index.select_for_review(1, text, k=3))
+        ):
+            p50, p99 = measure(operation, args.queries)
+            print(f"  {name:<27} p50 {p50:.3f} ms | p99 {p99:.3f} ms")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
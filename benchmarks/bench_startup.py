@@ -0,0 +1,163 @@
+"""Benchmark de inicialização: tempo de importação, migrações e prontidão do servidor.
+
+Mede, em processos novos (sem cache de módulos em memória):
+
+* ``import main``: mediana de ``--runs`` execuções e os módulos mais caros
+  segundo ``python -X importtime``;
+* ``MigrationRunner``: banco novo (aplica tudo) e esquema em dia (caminho rápido);
+* prontidão: do início do uvicorn até ``/ready`` responder 200, no primeiro boot
+  (banco vazio) e num boot seguinte (esquema em dia).
+
+Uso:
+    python benchmarks/bench_startup.py [--runs 5] [--top 10] [--skip-server]
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.load_test import free_port
+
+FAKE_ENV = {
+    "OPENAI_API_KEY": "sk-fake",
+    "TWILIO_ACCOUNT_SID": "ACfake",
+    "TWILIO_AUTH_TOKEN": "fake",
+    "TWILIO_PHONE_NUMBER": "whatsapp:+15550000000"
+}
+
+
+def child_env(database_path):
+    env = dict(os.environ)
+    env.update(FAKE_ENV)
+    env["DATABASE_PATH"] = database_path
+    return env
+
+
+def time_import(module, env, runs):
+    """Mediana (ms) de ``import module`` num interpretador novo, medida dentro do processo"""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip()) * 1000)
+    return statistics.median(timings)
+
+
+def top_imports(module, env, top):
+    """Dependências diretas de ``module`` com maior tempo acumulado segundo ``-X importtime``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        if not name.startswith("  "):
+            # Módulo de nível superior: as linhas anteriores eram dependências dele
+            if name.strip() == module:
+                break
+            rows = []
+        elif not name.startswith("    "):
+            # Um espaço de separação mais dois por nível: as dependências diretas têm três
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def time_migrations(runs):
+    """Migração de um banco novo e do caminho rápido (esquema em dia), em ms"""
+    from app.database.migrations import MigrationRunner
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "startup.db")
+        start = time.perf_counter()
+        applied = MigrationRunner(path).migrate()
+        first = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            MigrationRunner(path).migrate()
+            timings.append((time.perf_counter() - start) * 1000)
+    return len(applied), first, statistics.median(timings)
+
+
+def time_ready(env, timeout=30):
+    """Segundos do início do uvicorn até /ready responder 200"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("A aplicação encerrou durante a inicialização")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/ready")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("A aplicação não respondeu em /ready a tempo")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Repetições de cada medida")
+    parser.add_argument("--top", type=int, default=10, help="Módulos listados pelo -X importtime")
+    parser.add_argument("--skip-server", action="store_true", help="Não mede a prontidão do uvicorn")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_env(os.path.join(workdir, "startup.db"))
+
+        for module in ("app.database.migrations", "main"):
+            try:
+                print(f"import {module:<24} {time_import(module, env, args.runs):8.1f} ms (mediana)")
+            except RuntimeError as e:
+                print(f"import {module:<24} falhou: {e}")
+
+        print("\nDependências mais caras de 'import main' (acumulado):")
+        for cumulative, name in top_imports("main", env, args.top):
+            print(f"  {cumulative:8.1f} ms  {name}")
+
+        try:
+            applied, first, current = time_migrations(args.runs)
+            print(f"\nMigrações: {applied} aplicadas em {first:.1f} ms | esquema em dia: {current:.2f} ms")
+        except ImportError as e:
+            print(f"\nMigrações: falhou: {e}")
+
+        if args.skip_server:
+            return
+        print()
+        for label in ("primeiro boot (banco vazio)", "boot seguinte (esquema em dia)"):
+            try:
+                print(f"/ready {label:<32} {time_ready(env) * 1000:8.0f} ms")
+            except RuntimeError as e:
+                print(f"/ready {label:<32} falhou: {e}")
+                break
+
+
+if __name__ == "__main__":
+    main()
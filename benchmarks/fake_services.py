@@ -0,0 +1,284 @@
+"""Servidores HTTP locais que imitam a OpenAI, a Twilio e o servidor de mídia da Twilio.
+
+Uso avulso:
+    python benchmarks/fake_services.py --openai-port 9100 --twilio-port 9200 --media-port 9300
+"""
+import argparse
+import io
+import json
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+import wave
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ASSESSMENT_QUESTIONS = [
+    {
+        "question": f"Question {i + 1}: choose the correct past form of 'go'.",
+        "options": ["A) went", "B) goed", "C) gone", "D) going"],
+        "correct_answer": "A",
+        "question_type": "multiple_choice"
+    }
+    for i in range(5)
+]
+
+
+class LatencyProfile:
+    """Distribuição de latência (log-normal) e taxa de erros de um serviço falso"""
+
+    def __init__(self, median_ms=300, sigma=0.5, error_rate=0.0, rate_limit_rate=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+    def sleep(self):
+        if self.median_ms > 0:
+            time.sleep(random.lognormvariate(0, self.sigma) * self.median_ms / 1000)
+
+    def failure_status(self):
+        """Retorna 429/500 de acordo com as taxas configuradas, ou None"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    profile = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+FAKE_TRANSCRIPT = "Yesterday I go to the park with my friends."
+
+
+def voice_note(name, seconds=3.0, rate=16000):
+    """WAV determinístico por nome: o mesmo nome gera sempre o mesmo conteúdo"""
+    frequency = 220 + sum(name.encode("utf-8")) % 440
+    frames = b"".join(
+        struct.pack("<h", int(12000 * math.sin(2 * math.pi * frequency * i / rate)))
+        for i in range(int(seconds * rate))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(frames)
+    return buffer.getvalue()
+
+
+class FakeOpenAIHandler(_JSONHandler):
+    """Imita POST /v1/chat/completions (com e sem streaming) e /v1/audio/transcriptions"""
+
+    def do_POST(self):
+        if self.path.rstrip("/").endswith("/audio/transcriptions"):
+            self._read_body()
+            self.profile.sleep()
+            self._send_json(200, {"text": FAKE_TRANSCRIPT})
+            return
+        request = json.loads(self._read_body() or b"{}")
+        self.profile.sleep()
+        status = self.profile.failure_status()
+        if status:
+            self._send_json(status, {"error": {"message": "fake failure", "type": "fake"}},
+                            {"retry-after-ms": "200"})
+            return
+
+        prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", [])).lower()
+        if "question" in prompt and ("assessment" in prompt or "avalia" in prompt):
+            content = json.dumps(ASSESSMENT_QUESTIONS)
+        else:
+            content = "Great job! Here is a short explanation. Keep practicing every day."
+
+        headers = {
+            "x-ratelimit-remaining-requests": "1000",
+            "x-ratelimit-remaining-tokens": "100000",
+            "x-ratelimit-reset-tokens": "1s"
+        }
+        if request.get("stream"):
+            self._stream(request, content, headers)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4 + 1,
+                "completion_tokens": len(content) // 4 + 1,
+                "total_tokens": (len(prompt) + len(content)) // 4 + 2
+            }
+        }, headers)
+
+    def _stream(self, request, content, headers):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        for word in content.split(" "):
+            event = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class FakeTwilioHandler(_JSONHandler):
+    """Imita POST /2010-04-01/Accounts/{sid}/Messages.json e registra as entregas"""
+
+    deliveries = None
+    lock = None
+
+    def do_POST(self):
+        form = {key: values[0] for key, values in parse_qs(self._read_body().decode("utf-8")).items()}
+        self.profile.sleep()
+        status = self.profile.failure_status()
+        if status:
+            self._send_json(status, {"code": 20429 if status == 429 else 20500, "message": "fake failure"})
+            return
+        with self.lock:
+            self.deliveries.setdefault(form.get("To", ""), []).append((time.perf_counter(), form.get("Body", "")))
+        self._send_json(201, {
+            "sid": f"SM{uuid.uuid4().hex}",
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "body": form.get("Body"),
+            "status": "queued"
+        })
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    """Imita as URLs de mídia da Twilio: GET /media/<nome>?seconds=3 devolve um áudio WAV.
+
+    ``/media/<nome>.jpg`` devolve uma imagem falsa (anexo que não é áudio).
+    """
+
+    profile = None
+    cache = None
+    lock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.rsplit("/", 1)[-1]
+        seconds = float(parse_qs(url.query).get("seconds", ["3"])[0])
+        self.profile.sleep()
+        if name.endswith(".jpg"):
+            content_type, body = "image/jpeg", b"\xff\xd8\xff\xe0fake-jpeg"
+        else:
+            content_type = "audio/wav"
+            with self.lock:
+                body = self.cache.get((name, seconds))
+                if body is None:
+                    body = self.cache[(name, seconds)] = voice_note(name, seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer:
+    """Servidor falso executado em uma thread de fundo"""
+
+    def __init__(self, handler_class, port=0, profile=None, **attributes):
+        attributes["profile"] = profile or LatencyProfile()
+        handler = type(handler_class.__name__, (handler_class,), attributes)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.handler = handler
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_fake_openai(port=0, profile=None):
+    """Inicia a OpenAI falsa; a URL base para o SDK é ``server.url + "/v1"``"""
+    return FakeServer(FakeOpenAIHandler, port, profile).start()
+
+
+def start_fake_twilio(port=0, profile=None):
+    """Inicia a Twilio falsa; as entregas ficam em ``server.handler.deliveries``"""
+    return FakeServer(FakeTwilioHandler, port, profile, deliveries={}, lock=threading.Lock()).start()
+
+
+def start_fake_media(port=0, profile=None):
+    """Inicia o servidor de mídia falso; anexos em ``server.url + "/media/<nome>"``"""
+    return FakeServer(FakeMediaHandler, port, profile, cache={}, lock=threading.Lock()).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--openai-port", type=int, default=9100)
+    parser.add_argument("--twilio-port", type=int, default=9200)
+    parser.add_argument("--media-port", type=int, default=9300)
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--twilio-latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    openai_server = start_fake_openai(args.openai_port, LatencyProfile(args.openai_latency_ms, error_rate=args.error_rate))
+    twilio_server = start_fake_twilio(args.twilio_port, LatencyProfile(args.twilio_latency_ms, error_rate=args.error_rate))
+    media_server = start_fake_media(args.media_port, LatencyProfile(args.twilio_latency_ms))
+    print(f"OpenAI falsa: {openai_server.url}/v1")
+    print(f"Twilio falsa: {twilio_server.url}")
+    print(f"Mídia falsa: {media_server.url}/media/<nome>?seconds=3")
+    print("Pressione CTRL+C para encerrar")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        openai_server.stop()
+        twilio_server.stop()
+        media_server.stop()
+
+
+if __name__ == "__main__":
+    main()
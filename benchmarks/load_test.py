@@ -0,0 +1,306 @@
+"""Teste de carga: milhares de alunos sintéticos contra o endpoint /webhook real.
+
+O servidor da aplicação é iniciado com uvicorn apontando para a OpenAI e a
+Twilio falsas (benchmarks/fake_services.py) e um banco SQLite temporário. No
+modo assíncrono cada aluno espera a resposta (entregue na Twilio falsa) antes
+de enviar a próxima mensagem, e a latência ponta a ponta vem dessa espera.
+
+Uso:
+    python benchmarks/load_test.py --students 2000 --concurrency 100 --report report.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 ...   # servidor já em execução
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_services import LatencyProfile, start_fake_openai, start_fake_twilio
+
+STAGES = ("registration", "assessment", "commands", "conversation")
+
+CONVERSATION = [
+    "Hello, how are you today?",
+    "I goed to the park yesterday",
+    "What is the past of go?",
+    "Can you help me with my English?",
+    "She don't like coffee"
+]
+
+
+def student_script(index, assessment_answers):
+    """Sequência de mensagens (etapa, texto) de um aluno sintético"""
+    script = [
+        ("registration", "Olá"),
+        ("registration", f"Aluno {index}"),
+        ("registration", random.choice(["iniciante", "intermediário", "avançado"])),
+        ("registration", "sim")
+    ]
+    script += [("assessment", random.choice("ABCD")) for _ in range(assessment_answers)]
+    script += [("commands", command) for command in ("/ajuda", "/licao", "/progresso", "/pratica")]
+    script += [("conversation", text) for text in random.sample(CONVERSATION, 3)]
+    return script
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """p50/p95/p99 em milissegundos"""
+    return {
+        "count": len(latencies),
+        "mean_ms": sum(latencies) * 1000 / len(latencies) if latencies else None,
+        "p50_ms": (percentile(latencies, 0.50) or 0) * 1000,
+        "p95_ms": (percentile(latencies, 0.95) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else None
+    }
+
+
+class LoadTest:
+    """Executa os alunos sintéticos e coleta as latências por etapa"""
+
+    def __init__(self, base_url, students, concurrency, assessment_answers=5, timeout=60,
+                 deliveries=None, deliveries_lock=None, reply_timeout=30, settle=0.2):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.students = students
+        self.concurrency = concurrency
+        self.assessment_answers = assessment_answers
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.latencies = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self.status_codes = {}
+        # Modo assíncrono: entregas da Twilio falsa ({telefone: [(instante, corpo)]})
+        self.deliveries = deliveries
+        self.deliveries_lock = deliveries_lock or threading.Lock()
+        self.reply_timeout = reply_timeout
+        self.settle = settle
+        self.end_to_end = {stage: [] for stage in STAGES}
+        self.lost = {stage: 0 for stage in STAGES}
+        self.parts = []
+
+    def _connect(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        conn.connect()
+        # Sem Nagle: cabeçalho e corpo saem em pacotes separados e o ACK atrasado somaria ~40 ms
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def run_student(self, index):
+        phone = f"whatsapp:+55119{index:08d}"
+        conn = self._connect()
+        try:
+            for sequence, (stage, text) in enumerate(student_script(index, self.assessment_answers)):
+                body = urlencode({
+                    "From": phone,
+                    "Body": text,
+                    "MessageSid": f"SM{index:08d}{sequence:04d}"
+                })
+                delivered_before = self._delivery_count(phone)
+                start = time.perf_counter()
+                try:
+                    conn.request("POST", "/webhook", body, {"Content-Type": "application/x-www-form-urlencoded"})
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = self._connect()
+                    status = "connection_error"
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+                    if status == 200:
+                        self.latencies[stage].append(elapsed)
+                    else:
+                        self.errors[stage] += 1
+                if status == 200 and self.deliveries is not None:
+                    self._await_reply(phone, stage, start, delivered_before)
+        finally:
+            conn.close()
+
+    def _delivery_count(self, phone):
+        if self.deliveries is None:
+            return 0
+        with self.deliveries_lock:
+            return len(self.deliveries.get(phone, []))
+
+    def _await_reply(self, phone, stage, sent_at, delivered_before):
+        """Espera as entregas desta mensagem antes de o aluno enviar a próxima.
+
+        O aluno só escreve de novo depois de receber a resposta, então as entregas
+        novas do telefone pertencem a esta mensagem: a latência é a da primeira, e
+        as partes de uma resposta dividida chegam em sequência (espera-se
+        ``settle`` sem entregas novas). Sem nenhuma entrega em ``reply_timeout``
+        a mensagem conta como perdida.
+        """
+        deadline = sent_at + self.reply_timeout
+        while self._delivery_count(phone) == delivered_before:
+            if time.perf_counter() > deadline:
+                with self.lock:
+                    self.lost[stage] += 1
+                return
+            time.sleep(0.005)
+        count = self._delivery_count(phone)
+        while True:
+            time.sleep(self.settle)
+            current = self._delivery_count(phone)
+            if current == count:
+                break
+            count = current
+        with self.deliveries_lock:
+            delivered_at = self.deliveries[phone][delivered_before][0]
+        with self.lock:
+            self.end_to_end[stage].append(delivered_at - sent_at)
+            self.parts.append(count - delivered_before)
+
+    def run(self):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self.run_student, range(self.students)))
+        return time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(openai_url, twilio_url, database_path, extra_env):
+    """Inicia a aplicação real com uvicorn apontando para os serviços falsos"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "TWILIO_ACCOUNT_SID": "ACfake",
+        "TWILIO_AUTH_TOKEN": "fake",
+        "TWILIO_PHONE_NUMBER": "whatsapp:+15550000000",
+        "TWILIO_API_BASE_URL": twilio_url,
+        "DATABASE_PATH": database_path
+    })
+    env.update(extra_env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("A aplicação não respondeu em /health a tempo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--assessment-answers", type=int, default=5)
+    parser.add_argument("--url", help="URL de um servidor já em execução (não inicia a aplicação)")
+    parser.add_argument("--webhook-mode", default="inline", choices=("inline", "async"))
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--openai-sigma", type=float, default=0.5)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-429-rate", type=float, default=0.0)
+    parser.add_argument("--twilio-latency-ms", type=float, default=50)
+    parser.add_argument("--twilio-error-rate", type=float, default=0.0)
+    parser.add_argument("--reply-timeout", type=float, default=30,
+                        help="Modo assíncrono: espera máxima pela resposta de cada mensagem")
+    parser.add_argument("--settle-ms", type=float, default=200,
+                        help="Modo assíncrono: intervalo sem entregas que encerra uma resposta")
+    parser.add_argument("--report", default="load_test_report.json")
+    args = parser.parse_args()
+
+    openai_server = start_fake_openai(profile=LatencyProfile(
+        args.openai_latency_ms, args.openai_sigma, args.openai_error_rate, args.openai_429_rate
+    ))
+    twilio_server = start_fake_twilio(profile=LatencyProfile(
+        args.twilio_latency_ms, error_rate=args.twilio_error_rate
+    ))
+
+    process = None
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        base_url = args.url
+        if not base_url:
+            process, base_url = start_app(
+                openai_server.url, twilio_server.url,
+                os.path.join(tmp.name, "load_test.db"),
+                {"WEBHOOK_MODE": args.webhook_mode}
+            )
+
+        test = LoadTest(base_url, args.students, args.concurrency, args.assessment_answers)
+        if args.webhook_mode == "async":
+            test.deliveries = twilio_server.handler.deliveries
+            test.deliveries_lock = twilio_server.handler.lock
+            test.reply_timeout = args.reply_timeout
+            test.settle = args.settle_ms / 1000
+        print(f"Executando {args.students} alunos com concorrência {args.concurrency} em {base_url}...")
+        elapsed = test.run()
+
+        total = sum(len(values) for values in test.latencies.values())
+        report = {
+            "config": vars(args),
+            "elapsed_seconds": elapsed,
+            "throughput_rps": total / elapsed if elapsed else 0,
+            "status_codes": test.status_codes,
+            "webhook": {
+                stage: dict(summarize(test.latencies[stage]), errors=test.errors[stage])
+                for stage in STAGES
+            },
+            "twilio_deliveries": sum(len(v) for v in twilio_server.handler.deliveries.values())
+        }
+        if args.webhook_mode == "async":
+            report["end_to_end"] = {
+                stage: dict(summarize(test.end_to_end[stage]), lost=test.lost[stage])
+                for stage in STAGES
+            }
+            report["messages_per_reply"] = summarize(test.parts) if test.parts else None
+
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+        print(f"Vazão: {report['throughput_rps']:.1f} req/s em {elapsed:.1f}s")
+        for stage in STAGES:
+            stats = report["webhook"][stage]
+            print(f"  {stage:<13} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                  f"p99 {stats['p99_ms']:8.1f} ms  erros {stats['errors']}")
+        print(f"Relatório salvo em {args.report}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        openai_server.stop()
+        twilio_server.stop()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from dotenv import load_dotenv
+from twilio.rest import Client
+
+from app.database.connection_pool import SQLitePool
+from app.database.question_bank import QuestionBank
+from app.database.sharding import shard_paths
+from app.services.lesson_broadcaster import LessonBroadcaster, QuestionBankRenderer
+from app.services.message_queue import TwilioReplySender
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Envia a lição ou prática do dia para todos os alunos")
+    parser.add_argument("--kind", default="lesson", choices=("lesson", "practice"), help="Tipo de item enviado")
+    parser.add_argument("--run-id", help="Identificador da execução (padrão: data de hoje e tipo); repetir retoma")
+    parser.add_argument("--batch-size", type=int, default=500, help="Usuários lidos por página")
+    parser.add_argument("--concurrency", type=int, default=20, help="Envios simultâneos à Twilio")
+    parser.add_argument("--rate", type=float, default=30, help="Máximo de mensagens por segundo")
+    parser.add_argument("--active-days", type=int, default=0,
+                        help="Só alunos com interação nos últimos N dias (0 = todos)")
+    return parser.parse_args()
+
+
+async def broadcast(args):
+    """Executa (ou retoma) o envio em massa em cada shard de usuários"""
+    database_path = os.getenv("DATABASE_PATH", "database/alex_bot.db")
+    pool = SQLitePool(database_path)
+    executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+        if os.getenv("TWILIO_API_BASE_URL"):
+            client.api.base_url = os.getenv("TWILIO_API_BASE_URL")
+        bank = QuestionBank(pool)
+        bank.ensure_schema()
+        reply_sender = TwilioReplySender(client, os.getenv("TWILIO_PHONE_NUMBER"), executor=executor)
+        render = QuestionBankRenderer(bank, kind=args.kind)
+        run_id = args.run_id or f"{date.today().isoformat()}:{args.kind}"
+        # Mesmo formato do created_at do histórico (CURRENT_TIMESTAMP, UTC)
+        active_since = None
+        if args.active_days:
+            active_since = (datetime.now(timezone.utc) - timedelta(days=args.active_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+        # O checkpoint fica em cada shard, junto dos usuários que ele percorre; as lições
+        # renderizadas ficam no banco principal, então uma retomada não avança o cursor de novo
+        for path in shard_paths(database_path, int(os.getenv("DATABASE_SHARDS", "1"))):
+            user_pool = pool if path == database_path else SQLitePool(path)
+            try:
+                broadcaster = LessonBroadcaster(
+                    user_pool,
+                    reply_sender,
+                    render,
+                    kind=args.kind,
+                    batch_size=args.batch_size,
+                    concurrency=args.concurrency,
+                    rate=args.rate,
+                    lesson_pool=pool,
+                    active_since=active_since
+                )
+                broadcaster.ensure_schema()
+                stats = await broadcaster.run(run_id)
+            finally:
+                if user_pool is not pool:
+                    user_pool.close()
+            print(f"Envio {run_id} ({path}): {stats['sent']} enviados | {stats['failed']} falhas | "
+                  f"{stats['skipped']} ignorados")
+    finally:
+        executor.shutdown(wait=False)
+        pool.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    if not os.getenv("TWILIO_ACCOUNT_SID"):
+        print("Erro: TWILIO_ACCOUNT_SID não configurado")
+        sys.exit(1)
+    asyncio.run(broadcast(parse_args()))
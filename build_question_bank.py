@@ -0,0 +1,66 @@
+import os
+import sys
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+from app.database.connection_pool import DEFAULT_DATABASE_PATH, SQLitePool
+from app.database.question_bank import QuestionBank, CEFR_LEVELS, ITEM_KINDS
+from app.services.openai_scheduler import OpenAIScheduler
+from app.services.question_bank_builder import (
+    QuestionBankBuilder, OpenAIContentGenerator, DEFAULT_TOPICS
+)
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Gera offline o banco de lições e perguntas")
+    parser.add_argument("--levels", default=",".join(CEFR_LEVELS), help="Níveis CEFR separados por vírgula")
+    parser.add_argument("--kinds", default=",".join(ITEM_KINDS), help="Tipos de item separados por vírgula")
+    parser.add_argument("--topics", default=",".join(DEFAULT_TOPICS), help="Tópicos separados por vírgula")
+    parser.add_argument("--per-topic", type=int, default=3, help="Itens por nível/tipo/tópico")
+    parser.add_argument("--concurrency", type=int, default=4, help="Chamadas simultâneas à OpenAI")
+    parser.add_argument("--database", default=os.getenv("DATABASE_PATH", DEFAULT_DATABASE_PATH),
+                        help="Banco SQLite da aplicação (padrão: DATABASE_PATH, o mesmo do main.py)")
+    return parser.parse_args()
+
+
+async def build(args):
+    """Preenche o banco de perguntas"""
+    pool = SQLitePool(args.database)
+    try:
+        bank = QuestionBank(pool)
+        bank.ensure_schema()
+        builder = QuestionBankBuilder(
+            bank,
+            OpenAIContentGenerator(
+                os.getenv("OPENAI_API_KEY"),
+                os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+                # Respeita o limite de tokens por minuto e recua em caso de 429
+                scheduler=OpenAIScheduler(
+                    max_concurrency=args.concurrency,
+                    initial_concurrency=args.concurrency,
+                    tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
+                )
+            ),
+            concurrency=args.concurrency
+        )
+        await builder.build(
+            levels=args.levels.split(","),
+            kinds=args.kinds.split(","),
+            topics=args.topics.split(","),
+            per_topic=args.per_topic
+        )
+        print(f"Itens gerados: {builder.generated} | falhas: {builder.failed}")
+        for level in args.levels.split(","):
+            print(f"  {level}: {bank.count(level=level)} itens no banco")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Erro: OPENAI_API_KEY não configurada")
+        sys.exit(1)
+    asyncio.run(build(parse_args()))
@@ -137,10 +137,10 @@ def initialize_database():
         
         # Importar e executar a função de inicialização do banco de dados
         sys.path.append(os.getcwd())
-        from app.database.init_db import init_database
+        from app.database.migrations import migrate_databases
         
         db_path = os.path.join("database", "alex_bot.db")
-        init_database(db_path)
+        migrate_databases(db_path)
         
         print_success("Banco de dados inicializado com sucesso!")
         return True
@@ -1,16 +1,46 @@
+import asyncio
 import os
-import uvicorn
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
 from dotenv import load_dotenv
-from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 
 # Importações dos módulos internos
 from app.database.db_manager import DatabaseManager
-from app.services.whatsapp_service import WhatsAppService
-from app.services.ai_service import AIService
-from app.models.user import User
+from app.database.archive import ArchivedHistoryManager, InteractionArchive
+from app.database.cached_db_manager import CachedDatabaseManager
+from app.database.connection_pool import DEFAULT_DATABASE_PATH, SQLitePool
+from app.database.write_buffer import WriteBehindBuffer, WriteBufferedManager
+from app.database.question_bank import QuestionBank, format_item
+from app.database.message_dedupe import MessageDeduplicator
+from app.database.migrations import migrate_databases
+from app.database.sharding import ShardedDatabaseManager, per_shard, routed, shard_paths
+from app.database.progress_aggregates import (
+    ProgressAggregates, KIND_ASSESSMENT, KIND_CONVERSATION, classify_message, format_progress
+)
+from app.services.message_queue import MessageQueue, TwilioReplySender
+from app.services.streaming import (
+    StreamingConversation, StreamingResponder, collect_text, finish_with, split_message
+)
+from app.services.dispatcher import SenderDispatcher, MailboxFullError
+from app.services.assessment_bank import QuestionBankProxy
+from app.services.command_router import CommandRouter, MULTIPLE_CHOICE_ANSWER, grade_assessment_answer
+from app.services.completion_cache import CachedCompletionProxy, CompletionCache
+from app.services.conversation_context import ConversationContextManager
+from app.services.grammar_check import check_grammar
+from app.services.media_pipeline import MediaPipeline, OpenAITranscriber
+from app.services.openai_usage import instrument_client
+from app.services.openai_scheduler import (
+    OpenAIScheduler, ScheduledProxy, RequestRejectedError, PRIORITY_CONVERSATION
+)
+from app.utils.metrics import (
+    REGISTRY, InstrumentedProxy, MultiProcessMetrics, WEBHOOK_STAGE_SECONDS, MESSAGE_SECONDS, MESSAGES_TOTAL
+)
+from app.utils.lazy import LazyObject
+from app.utils.profiler import SlowRequestProfiler
 from app.utils.logger import setup_logger
 
 # Carregar variáveis de ambiente
@@ -19,66 +49,798 @@ load_dotenv()
 # Configurar logger
 logger = setup_logger()
 
-# Inicializar aplicação FastAPI
-app = FastAPI(title="Alex - Bot de Ensino de Inglês")
-
-# Inicializar serviços
-db_manager = DatabaseManager(os.getenv("DATABASE_PATH"))
-ai_service = AIService(os.getenv("OPENAI_API_KEY"))
-whatsapp_service = WhatsAppService(
-    account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
-    auth_token=os.getenv("TWILIO_AUTH_TOKEN"),
-    phone_number=os.getenv("TWILIO_PHONE_NUMBER"),
-    ai_service=ai_service,
-    db_manager=db_manager
+KNOWN_COMMANDS = ("/ajuda", "/licao", "/nivel", "/progresso", "/pratica")
+
+
+def env_flag(name, default="false"):
+    return os.getenv(name, default).lower() == "true"
+
+
+# Fábricas dos serviços que carregam SDKs pesados (OpenAI, Twilio, numpy): os
+# módulos só são importados na primeira chamada, fora do caminho de inicialização
+
+def build_ai_service(conversation_context=None, scheduler=None):
+    from app.services.ai_service import AIService
+
+    service = AIService(os.getenv("OPENAI_API_KEY"))
+    # Cliente da OpenAI do AIService com os hooks que contabilizam tokens e novas tentativas;
+    # os cabeçalhos x-ratelimit-* de cada resposta atualizam o orçamento do agendador
+    if hasattr(service, "client"):
+        service.client = instrument_client(service.client, "ai_service", scheduler=scheduler)
+    # Com o resumo incremental ligado, o prompt da conversa vem de conversation_context.build_messages()
+    service.conversation_context = conversation_context
+    return service
+
+
+def build_twilio_client():
+    from twilio.rest import Client
+
+    client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+    if os.getenv("TWILIO_API_BASE_URL"):
+        # Permite apontar para um servidor local (ver benchmarks/fake_services.py)
+        client.api.base_url = os.getenv("TWILIO_API_BASE_URL")
+    return client
+
+
+def build_transcriber(scheduler):
+    return OpenAITranscriber(
+        os.getenv("OPENAI_API_KEY"),
+        model=os.getenv("OPENAI_TRANSCRIBE_MODEL", "whisper-1"),
+        scheduler=scheduler
+    )
+
+
+def build_summarizer(scheduler):
+    from app.services.conversation_context import OpenAISummarizer
+
+    return OpenAISummarizer(
+        os.getenv("OPENAI_API_KEY"), model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"), scheduler=scheduler
+    )
+
+
+def build_mistake_index(pools):
+    from app.database.mistake_index import MistakeIndex
+
+    return per_shard(MistakeIndex(pool) for pool in pools)
+
+
+def command_label(body):
+    """Rótulo de comando com cardinalidade limitada para as métricas"""
+    word = (body or "").strip().split(" ", 1)[0].lower()
+    if word in KNOWN_COMMANDS:
+        return word
+    return "outro" if word.startswith("/") else "texto"
+
+
+INSERT_INTERACTION = "INSERT INTO interactions (user_id, message, response) VALUES (?, ?, ?)"
+
+# Resposta quando o agendador da OpenAI descarta a requisição (sobrecarga ou prazo vencido)
+BUSY_REPLY = (
+    "Estou recebendo muitas mensagens agora e não consegui responder a tempo. 😅 "
+    "Pode me enviar de novo daqui a pouquinho?"
 )
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Executado quando a aplicação inicia"""
-    # Criar tabelas no banco de dados se não existirem
-    db_manager.create_tables()
-    logger.info("Aplicação iniciada com sucesso")
+class AppServices:
+    """Serviços da aplicação, construídos uma vez por processo (worker) no lifespan.
+
+    Nada é criado na importação do módulo: com vários workers cada processo
+    abre suas próprias conexões, caches e filas depois do fork.
+    """
+
+    def __init__(self):
+        self.database_path = database_path = os.getenv("DATABASE_PATH", DEFAULT_DATABASE_PATH)
+        pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+
+        # Usuários particionados por hash do telefone em DATABASE_SHARDS arquivos
+        # (ver split_database.py); o banco principal guarda as tabelas compartilhadas
+        self.shard_paths = shard_paths(database_path, int(os.getenv("DATABASE_SHARDS", "1")))
+        if len(self.shard_paths) > 1:
+            db_manager = ShardedDatabaseManager(
+                [DatabaseManager(path) for path in self.shard_paths], self.shard_paths
+            )
+        else:
+            db_manager = DatabaseManager(database_path)
+
+        self.db_pool = SQLitePool(database_path, size=pool_size)
+        self.user_pools = [self.db_pool]
+        if len(self.shard_paths) > 1:
+            self.user_pools = [SQLitePool(path, size=pool_size) for path in self.shard_paths]
+
+        # Histórico movido pelo archive_history.py: get_user_history junta os arquivos e a tabela quente
+        archive_dir = os.getenv("ARCHIVE_DIR", "database/archive")
+        db_manager = ArchivedHistoryManager(
+            db_manager, per_shard(InteractionArchive(pool, archive_dir) for pool in self.user_pools)
+        )
+
+        # Buffer opcional (um por shard) que agrupa em lotes as escritas do histórico de interações
+        self.write_buffers = []
+        if env_flag("WRITE_BUFFER_ENABLED"):
+            self.write_buffers = [
+                WriteBehindBuffer(
+                    pool,
+                    max_rows=int(os.getenv("WRITE_BUFFER_MAX_ROWS", "200")),
+                    max_delay_ms=int(os.getenv("WRITE_BUFFER_MAX_DELAY_MS", "50"))
+                )
+                for pool in self.user_pools
+            ]
+            db_manager = WriteBufferedManager(db_manager, self.write_buffers)
+
+        # Cache local de usuários e sessões de avaliação; desligar com vários processos
+        self.lookup_cache = None
+        if env_flag("LOOKUP_CACHE_ENABLED", "true"):
+            self.lookup_cache = db_manager = CachedDatabaseManager(
+                db_manager,
+                max_size=int(os.getenv("LOOKUP_CACHE_SIZE", "10000")),
+                ttl=float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+            )
+
+        # Mede a duração de cada chamada ao banco de dados e à IA
+        self.db_manager = InstrumentedProxy(db_manager, "database")
+
+        # Idempotência do webhook: repetições da Twilio (mesmo MessageSid) não reprocessam
+        self.dedupe = None
+        if env_flag("WEBHOOK_DEDUPE_ENABLED", "true"):
+            self.dedupe = MessageDeduplicator(
+                self.db_pool,
+                ttl=float(os.getenv("WEBHOOK_DEDUPE_TTL", "86400"))
+            )
+
+        # Agendador adaptativo: conversa tem prioridade sobre lições e resumos
+        ai_service = LazyObject(
+            lambda: build_ai_service(self.conversation_context, self.openai_scheduler), "AIService"
+        )
+        self.openai_scheduler = None
+        if env_flag("OPENAI_SCHEDULER_ENABLED"):
+            self.openai_scheduler = OpenAIScheduler(
+                max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+                target_latency=float(os.getenv("OPENAI_TARGET_LATENCY", "8")),
+                tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0")),
+                deadlines={PRIORITY_CONVERSATION: float(os.getenv("OPENAI_CONVERSATION_DEADLINE", "30"))}
+            )
+            ai_service = ScheduledProxy(ai_service, self.openai_scheduler)
+        self.ai_service = InstrumentedProxy(ai_service, "ai")
+
+        # Cache de respostas da IA para lições, práticas e explicações (não personalizadas)
+        self.completion_cache = None
+        if env_flag("COMPLETION_CACHE_ENABLED"):
+            self.completion_cache = CompletionCache(
+                self.db_pool,
+                max_size=int(os.getenv("COMPLETION_CACHE_SIZE", "5000")),
+                ttl=float(os.getenv("COMPLETION_CACHE_TTL", "86400"))
+            )
+            self.ai_service = CachedCompletionProxy(
+                self.ai_service, self.completion_cache,
+                prompt_version=os.getenv("COMPLETION_CACHE_PROMPT_VERSION", "1")
+            )
+
+        # Resumo incremental da conversa (um por shard): prompt limitado a um orçamento de tokens
+        self.conversation_contexts = []
+        self.conversation_context = None
+        if env_flag("CONVERSATION_CONTEXT_ENABLED"):
+            summarizer = LazyObject(lambda: build_summarizer(self.openai_scheduler), "OpenAISummarizer")
+            self.conversation_contexts = [
+                ConversationContextManager(
+                    pool, summarizer,
+                    recent_turns=int(os.getenv("CONVERSATION_RECENT_TURNS", "6")),
+                    fold_batch=int(os.getenv("CONVERSATION_FOLD_BATCH", "6")),
+                    token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+                )
+                for pool in self.user_pools
+            ]
+            self.conversation_context = per_shard(self.conversation_contexts)
+
+        # Mensagens de voz: download, conversão e transcrição antes do fluxo de texto
+        self.media = None
+        if env_flag("MEDIA_PIPELINE_ENABLED"):
+            self.media = MediaPipeline(
+                self.db_pool,
+                LazyObject(lambda: build_transcriber(self.openai_scheduler), "OpenAITranscriber"),
+                media_dir=os.getenv("MEDIA_DIR", "./database/media"),
+                auth=(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN")),
+                max_connections=int(os.getenv("MEDIA_MAX_CONNECTIONS", "20")),
+                transcode_workers=int(os.getenv("MEDIA_TRANSCODE_WORKERS", "2")),
+                transcribe_concurrency=int(os.getenv("MEDIA_TRANSCRIBE_CONCURRENCY", "4"))
+            )
+        self.whatsapp_service = LazyObject(self.build_whatsapp_service, "WhatsAppService")
+
+        # Caminho rápido local para comandos e correções simples, sem chamar a IA
+        self.command_router = CommandRouter(
+            grammar_check_enabled=env_flag("FAST_PATH_GRAMMAR"),
+            conversation_predicate=self.is_free_conversation
+        )
+        self.fast_path_assessment = env_flag("FAST_PATH_ASSESSMENT")
+
+        # Lições e práticas pré-geradas (ver build_question_bank.py)
+        self.question_bank = None
+        if env_flag("QUESTION_BANK_ENABLED"):
+            self.question_bank = QuestionBank(self.db_pool)
+            # Perguntas da avaliação de nível (cadastro e /nivel) também saem do banco
+            self.ai_service = QuestionBankProxy(
+                self.ai_service, self.question_bank, count=int(os.getenv("ASSESSMENT_QUESTION_COUNT", "5"))
+            )
+            self.command_router.register("/licao", self.bank_handler("lesson"))
+            self.command_router.register("/pratica", self.bank_handler("practice"))
+
+        # Agregados de progresso: /progresso vira uma busca pela chave do usuário
+        self.progress = None
+        if env_flag("PROGRESS_AGGREGATES_ENABLED"):
+            self.progress = per_shard(ProgressAggregates(pool) for pool in self.user_pools)
+            self.command_router.register("/progresso", self.progress_handler)
+        # Eventos de progresso apurados no roteamento da mensagem em curso (um por remetente,
+        # que o dispatcher processa em ordem), consumidos quando a resposta é registrada
+        self.progress_events = {}
+
+        # Respostas de múltipla escolha da avaliação corrigidas pelo correct_answer do questions_data;
+        # com os agregados ligados a correção também alimenta os acertos por habilidade
+        if self.fast_path_assessment or self.progress:
+            self.command_router.register_pattern(MULTIPLE_CHOICE_ANSWER, "assessment", self.assessment_handler)
+
+        # Índice de erros por aluno: revisão espaçada anexada às lições e práticas
+        self.mistakes = None
+        self.review_count = int(os.getenv("MISTAKE_REVIEW_COUNT", "2"))
+        if env_flag("MISTAKE_INDEX_ENABLED"):
+            self.mistakes = LazyObject(lambda: build_mistake_index(self.user_pools), "MistakeIndex")
+
+        # Mensagens do mesmo remetente são processadas em ordem; remetentes diferentes em paralelo
+        self.dispatcher = SenderDispatcher(
+            self.handle_message,
+            mailbox_size=int(os.getenv("DISPATCHER_MAILBOX_SIZE", "20")),
+            idle_timeout=float(os.getenv("DISPATCHER_IDLE_TIMEOUT", "300"))
+        )
+
+        # Modo do webhook: "inline" processa a mensagem dentro da requisição;
+        # "async" confirma imediatamente e responde depois via API REST da Twilio
+        # (respostas em streaming saem em várias mensagens à medida que são geradas)
+        self.message_queue = None
+        self.streaming = None
+        if os.getenv("WEBHOOK_MODE", "inline").lower() == "async":
+            reply_sender = TwilioReplySender(
+                LazyObject(build_twilio_client, "Twilio Client"), os.getenv("TWILIO_PHONE_NUMBER")
+            )
+            self.streaming = StreamingResponder(reply_sender)
+            self.message_queue = MessageQueue(
+                self.dispatcher,
+                reply_sender=reply_sender,
+                max_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+                workers=int(os.getenv("WEBHOOK_WORKERS", "4")),
+                responder=self.streaming,
+                dedupe=self.dedupe
+            )
+
+        # Conversa livre respondida em streaming: só no modo async, em que a resposta sai pela API REST
+        self.streaming_conversation = None
+        if self.message_queue and env_flag("STREAMING_REPLIES_ENABLED"):
+            self.streaming_conversation = LazyObject(
+                lambda: StreamingConversation(
+                    os.getenv("OPENAI_API_KEY"), model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+                    scheduler=self.openai_scheduler, conversation_context=self.conversation_context
+                ),
+                "StreamingConversation"
+            )
+
+        # Profiler por amostragem para requisições lentas (pode ser ligado em tempo de execução)
+        self.profiler = SlowRequestProfiler(threshold=float(os.getenv("PROFILER_SLOW_SECONDS", "2")))
+
+        # Com vários workers (run.py define o diretório) o /metrics soma os snapshots de todos
+        self.metrics_exporter = None
+        self._metrics_task = None
+        if os.getenv("METRICS_MULTIPROC_DIR"):
+            self.metrics_exporter = MultiProcessMetrics(
+                os.getenv("METRICS_MULTIPROC_DIR"),
+                interval=float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+            )
+
+        self.ready = False
+        self.draining = False
+
+    def build_whatsapp_service(self):
+        from app.services.whatsapp_service import WhatsAppService
+
+        return WhatsAppService(
+            account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
+            auth_token=os.getenv("TWILIO_AUTH_TOKEN"),
+            phone_number=os.getenv("TWILIO_PHONE_NUMBER"),
+            ai_service=self.ai_service,
+            db_manager=self.db_manager
+        )
+
+    async def is_free_conversation(self, sender):
+        """Usuário cadastrado e sem avaliação em andamento"""
+        user = await self.load_user(sender)
+        return user is not None and await self.db_call("get_assessment_session", user["id"]) is None
+
+    def bank_handler(self, kind):
+        """Serve o próximo item do banco para o nível do usuário; None cai na geração ao vivo"""
+        async def handler(sender, body):
+            user = await self.load_user(sender)
+            if not user or not user.get("level"):
+                return None
+            item = await self.question_bank.anext_item(sender, user["level"], kind)
+            if not item:
+                return None
+            response = format_item(item)
+            if self.mistakes:
+                response = await self.append_review(user, response, item["topic"])
+            return response
+        return handler
+
+    async def append_review(self, user, response, topic):
+        """Anexa os erros vencidos mais próximos do tema; o agendamento só avança com a resposta do aluno"""
+        from app.database.mistake_index import format_review
+
+        try:
+            mistakes = await self.mistakes.aselect_for_review(user["id"], topic, k=self.review_count)
+            if not mistakes:
+                return response
+            await self.mistakes.amark_shown(user["id"], [mistake["id"] for mistake in mistakes])
+            return f"{response}\n\n{format_review(mistakes)}"
+        except Exception as e:
+            logger.error(f"Erro ao selecionar revisão de {user['id']}: {str(e)}")
+            return response
+
+    async def db_call(self, name, *args):
+        """Chamada ao DatabaseManager fora do event loop.
+
+        ``to_thread`` copia o contexto: chamadas por ``user_id`` continuam indo ao
+        shard do remetente associado com ``routed()``.
+        """
+        return await asyncio.to_thread(getattr(self.db_manager, name), *args)
+
+    async def load_user(self, sender):
+        """Usuário do remetente, consultado fora do event loop"""
+        return await self.db_call("get_user_by_phone", sender)
+
+    async def assessment_handler(self, sender, body):
+        """Corrige localmente a resposta de múltipla escolha da avaliação; None cai no fluxo completo.
+
+        A última resposta (e todas, sem ``FAST_PATH_ASSESSMENT``) segue para o
+        fluxo completo, mas o acerto e a conclusão da avaliação entram no progresso.
+        """
+        user = await self.load_user(sender)
+        if not user:
+            return None
+        session = await self.db_call("get_assessment_session", user["id"])
+        grade = grade_assessment_answer(session, body, final=True)
+        if grade is None:
+            return None
+        if self.progress:
+            self.progress_events[sender] = (KIND_ASSESSMENT if grade.completed else KIND_CONVERSATION, grade.skills())
+        if grade.completed or not self.fast_path_assessment:
+            return None
+        await self.db_call("execute_query", *grade.update())
+        return grade.reply()
+
+    async def progress_handler(self, sender, body):
+        """Responde o /progresso pelos agregados; None cai no fluxo completo"""
+        user = await self.load_user(sender)
+        if not user:
+            return None
+        progress = await self.progress.aget(user["id"])
+        return format_progress(progress) if progress else None
+
+    async def record_progress(self, user, body, response, log_interaction=False, event=None):
+        """Atualiza os agregados de progresso e o índice de erros com a mensagem processada.
+
+        No caminho rápido (``log_interaction``) a interação é gravada na mesma
+        transação dos agregados. No fluxo completo o WhatsAppService grava o
+        histórico por conta própria e os agregados vêm logo em seguida. ``event``
+        é o ``(kind, skills)`` apurado no roteamento (ex.: resposta da avaliação).
+        """
+        kind, skills = event or (classify_message(body), ())
+        corrections = None
+        if (self.mistakes and event is None and kind == KIND_CONVERSATION and user.get("level")
+                and body and not body.startswith("/")):
+            corrections = check_grammar(body)[1]
+        if self.progress:
+            interaction_query, interaction_params = None, ()
+            if log_interaction:
+                interaction_query, interaction_params = INSERT_INTERACTION, (user["id"], body, response)
+            try:
+                await self.progress.arecord(
+                    user["id"], kind, level=user.get("level"), skills=skills,
+                    interaction_query=interaction_query, interaction_params=interaction_params
+                )
+            except Exception as e:
+                logger.error(f"Erro ao atualizar progresso de {user['id']}: {str(e)}")
+        elif log_interaction:
+            await self.log_interaction(user, body, response)
+        if self.mistakes and corrections is not None:
+            # Também sem correções: a mensagem pode responder uma revisão pendente
+            try:
+                await self.mistakes.arecord_message(user["id"], body, corrections)
+            except Exception as e:
+                logger.error(f"Erro ao indexar erros de {user['id']}: {str(e)}")
+
+    async def log_interaction(self, user, body, response):
+        """Grava a interação no histórico (no buffer de escrita, se habilitado)"""
+        try:
+            await self.db_call("execute_query", INSERT_INTERACTION, (user["id"], body, response))
+        except Exception as e:
+            logger.error(f"Erro ao registrar interação de {user['id']}: {str(e)}")
+
+    async def record_turns(self, sender, body, response):
+        """Turnos de conversa livre para o resumo incremental (comandos não entram)"""
+        if not body or classify_message(body) != KIND_CONVERSATION or body.startswith("/"):
+            return
+        try:
+            await self.conversation_context.record_turn(sender, "user", body)
+            await self.conversation_context.record_turn(sender, "assistant", response)
+        except Exception as e:
+            logger.error(f"Erro ao registrar turnos de {sender}: {str(e)}")
+
+    async def stream_reply(self, sender, body):
+        """Resposta de conversa livre em streaming; None mantém a mensagem no fluxo completo"""
+        if not body or body.startswith("/") or classify_message(body) != KIND_CONVERSATION:
+            return None
+        user = await self.load_user(sender)
+        if not user or not user.get("level"):
+            return None
+        if await self.db_call("get_assessment_session", user["id"]) is not None:
+            return None
+        return await self.streaming_conversation.reply(
+            sender, user["level"], body, await self.mistakes_context(user, body)
+        )
+
+    async def mistakes_context(self, user, body):
+        """Erros do aluno parecidos com a mensagem, para o prompt da conversa"""
+        if not self.mistakes:
+            return ""
+        from app.database.mistake_index import prompt_context
+
+        try:
+            return prompt_context(await self.mistakes.arelevant(user["id"], body, k=self.review_count))
+        except Exception as e:
+            logger.error(f"Erro ao buscar erros de {user['id']}: {str(e)}")
+            return ""
+
+    async def record_reply(self, sender, body, response, user, path, event=None):
+        """Histórico, resumo e agregados da resposta já montada"""
+        if not user or not response:
+            return
+        if self.conversation_context and path in ("full", "stream"):
+            await self.record_turns(sender, body, response)
+        # O fluxo completo registra a interação no WhatsAppService; os demais caminhos registram aqui
+        if self.progress or self.mistakes:
+            await self.record_progress(user, body, response, log_interaction=path != "full", event=event)
+        elif path != "full":
+            await self.log_interaction(user, body, response)
+
+    async def busy_on_reject(self, sender, deltas):
+        """No streaming a vaga do agendador é pedida no primeiro trecho: o descarte vira o aviso"""
+        try:
+            async for delta in deltas:
+                yield delta
+        except RequestRejectedError as e:
+            logger.warning(f"Mensagem de {sender} sem resposta da IA: {str(e)}")
+            yield BUSY_REPLY
+
+    async def submit_inline(self, sender, body, media_url=None):
+        """Processa dentro do webhook: respostas em streaming são montadas antes do TwiML"""
+        return await collect_text(await self.dispatcher.submit(sender, body, media_url))
+
+    async def handle_message(self, sender, body, media_url=None):
+        """Tenta o caminho rápido local e, se não houver resposta, o fluxo completo"""
+        # Consultas por user_id feitas durante esta mensagem vão para o shard do remetente
+        with routed(sender):
+            return await self._handle_message(sender, body, media_url)
+
+    async def transcribe_media(self, media_url):
+        """Transcrição do anexo de voz; None mantém o anexo no fluxo original"""
+        try:
+            with WEBHOOK_STAGE_SECONDS.time(stage="media"):
+                return await self.media.transcribe_url(media_url)
+        except Exception as e:
+            logger.error(f"Erro ao transcrever mídia {media_url}: {str(e)}")
+            return None
+
+    async def _handle_message(self, sender, body, media_url=None):
+        transcript = None
+        if media_url and self.media:
+            transcript = await self.transcribe_media(media_url)
+            if transcript:
+                # A transcrição segue o fluxo normal de texto
+                body = f"{body} {transcript}".strip() if body else transcript
+                media_url = None
+
+        command = command_label(body)
+        start = time.perf_counter()
+        path = "local"
+        try:
+            response = await self.command_router.route(sender, body)
+            if response is None and self.streaming_conversation and not media_url:
+                response = await self.stream_reply(sender, body)
+                path = "stream"
+            if response is None:
+                path = "full"
+                response = await self.whatsapp_service.process_message(sender, body, media_url)
+        except RequestRejectedError as e:
+            # Descarte do agendador (carga alta): o aluno recebe um aviso em vez de ficar sem resposta
+            logger.warning(f"Mensagem de {sender} sem resposta da IA: {str(e)}")
+            path = "rejected"
+            response = BUSY_REPLY
+        finally:
+            event = self.progress_events.pop(sender, None)
+        elapsed = time.perf_counter() - start
+        WEBHOOK_STAGE_SECONDS.observe(elapsed, stage="state_machine")
+        # Consultado depois do processamento: inclui o usuário recém-cadastrado e o nível atualizado
+        with WEBHOOK_STAGE_SECONDS.time(stage="user_lookup"):
+            user = await self.load_user(sender)
+        level = (user or {}).get("level") or "desconhecido"
+        MESSAGE_SECONDS.observe(elapsed, command=command, level=level, path=path)
+        MESSAGES_TOTAL.inc(command=command, level=level, path=path)
+        if path == "rejected":
+            return response
+
+        if hasattr(response, "__aiter__"):
+            # Streaming (modo async): a contabilidade roda com o texto montado, depois do último trecho;
+            # um descarte do agendador no meio vira o aviso e não entra no histórico
+            async def on_complete(text):
+                await self.record_reply(sender, body, text, user, path, event)
+
+            return self.busy_on_reject(sender, finish_with(response, on_complete))
+
+        await self.record_reply(sender, body, response, user, path, event)
+        if transcript and response:
+            response = f"🎙️ _\"{transcript}\"_\n\n{response}"
+        return response
+
+    async def start(self):
+        # Migrações pendentes; com o esquema em dia é só uma consulta por arquivo
+        migrate_databases(self.database_path, self.shard_paths if len(self.shard_paths) > 1 else None)
+        if self.dedupe:
+            await self.dedupe.start()
+        if self.completion_cache:
+            await self.completion_cache.start()
+        if self.media:
+            await self.media.start()
+        if self.message_queue:
+            await self.message_queue.start()
+        if env_flag("PROFILER_ENABLED"):
+            self.profiler.start()
+        if self.metrics_exporter:
+            self._metrics_task = asyncio.create_task(self.metrics_exporter.run())
+        self.ready = True
+
+    async def stop(self, drain_timeout=25):
+        """Drena as mensagens em andamento antes de liberar os recursos"""
+        self.draining = True
+        self.profiler.stop()
+        deadline = time.monotonic() + drain_timeout
+        if self.message_queue:
+            await self.message_queue.stop(timeout=drain_timeout)
+        await self.dispatcher.drain(timeout=max(0, deadline - time.monotonic()))
+        await self.dispatcher.stop()
+        for context in self.conversation_contexts:
+            await context.wait_idle()
+        if self.dedupe:
+            await self.dedupe.stop()
+        if self.completion_cache:
+            await self.completion_cache.stop()
+        if self.media:
+            await self.media.stop()
+        for write_buffer in self.write_buffers:
+            write_buffer.close()
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            await asyncio.gather(self._metrics_task, return_exceptions=True)
+            # Último snapshot: os contadores deste worker continuam somados após o encerramento
+            self.metrics_exporter.write()
+        for pool in self.user_pools:
+            if pool is not self.db_pool:
+                pool.close()
+        self.db_pool.close()
+
+    async def readiness(self):
+        """Verifica banco de dados e fila antes de aceitar tráfego"""
+        checks = {"started": self.ready, "draining": self.draining}
+        try:
+            row = await self.db_pool.afetch_one("SELECT 1 AS ok")
+            checks["database"] = bool(row and row["ok"] == 1)
+        except Exception as e:
+            logger.error(f"Readiness: banco de dados indisponível: {str(e)}")
+            checks["database"] = False
+        if self.message_queue:
+            checks["queue"] = self.message_queue.running and not self.message_queue.full
+        ok = checks["started"] and not checks["draining"] and checks["database"] and checks.get("queue", True)
+        return ok, checks
+
+    def collect_metrics(self):
+        """Copia os contadores dos serviços para gauges a cada coleta do /metrics"""
+        gauge = REGISTRY.gauge("alex_service_stat", "Contadores internos dos serviços", ("service", "stat"))
+        for stat, value in self.dispatcher.stats().items():
+            gauge.set(value, service="dispatcher", stat=stat)
+        for path, value in self.command_router.stats().items():
+            gauge.set(value, service="command_router", stat=path)
+        if self.message_queue:
+            gauge.set(self.message_queue.depth, service="message_queue", stat="depth")
+        if self.streaming:
+            for stat, value in self.streaming.stats().items():
+                gauge.set(value, service="streaming", stat=stat)
+        for index, write_buffer in enumerate(self.write_buffers):
+            service = "write_buffer" if len(self.write_buffers) == 1 else f"write_buffer_{index:02d}"
+            for stat, value in write_buffer.stats().items():
+                gauge.set(value, service=service, stat=stat)
+        if self.dedupe:
+            for stat, value in self.dedupe.stats().items():
+                gauge.set(value, service="webhook_dedupe", stat=stat)
+        if self.media:
+            for stat, value in self.media.stats().items():
+                gauge.set(value, service="media_pipeline", stat=stat)
+        if self.openai_scheduler:
+            for stat, value in self.openai_scheduler.stats().items():
+                if value is not None:
+                    gauge.set(value, service="openai_scheduler", stat=stat)
+        if self.completion_cache:
+            for prompt_type, stats in self.completion_cache.stats()["prompt_types"].items():
+                for stat, value in stats.items():
+                    gauge.set(value, service=f"completion_cache_{prompt_type}", stat=stat)
+        if self.lookup_cache:
+            for cache_name, stats in self.lookup_cache.stats().items():
+                for stat, value in stats.items():
+                    gauge.set(value, service=f"lookup_cache_{cache_name}", stat=stat)
+
+
+def collect_service_metrics():
+    services = getattr(app.state, "services", None)
+    if services is not None:
+        services.collect_metrics()
+
+
+REGISTRY.add_collector(collect_service_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Constrói os serviços deste worker na inicialização e drena no encerramento (SIGTERM)"""
+    services = AppServices()
+    await services.start()
+    app.state.services = services
+    logger.info(f"Aplicação iniciada com sucesso (pid {os.getpid()})")
+    try:
+        yield
+    finally:
+        logger.info("Encerrando: drenando mensagens em andamento")
+        await services.stop(drain_timeout=float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "25")))
+        logger.info("Aplicação encerrada")
+
+
+# Inicializar aplicação FastAPI
+app = FastAPI(title="Alex - Bot de Ensino de Inglês", lifespan=lifespan)
+DEBUG_ENDPOINTS = env_flag("DEBUG_ENDPOINTS")
 
 
 @app.post("/webhook")
 async def webhook(request: Request):
     """Endpoint para receber mensagens do WhatsApp via Twilio"""
+    services = request.app.state.services
+    request_id = services.profiler.request_started()
     try:
-        form_data = await request.form()
-        
+        with WEBHOOK_STAGE_SECONDS.time(stage="form_parsing"):
+            form_data = await request.form()
+
         # Extrair dados da mensagem recebida
         sender = form_data.get("From", "")
         body = form_data.get("Body", "")
         media_url = form_data.get("MediaUrl0", None)
-        
+        message_sid = form_data.get("MessageSid")
+
+        # Modo assíncrono: enfileirar e confirmar com TwiML vazio
+        if services.message_queue:
+            if not sender:
+                return JSONResponse(
+                    status_code=400,
+                    content={"success": False, "message": "Remetente ausente"}
+                )
+            if services.dedupe and not await services.dedupe.claim(message_sid):
+                # Repetição de mensagem já enfileirada: apenas confirmar
+                return Response(content=str(MessagingResponse()), media_type="application/xml")
+            with WEBHOOK_STAGE_SECONDS.time(stage="enqueue"):
+                enqueued = services.message_queue.enqueue(sender, body, media_url, message_sid)
+            if enqueued:
+                return Response(content=str(MessagingResponse()), media_type="application/xml")
+            # Fila cheia: processar inline como no modo padrão (o process reivindica de novo)
+            if services.dedupe:
+                await services.dedupe.release(message_sid)
+
         # Processar a mensagem recebida
-        response = await whatsapp_service.process_message(sender, body, media_url)
-        
+        try:
+            if services.dedupe:
+                response = await services.dedupe.process(
+                    message_sid, lambda: services.submit_inline(sender, body, media_url)
+                )
+            else:
+                response = await services.submit_inline(sender, body, media_url)
+        except MailboxFullError:
+            return JSONResponse(
+                status_code=503,
+                content={"success": False, "message": "Muitas mensagens pendentes"}
+            )
+
         # Criar resposta TwiML
-        twiml_response = MessagingResponse()
-        twiml_response.message(response)
-        
-        return JSONResponse(content={"success": True, "message": str(twiml_response)})
-    
+        with WEBHOOK_STAGE_SECONDS.time(stage="twiml_render"):
+            twiml_response = MessagingResponse()
+            # Respostas acima do limite do WhatsApp saem em várias mensagens
+            for part in split_message(response) or [response]:
+                twiml_response.message(part)
+            content = {"success": True, "message": str(twiml_response)}
+
+        return JSONResponse(content=content)
+
     except Exception as e:
         logger.error(f"Erro ao processar webhook: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "Erro interno do servidor"}
         )
+    finally:
+        services.profiler.request_finished(request_id)
 
 
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Endpoint para verificar se a aplicação está funcionando"""
-    return {"status": "ok"}
+    services = request.app.state.services
+    status = {
+        "status": "ok",
+        "dispatcher": services.dispatcher.stats(),
+        "message_paths": services.command_router.stats()
+    }
+    if services.lookup_cache:
+        status["lookup_cache"] = services.lookup_cache.stats()
+    if services.dedupe:
+        status["webhook_dedupe"] = services.dedupe.stats()
+    if services.completion_cache:
+        status["completion_cache"] = services.completion_cache.stats()
+    if services.openai_scheduler:
+        status["openai_scheduler"] = services.openai_scheduler.stats()
+    if services.media:
+        status["media_pipeline"] = services.media.stats()
+    return status
+
+
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Probe de prontidão: 503 até o banco e a fila estarem disponíveis ou durante a drenagem"""
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        return JSONResponse(status_code=503, content={"ready": False})
+    ok, checks = await services.readiness()
+    return JSONResponse(status_code=200 if ok else 503, content={"ready": ok, "checks": checks})
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Métricas no formato texto do Prometheus (somadas entre os workers, se houver vários)"""
+    services = getattr(request.app.state, "services", None)
+    if services is not None and services.metrics_exporter:
+        body = services.metrics_exporter.render()
+    else:
+        body = REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+if DEBUG_ENDPOINTS:
+    @app.post("/debug/profiler")
+    async def toggle_profiler(request: Request, enabled: bool = True, reset: bool = False):
+        """Liga ou desliga o profiler de requisições lentas"""
+        profiler = request.app.state.services.profiler
+        if reset:
+            profiler.reset()
+        if enabled:
+            profiler.start()
+        else:
+            profiler.stop()
+        return {"enabled": profiler.enabled, "samples": profiler.samples}
+
+    @app.get("/debug/profiler")
+    async def profiler_report(request: Request, top: int = 50):
+        """Pilhas mais frequentes durante requisições lentas (formato collapsed)"""
+        return PlainTextResponse(request.app.state.services.profiler.collapsed(top))
 
 
 if __name__ == "__main__":
-    # Iniciar servidor
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", 8000))
-    
-    uvicorn.run("main:app", host=host, port=port, reload=True)
\ No newline at end of file
+    # Iniciar servidor (mesmas opções e variáveis de ambiente de run.py)
+    from run import serve
+
+    serve()
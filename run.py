@@ -1,23 +1,64 @@
+import argparse
 import os
+import tempfile
 import uvicorn
 from dotenv import load_dotenv
 
+from app.utils.metrics import MultiProcessMetrics
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Obter configurações do servidor
-HOST = os.getenv("SERVER_HOST", "0.0.0.0")
-PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Obter configurações do servidor (HOST/PORT continuam aceitos por compatibilidade)
+HOST = os.getenv("SERVER_HOST", os.getenv("HOST", "0.0.0.0"))
+PORT = int(os.getenv("SERVER_PORT", os.getenv("PORT", "8000")))
+MODE = os.getenv("SERVER_MODE", "development").lower()
+WORKERS = int(os.getenv("SERVER_WORKERS", "0")) or os.cpu_count() or 1
+DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "25"))
 
-if __name__ == "__main__":
-    print(f"Iniciando servidor Alex Bot em {HOST}:{PORT}...")
-    print("Pressione CTRL+C para encerrar")
-    
-    # Iniciar servidor Uvicorn
+
+def serve(production=None, workers=None, host=HOST, port=PORT):
+    """Inicia o uvicorn em modo desenvolvimento (reload) ou produção (vários workers)"""
+    if production is None:
+        production = MODE == "production"
+
+    if not production:
+        print(f"Iniciando servidor Alex Bot em {host}:{port} (desenvolvimento)...")
+        print("Pressione CTRL+C para encerrar")
+        uvicorn.run("main:app", host=host, port=port, reload=True, log_level="info")
+        return
+
+    workers = workers or WORKERS
+    if workers > 1 and os.getenv("LOOKUP_CACHE_ENABLED", "true").lower() == "true":
+        # O cache é local a cada processo: escritas em um worker não invalidam os outros
+        print("Cache de usuários desativado: não é seguro com vários workers")
+        os.environ["LOOKUP_CACHE_ENABLED"] = "false"
+    if workers > 1:
+        # Cada worker tem o próprio registro de métricas: o /metrics soma os snapshots gravados aqui
+        if not os.getenv("METRICS_MULTIPROC_DIR"):
+            os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="alex-metrics-")
+        MultiProcessMetrics.reset(os.environ["METRICS_MULTIPROC_DIR"])
+
+    print(f"Iniciando servidor Alex Bot em {host}:{port} (produção, {workers} workers)...")
     uvicorn.run(
         "main:app",
-        host=HOST,
-        port=PORT,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+        host=host,
+        port=port,
+        workers=workers,
+        reload=False,
+        log_level="info",
+        proxy_headers=True,
+        # No SIGTERM o uvicorn para de aceitar conexões e aguarda as requisições em
+        # andamento; o lifespan então drena a fila e os atores (SHUTDOWN_DRAIN_SECONDS)
+        timeout_graceful_shutdown=int(DRAIN_SECONDS)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor do Alex Bot")
+    parser.add_argument("--production", action="store_true", default=None,
+                        help="Sem reload e com vários workers (ou SERVER_MODE=production)")
+    parser.add_argument("--workers", type=int, help="Quantidade de processos (padrão: SERVER_WORKERS ou nº de CPUs)")
+    args = parser.parse_args()
+
+    serve(production=args.production, workers=args.workers)
@@ -2,7 +2,8 @@ import os
 import sys
 import subprocess
 from dotenv import load_dotenv
-from app.database.init_db import init_database
+from app.database.migrations import migrate_databases
+from app.database.sharding import shard_paths
 
 
 def setup_environment():
@@ -47,7 +48,8 @@ def setup_environment():
     print("\nInicializando banco de dados...")
     db_path = os.getenv("DATABASE_PATH", "database/alex_bot.db")
     try:
-        init_database(db_path)
+        shards = shard_paths(db_path, int(os.getenv("DATABASE_SHARDS", "1")))
+        migrate_databases(db_path, shards if len(shards) > 1 else None)
     except Exception as e:
         print(f"Erro ao inicializar banco de dados: {e}")
         sys.exit(1)
@@ -0,0 +1,163 @@
+import os
+import sys
+import sqlite3
+import argparse
+from dotenv import load_dotenv
+
+from app.database.sharding import next_id_generation, shard_for, shard_paths, reserve_id_ranges
+
+# Tabelas compartilhadas por todos os usuários: continuam apenas no banco principal.
+# Os checkpoints de envio (broadcast_runs) ficam em cada shard e não são copiados:
+# guardam ids da numeração antiga, então um envio retomado depois da divisão recomeça
+GLOBAL_TABLES = (
+    "processed_messages", "question_bank", "question_bank_cursor", "completion_cache",
+    "broadcast_lessons", "interaction_archive_files"
+)
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(
+        description="Divide o banco de um arquivo (ou redistribui shards existentes) em N shards por telefone"
+    )
+    parser.add_argument("--shards", type=int, required=True, help="Quantidade de shards de destino")
+    parser.add_argument("--from-shards", type=int, default=1,
+                        help="Quantidade atual de shards (1 = banco de arquivo único)")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Linhas copiadas por transação")
+    return parser.parse_args()
+
+
+def user_tables(conn):
+    """Tabelas de escopo de usuário: ``users`` e as que têm a coluna ``user_id``"""
+    tables = []
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall():
+        if name in GLOBAL_TABLES:
+            continue
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{name}")').fetchall()]
+        if name == "users" or "user_id" in columns:
+            tables.append((name, columns))
+    return tables
+
+
+def copy_schema(source, targets, tables):
+    """Recria nos shards as tabelas e índices de escopo de usuário"""
+    names = [name for name, _ in tables]
+    placeholders = ", ".join("?" for _ in names)
+    statements = [
+        row[0] for row in source.execute(
+            f"SELECT sql FROM sqlite_master WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL "
+            "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END",
+            names
+        ).fetchall()
+    ]
+    for target in targets:
+        for statement in statements:
+            statement = statement.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1)
+            statement = statement.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+            statement = statement.replace("CREATE UNIQUE INDEX ", "CREATE UNIQUE INDEX IF NOT EXISTS ", 1)
+            target.execute(statement)
+
+
+def copy_table(source, targets, table, columns, route, batch_size):
+    """Copia a tabela em lotes por rowid; ``INSERT OR IGNORE`` torna a cópia repetível"""
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    insert = f'INSERT OR IGNORE INTO "{table}" ({column_list}) VALUES ({", ".join("?" for _ in columns)})'
+    last_rowid, copied, skipped = 0, 0, 0
+    while True:
+        rows = source.execute(
+            f'SELECT rowid, {column_list} FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (last_rowid, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        batches = {}
+        for row in rows:
+            index = route(dict(zip(columns, row[1:])))
+            if index is None:
+                skipped += 1
+                continue
+            batches.setdefault(index, []).append(row[1:])
+        for index, batch in batches.items():
+            target = targets[index]
+            target.execute("BEGIN")
+            try:
+                target.executemany(insert, batch)
+            except BaseException:
+                target.execute("ROLLBACK")
+                raise
+            target.execute("COMMIT")
+            copied += len(batch)
+        last_rowid = rows[-1][0]
+    return copied, skipped
+
+
+def split(args):
+    """Distribui usuários e tabelas de escopo de usuário entre os shards de destino"""
+    database_path = os.getenv("DATABASE_PATH", "database/alex_bot.db")
+    sources = shard_paths(database_path, args.from_shards)
+    destinations = shard_paths(database_path, args.shards)
+    if set(sources) & set(destinations):
+        print("Erro: origem e destino são os mesmos arquivos")
+        sys.exit(1)
+    missing = [path for path in sources if not os.path.exists(path)]
+    if missing:
+        print(f"Erro: arquivos de origem não encontrados: {', '.join(missing)}")
+        sys.exit(1)
+
+    targets = [sqlite3.connect(path, isolation_level=None) for path in destinations]
+    for target in targets:
+        target.execute("PRAGMA journal_mode=WAL")
+    try:
+        for source_path in sources:
+            source = sqlite3.connect(source_path)
+            try:
+                tables = user_tables(source)
+                if not any(name == "users" for name, _ in tables):
+                    print(f"Aviso: {source_path} não tem a tabela users, ignorado")
+                    continue
+                copy_schema(source, targets, tables)
+
+                # Usuário -> shard pelo telefone; as demais tabelas seguem o dono da linha
+                owners = {}
+                for user_id, phone_number in source.execute("SELECT id, phone_number FROM users"):
+                    owners[user_id] = shard_for(phone_number, args.shards)
+
+                for table, columns in tables:
+                    if table == "users":
+                        route = lambda row: owners[row["id"]]
+                    else:
+                        route = lambda row: owners.get(row["user_id"])
+                    copied, skipped = copy_table(source, targets, table, columns, route, args.batch_size)
+                    note = f" ({skipped} sem usuário, ignoradas)" if skipped else ""
+                    print(f"  {source_path} -> {table}: {copied} linhas{note}")
+            finally:
+                source.close()
+
+        # Os ids copiados continuam únicos; os novos de cada destino começam acima de todos eles
+        sources_open = [sqlite3.connect(path) for path in sources]
+        try:
+            generation = next_id_generation(sources_open + targets)
+        finally:
+            for source in sources_open:
+                source.close()
+        for index, target in enumerate(targets):
+            reserve_id_ranges(target, index, generation)
+            users = target.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            print(f"Shard {index} ({destinations[index]}): {users} usuários")
+    finally:
+        for target in targets:
+            target.close()
+
+    print(f"\nPronto. Configure DATABASE_SHARDS={args.shards} e reinicie a aplicação.")
+    print("Os arquivos de origem não foram alterados (voltar é só restaurar DATABASE_SHARDS).")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    args = parse_args()
+    if args.shards < 2:
+        print("Erro: use --shards 2 ou mais")
+        sys.exit(1)
+    split(args)
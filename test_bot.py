@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
 from app.database.db_manager import DatabaseManager
 from app.services.ai_service import AIService
@@ -15,7 +16,18 @@ logger = setup_logger("test_bot")
 # Inicializar serviços
 db_manager = DatabaseManager(os.getenv("DATABASE_PATH", "database/alex_bot.db"))
 ai_service = AIService(os.getenv("OPENAI_API_KEY"))
-whatsapp_service = WhatsAppService(db_manager, ai_service)
+whatsapp_service = WhatsAppService(
+    account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
+    auth_token=os.getenv("TWILIO_AUTH_TOKEN"),
+    phone_number=os.getenv("TWILIO_PHONE_NUMBER"),
+    ai_service=ai_service,
+    db_manager=db_manager
+)
+
+
+def send_message(phone_number, body):
+    """Processa uma mensagem (process_message é uma corrotina, como em main.py)"""
+    return asyncio.run(whatsapp_service.process_message(phone_number, body, None))
 
 
 def test_registration_flow():
@@ -26,19 +38,19 @@ def test_registration_flow():
     phone_number = "+5511999999999"
     
     # Processar primeira mensagem (deve iniciar o registro)
-    response = whatsapp_service.process_message(phone_number, "Olá")
+    response = send_message(phone_number, "Olá")
     logger.info(f"Resposta inicial: {response}")
     
     # Processar nome
-    response = whatsapp_service.process_message(phone_number, "João")
+    response = send_message(phone_number, "João")
     logger.info(f"Resposta após nome: {response}")
     
     # Processar auto-avaliação de nível
-    response = whatsapp_service.process_message(phone_number, "iniciante")
+    response = send_message(phone_number, "iniciante")
     logger.info(f"Resposta após nível: {response}")
     
     # Confirmar início da avaliação
-    response = whatsapp_service.process_message(phone_number, "sim")
+    response = send_message(phone_number, "sim")
     logger.info(f"Resposta após confirmar avaliação: {response}")
     
     # Verificar se o usuário foi criado corretamente
@@ -71,10 +83,10 @@ def test_assessment_flow(user_id):
         # Simular uma resposta correta (para fins de teste)
         if questions_data[i]["question_type"] == "multiple_choice":
             # Para múltipla escolha, enviar a letra da resposta correta
-            response = whatsapp_service.process_message(phone_number, questions_data[i]["correct_answer"])
+            response = send_message(phone_number, questions_data[i]["correct_answer"])
         else:
             # Para resposta aberta, enviar a resposta correta
-            response = whatsapp_service.process_message(phone_number, questions_data[i]["correct_answer"])
+            response = send_message(phone_number, questions_data[i]["correct_answer"])
         
         logger.info(f"Resposta após pergunta {i+1}: {response}")
     
@@ -92,23 +104,23 @@ def test_commands():
     phone_number = "+5511999999999"
     
     # Testar comando de ajuda
-    response = whatsapp_service.process_message(phone_number, "/ajuda")
+    response = send_message(phone_number, "/ajuda")
     logger.info(f"Resposta para /ajuda: {response}")
     
     # Testar comando de lição
-    response = whatsapp_service.process_message(phone_number, "/licao")
+    response = send_message(phone_number, "/licao")
     logger.info(f"Resposta para /licao: {response}")
     
     # Testar comando de nível
-    response = whatsapp_service.process_message(phone_number, "/nivel")
+    response = send_message(phone_number, "/nivel")
     logger.info(f"Resposta para /nivel: {response}")
     
     # Testar comando de progresso
-    response = whatsapp_service.process_message(phone_number, "/progresso")
+    response = send_message(phone_number, "/progresso")
     logger.info(f"Resposta para /progresso: {response}")
     
     # Testar comando de prática
-    response = whatsapp_service.process_message(phone_number, "/pratica")
+    response = send_message(phone_number, "/pratica")
     logger.info(f"Resposta para /pratica: {response}")
 
 
@@ -127,7 +139,7 @@ def test_conversation():
     ]
     
     for msg in messages:
-        response = whatsapp_service.process_message(phone_number, msg)
+        response = send_message(phone_number, msg)
         logger.info(f"Mensagem: {msg}")
         logger.info(f"Resposta: {response}")
 
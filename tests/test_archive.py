@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from app.database.archive import ArchivedHistoryManager, InteractionArchive
+from app.database.connection_pool import SQLitePool
+from app.database.sharding import routed
+from app.database.write_buffer import WriteBehindBuffer, WriteBufferedManager
+
+SCHEMA = """
+CREATE TABLE interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT, response TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+INSERT = "INSERT INTO interactions (user_id, message, response, created_at) VALUES (?, ?, ?, ?)"
+
+
+class FakeManager:
+    """Parte do DatabaseManager usada aqui: só enxerga a tabela quente"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def execute_query(self, query, params=()):
+        return self.pool.execute_query(query, params)
+
+    def get_user_by_phone(self, phone_number):
+        return {"id": 1, "phone_number": phone_number}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    pool = SQLitePool(str(tmp_path / "history.db"), size=2)
+    pool.execute_query(SCHEMA)
+    archive = InteractionArchive(pool, str(tmp_path / "archive"), retention_days=90)
+    archive.ensure_schema()
+    pool.executemany(INSERT, [
+        (1, "old hello", "r", "2026-01-10 10:00:00"),
+        (2, "other user", "r", "2026-01-11 10:00:00"),
+        (1, "old again", "r", "2026-02-01 10:00:00"),
+        (1, "recent", "r", "2026-10-01 10:00:00")
+    ])
+    assert archive.archive(now=datetime(2026, 10, 17)) == 3
+    yield archive
+    pool.close()
+
+
+def test_history_joins_archived_and_hot_rows(archive):
+    manager = ArchivedHistoryManager(FakeManager(archive.pool), archive)
+    assert [row["message"] for row in manager.get_user_history(1)] == ["old hello", "old again", "recent"]
+    assert [row["message"] for row in manager.get_user_history(1, since="2026-02-01")] == ["old again", "recent"]
+    assert [row["message"] for row in manager.get_user_history(1, include_archived=False)] == ["recent"]
+    # Os demais métodos continuam no DatabaseManager
+    assert manager.get_user_by_phone("+5511")["id"] == 1
+
+
+def test_history_reads_pending_buffered_writes(archive):
+    buffer = WriteBehindBuffer(archive.pool, max_rows=1000, max_delay_ms=60000)
+    manager = WriteBufferedManager(ArchivedHistoryManager(FakeManager(archive.pool), archive), [buffer])
+    try:
+        with routed("+5511"):
+            manager.execute_query(INSERT, (1, "just now", "r", "2026-10-17 09:00:00"))
+            history = manager.get_user_history(1)
+    finally:
+        buffer.close()
+    assert [row["message"] for row in history] == ["old hello", "old again", "recent", "just now"]
@@ -0,0 +1,68 @@
+import argparse
+import os
+from datetime import datetime
+
+import pytest
+
+from app.database.archive import InteractionArchive
+from app.database.connection_pool import SQLitePool
+from app.database.progress_aggregates import ProgressAggregates
+from backfill_progress import backfill_database
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, phone_number TEXT, level TEXT);
+CREATE TABLE interactions (
+    id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, response TEXT, created_at TIMESTAMP
+);
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "alex.db")
+    pool = SQLitePool(path, size=2)
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO users (id, phone_number, level) VALUES (1, '+5511', 'B1')")
+        conn.executemany(
+            "INSERT INTO interactions (user_id, message, response, created_at) VALUES (1, ?, 'ok', ?)",
+            [("/licao", "2025-01-10 10:00:00"), ("hello", "2025-01-11 10:00:00"),
+             ("/pratica", "2025-02-01 10:00:00"), ("hi", "2026-06-01 10:00:00")]
+        )
+    yield path, pool, str(tmp_path / "archive")
+    pool.close()
+
+
+def run_backfill(path, archive_dir):
+    backfill_database(path, argparse.Namespace(batch_size=2, archive_dir=archive_dir))
+
+
+def test_backfill_counts_archived_history(database):
+    path, pool, archive_dir = database
+    archive = InteractionArchive(pool, archive_dir, retention_days=90)
+    archive.ensure_schema()
+    assert archive.archive(now=datetime(2026, 6, 2)) == 3
+
+    run_backfill(path, archive_dir)
+    progress = ProgressAggregates(pool).get(1)
+    assert progress["interactions"] == 4
+    assert progress["lessons_completed"] == 1 and progress["practice_sessions"] == 1
+    assert progress["current_level"] == "B1"
+
+
+def test_rows_left_in_both_places_are_counted_once(database):
+    path, pool, archive_dir = database
+    archive = InteractionArchive(pool, archive_dir, retention_days=90)
+    archive.ensure_schema()
+    rows = pool.fetch_all("SELECT * FROM interactions WHERE created_at < '2025-02-01'")
+    os.makedirs(archive_dir)
+    archive._archive_batch(rows)
+    # Arquivamento interrompido: as linhas voltam a existir na tabela quente
+    with pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO interactions (id, user_id, message, response, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(row["id"], row["user_id"], row["message"], row["response"], row["created_at"]) for row in rows]
+        )
+
+    run_backfill(path, archive_dir)
+    assert ProgressAggregates(pool).get(1)["interactions"] == 4
@@ -0,0 +1,88 @@
+import json
+
+from app.database.cached_db_manager import CachedDatabaseManager
+from app.database.sharding import routed
+
+
+class FakeManager:
+    def __init__(self):
+        self.users = {
+            "+5511": {"id": 1, "phone_number": "+5511", "level": "A1"},
+            "+5522": {"id": 2, "phone_number": "+5522", "level": "B1"}
+        }
+        self.sessions = {
+            1: {"user_id": 1, "questions_data": json.dumps([{"q": "one"}])},
+            2: {"user_id": 2, "questions_data": json.dumps([{"q": "two"}])}
+        }
+        self.reads = 0
+
+    def get_user_by_phone(self, phone_number):
+        self.reads += 1
+        user = self.users.get(phone_number)
+        return dict(user) if user else None
+
+    def get_assessment_session(self, user_id):
+        self.reads += 1
+        session = self.sessions.get(user_id)
+        return dict(session) if session else None
+
+    def update_user_level(self, user_id, level):
+        for user in self.users.values():
+            if user["id"] == user_id:
+                user["level"] = level
+
+    def save_assessment_answer(self, user_id, answer):
+        self.sessions[user_id]["questions_data"] = json.dumps([{"q": "one", "answer": answer}])
+
+    def reset_everything(self):
+        pass
+
+
+def warm(cached):
+    for phone in ("+5511", "+5522"):
+        user = cached.get_user_by_phone(phone)
+        cached.get_assessment_session(user["id"])
+
+
+def test_mutating_returned_session_does_not_corrupt_cache():
+    cached = CachedDatabaseManager(FakeManager())
+    session = cached.get_assessment_session(1)
+    session["questions"].append({"q": "injected"})
+    session["questions"][0]["q"] = "changed"
+    assert cached.get_assessment_session(1)["questions"] == [{"q": "one"}]
+
+
+def test_write_by_user_id_invalidates_only_that_user():
+    manager = FakeManager()
+    cached = CachedDatabaseManager(manager)
+    warm(cached)
+    cached.update_user_level(1, "A2")
+    reads = manager.reads
+
+    assert cached.get_user_by_phone("+5511")["level"] == "A2"
+    assert manager.reads == reads + 1
+    # O outro usuário continua em cache
+    cached.get_user_by_phone("+5522")
+    cached.get_assessment_session(2)
+    assert manager.reads == reads + 1
+
+
+def test_write_inside_message_invalidates_sender_session():
+    manager = FakeManager()
+    cached = CachedDatabaseManager(manager)
+    warm(cached)
+    with routed("+5511"):
+        cached.save_assessment_answer(1, "b")
+    assert cached.get_assessment_session(1)["questions"] == [{"q": "one", "answer": "b"}]
+    reads = manager.reads
+    cached.get_assessment_session(2)
+    assert manager.reads == reads
+
+
+def test_write_without_user_key_clears_everything():
+    manager = FakeManager()
+    cached = CachedDatabaseManager(manager)
+    warm(cached)
+    cached.reset_everything()
+    assert len(cached.user_cache) == 0
+    assert len(cached.session_cache) == 0
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.command_router import (
+    HELP_TEXT, MULTIPLE_CHOICE_ANSWER, CommandRouter, grade_assessment_answer, grade_multiple_choice
+)
+
+# Formato gerado pelo AIService/banco de perguntas para a avaliação de nível
+QUESTIONS_DATA = json.dumps([
+    {
+        "question": "Choose the correct past form of 'go'.",
+        "options": ["A) went", "B) goed", "C) gone", "D) going"],
+        "correct_answer": "A",
+        "question_type": "multiple_choice"
+    },
+    {
+        "question": "She ___ to school every day.",
+        "options": ["A) go", "B) goes", "C) going", "D) gone"],
+        "correct_answer": "B) goes",
+        "question_type": "multiple_choice"
+    },
+    {
+        "question": "Translate: 'Eu gosto de café'.",
+        "correct_answer": "I like coffee",
+        "question_type": "open_ended"
+    },
+])
+
+
+def session(current_question, **extra):
+    return {"id": 7, "user_id": 1, "questions_data": QUESTIONS_DATA, "current_question": current_question, **extra}
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("A", True), ("a", True), (" (a) ", True), ("A.", True), ("B", False), ("d)", False),
+    ("went", None), ("A went", None), ("", None),
+])
+def test_grade_multiple_choice(answer, expected):
+    question = json.loads(QUESTIONS_DATA)[0]
+    assert grade_multiple_choice(question, answer) is expected
+
+
+def test_correct_answer_with_option_text_and_open_questions():
+    questions = json.loads(QUESTIONS_DATA)
+    assert grade_multiple_choice(questions[1], "b") is True
+    assert grade_multiple_choice(questions[2], "A") is None
+
+
+def test_grading_advances_the_session_and_asks_the_next_question():
+    grade = grade_assessment_answer(session(0, answers=None), "b")
+    assert grade.correct is False
+    query, params = grade.update()
+    assert query == "UPDATE assessment_sessions SET current_question = ?, answers = ? WHERE id = ?"
+    assert params[0] == 1 and params[2] == 7
+    assert json.loads(params[1]) == [{"question": 0, "answer": "B", "correct": False}]
+    reply = grade.reply()
+    assert "A resposta certa é *A*" in reply
+    assert "*Pergunta 2/3*" in reply and "B) goes" in reply
+
+    # Sessão já decodificada pelo cache e sem coluna de respostas
+    decoded = {"id": 7, "questions": json.loads(QUESTIONS_DATA), "current_question": 0}
+    grade = grade_assessment_answer(decoded, "A")
+    assert grade.correct is True and grade.reply().startswith("✅ Correto!")
+    assert grade.update() == ("UPDATE assessment_sessions SET current_question = ? WHERE id = ?", (1, 7))
+
+
+@pytest.mark.parametrize("current, answer", [
+    (2, "A"),      # última pergunta (e aberta): o fluxo completo encerra a avaliação
+    (1, "goes"),   # não é uma letra
+    (None, "A"),   # sessão sem a pergunta em aberto
+])
+def test_answers_that_are_not_trivially_gradable_go_to_the_full_flow(current, answer):
+    assert grade_assessment_answer(session(current), answer) is None
+    assert grade_assessment_answer(None, "A") is None
+
+
+def test_router_dispatches_answers_to_the_assessment_handler_with_its_own_counter():
+    router = CommandRouter()
+    sessions = {"+5511": session(0)}
+
+    def handler(sender, body):
+        grade = grade_assessment_answer(sessions.get(sender), body)
+        return grade.reply() if grade else None
+
+    router.register_pattern(MULTIPLE_CHOICE_ANSWER, "assessment", handler)
+
+    async def scenario():
+        return [
+            await router.route("+5511", "a"),
+            await router.route("+5522", "a"),
+            await router.route("+5511", "I went home"),
+            await router.route("+5511", "/ajuda"),
+        ]
+
+    graded, no_session, conversation, help_text = asyncio.run(scenario())
+    assert graded.startswith("✅ Correto!")
+    assert no_session is None and conversation is None
+    assert help_text == HELP_TEXT
+    assert router.stats() == {"local:assessment": 1, "full": 2, "local:/ajuda": 1}
+
+
+def test_async_conversation_predicate_is_awaited():
+    calls = []
+
+    async def in_conversation(sender):
+        calls.append(sender)
+        await asyncio.sleep(0)
+        return sender == "+5511"
+
+    router = CommandRouter(grammar_check_enabled=True, conversation_predicate=in_conversation)
+
+    async def scenario():
+        return (
+            await router.route("+5511", "He have a dog."),
+            await router.route("+5522", "He have a dog."),
+        )
+
+    corrected, in_assessment = asyncio.run(scenario())
+    assert "He has a dog." in corrected
+    assert in_assessment is None
+    assert calls == ["+5511", "+5522"]
+
+
+def test_final_answer_is_graded_only_on_request():
+    questions = json.loads(QUESTIONS_DATA)[:2]
+    last = {"id": 7, "questions": questions, "current_question": 1}
+    assert grade_assessment_answer(last, "B") is None
+
+    grade = grade_assessment_answer(last, "B", final=True)
+    assert grade.completed and grade.skills() == [("assessment", True)]
+    assert not grade_assessment_answer(session(0), "A").completed
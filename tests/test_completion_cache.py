@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from app.services.completion_cache import CachedCompletionProxy, CompletionCache, argument_level, normalize_text
+
+
+def test_normalize_text_ignores_case_accents_and_punctuation():
+    assert normalize_text("  Olá,   COMO  vai?! ") == "ola como vai"
+
+
+def test_identical_requests_share_one_call():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "lesson"
+
+    async def scenario():
+        cache = CompletionCache()
+        results = await asyncio.gather(*(
+            cache.get_or_compute("lesson", "Past tense!", "A1", compute) for _ in range(5)
+        ))
+        again = await cache.get_or_compute("lesson", "past tense", "A1", compute)
+        return results, again, cache.stats()["prompt_types"]["lesson"]
+
+    results, again, stats = asyncio.run(scenario())
+    assert results == ["lesson"] * 5 and again == "lesson"
+    assert calls == 1
+    assert stats["coalesced"] == 4 and stats["memory_hits"] == 1
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return f"answer {calls}"
+
+    async def scenario():
+        cache = CompletionCache()
+        leader = asyncio.create_task(cache.get_or_compute("lesson", "t", "A1", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute("lesson", "t", "A1", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    # O aguardante assume a chamada em vez de herdar o cancelamento
+    assert asyncio.run(scenario()) == "answer 2"
+
+
+def test_leader_error_reaches_waiters_and_is_not_cached():
+    attempts = 0
+
+    async def failing():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("api")
+
+    async def scenario():
+        cache = CompletionCache()
+        results = await asyncio.gather(
+            *(cache.get_or_compute("lesson", "t", "A1", failing) for _ in range(3)), return_exceptions=True
+        )
+        await asyncio.gather(cache.get_or_compute("lesson", "t", "A1", failing), return_exceptions=True)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert attempts == 2
+
+
+class FakeAI:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_lesson(self, level, topic):
+        self.calls.append(("lesson", level, topic))
+        return f"{level} {topic}"
+
+    async def process_conversation(self, text):
+        self.calls.append(("conversation", text))
+        return text
+
+
+def test_proxy_caches_only_non_personalized_methods():
+    async def scenario():
+        ai = FakeAI()
+        proxy = CachedCompletionProxy(ai, CompletionCache())
+        for _ in range(3):
+            assert await proxy.generate_lesson("A1", "food") == "A1 food"
+            assert await proxy.process_conversation("hi") == "hi"
+        assert await proxy.generate_lesson("A2", "food") == "A2 food"
+        return ai.calls
+
+    calls = asyncio.run(scenario())
+    assert calls.count(("lesson", "A1", "food")) == 1
+    assert calls.count(("conversation", "hi")) == 3
+    assert ("lesson", "A2", "food") in calls
+
+
+def test_persistent_tier_survives_new_instance(tmp_path):
+    from app.database.connection_pool import SQLitePool
+    from app.services.completion_cache import create_completion_cache_tables
+
+    pool = SQLitePool(str(tmp_path / "cache.db"), size=1)
+    with pool.connection() as conn:
+        create_completion_cache_tables(conn)
+
+    async def compute():
+        return "stored"
+
+    async def scenario():
+        await CompletionCache(pool).get_or_compute("lesson", "t", "A1", compute)
+        fresh = CompletionCache(pool)
+        result = await fresh.get_or_compute("lesson", "t", "A1", None)
+        return result, fresh.stats()["prompt_types"]["lesson"]["disk_hits"]
+
+    assert asyncio.run(scenario()) == ("stored", 1)
+    pool.close()
+
+
+def test_level_comes_from_the_call_arguments():
+    assert argument_level(("food", "B1"), {}) == "b1"
+    assert argument_level(("food",), {"level": "Intermediário"}) == "intermediario"
+    assert argument_level(("Iniciante", "food"), {}) == "iniciante"
+    assert argument_level(("food",), {}) == ""
+
+
+def test_proxy_keys_entries_on_the_user_level():
+    class RecordingCache(CompletionCache):
+        def __init__(self):
+            super().__init__()
+            self.levels = []
+
+        async def get_or_compute(self, prompt_type, text, level, compute, **kwargs):
+            self.levels.append(level)
+            return await super().get_or_compute(prompt_type, text, level, compute, **kwargs)
+
+    async def scenario():
+        cache = RecordingCache()
+        proxy = CachedCompletionProxy(FakeAI(), cache)
+        await proxy.generate_lesson("A1", "food")
+        await proxy.generate_lesson(level="C2", topic="food")
+        return cache.levels
+
+    assert asyncio.run(scenario()) == ["a1", "c2"]
+
+
+def test_expired_entries_are_pruned_periodically(tmp_path):
+    from app.database.connection_pool import SQLitePool
+    from app.services.completion_cache import create_completion_cache_tables
+
+    pool = SQLitePool(str(tmp_path / "cache.db"), size=1)
+    with pool.connection() as conn:
+        create_completion_cache_tables(conn)
+
+    async def compute():
+        return "stored"
+
+    async def scenario():
+        cache = CompletionCache(pool, ttl=0.01, prune_interval=0.05)
+        await cache.get_or_compute("lesson", "t", "a1", compute)
+        await cache.start()
+        await asyncio.sleep(0.2)
+        await cache.stop()
+        return pool.fetch_one("SELECT COUNT(*) AS total FROM completion_cache")["total"]
+
+    assert asyncio.run(scenario()) == 0
+    pool.close()
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.database.connection_pool import PoolTimeoutError, SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=2, acquire_timeout=0.2)
+    pool.execute_query("CREATE TABLE users (id INTEGER PRIMARY KEY, phone TEXT UNIQUE)")
+    yield pool
+    pool.close()
+
+
+def test_connections_use_wal_and_the_configured_pragmas(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pragmas.db"), busy_timeout=1234, cache_size_kb=2048, synchronous="NORMAL")
+    try:
+        with pool.connection() as conn:
+            pragmas = {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("journal_mode", "synchronous", "cache_size", "busy_timeout", "foreign_keys", "temp_store")
+            }
+    finally:
+        pool.close()
+    # synchronous=NORMAL é 1 e temp_store=MEMORY é 2
+    assert pragmas == {
+        "journal_mode": "wal", "synchronous": 1, "cache_size": -2048, "busy_timeout": 1234,
+        "foreign_keys": 1, "temp_store": 2
+    }
+
+
+def test_connections_are_returned_and_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool._created == 1
+
+
+def test_exhausted_pool_times_out_until_a_connection_returns(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+
+    returned = threading.Event()
+    holding = threading.Barrier(3)
+
+    def hold():
+        with pool.connection():
+            holding.wait()
+            returned.wait()
+
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for holder in holders:
+        holder.start()
+    holding.wait()
+    threading.Timer(0.05, returned.set).start()
+    # Espera a devolução em vez de abrir uma terceira conexão
+    with pool.connection():
+        pass
+    for holder in holders:
+        holder.join()
+    assert pool._created == 2
+
+
+def test_transaction_commits_or_rolls_back(pool):
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO users (phone) VALUES ('+5511')")
+
+    with pytest.raises(RuntimeError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO users (phone) VALUES ('+5522')")
+            raise RuntimeError("falhou no meio")
+
+    assert [row["phone"] for row in pool.fetch_all("SELECT phone FROM users")] == ["+5511"]
+    # A conexão devolvida não carrega a transação abortada
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+
+
+def test_executemany_is_atomic(pool):
+    with pytest.raises(Exception):
+        pool.executemany("INSERT INTO users (phone) VALUES (?)", [("+1",), ("+2",), ("+1",)])
+    assert pool.fetch_one("SELECT COUNT(*) AS n FROM users") == {"n": 0}
+    assert pool.executemany("INSERT INTO users (phone) VALUES (?)", [("+1",), ("+2",)]) == 2
+
+
+def test_execute_query_returns_rows_or_lastrowid(pool):
+    assert pool.execute_query("INSERT INTO users (phone) VALUES (?)", ("+5511",)) == 1
+    assert pool.execute_query("SELECT id, phone FROM users") == [{"id": 1, "phone": "+5511"}]
+    assert pool.fetch_one("SELECT phone FROM users WHERE id = ?", (2,)) is None
+
+
+def test_async_wrappers_run_on_the_pool_threads(pool):
+    threads = []
+
+    def current_thread():
+        threads.append(threading.current_thread().name)
+
+    async def scenario():
+        await pool.aexecutemany("INSERT INTO users (phone) VALUES (?)", [("+1",), ("+2",)])
+        user_id = await pool.aexecute_query("INSERT INTO users (phone) VALUES (?)", ("+3",))
+        await pool.run(current_thread)
+        return (
+            user_id,
+            await pool.afetch_one("SELECT phone FROM users WHERE id = ?", (user_id,)),
+            await pool.afetch_all("SELECT phone FROM users ORDER BY id")
+        )
+
+    user_id, row, rows = asyncio.run(scenario())
+    assert user_id == 3 and row == {"phone": "+3"}
+    assert [r["phone"] for r in rows] == ["+1", "+2", "+3"]
+    assert threads[0].startswith("sqlite-pool")
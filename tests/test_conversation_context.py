@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.services.conversation_context import ConversationContextManager, create_conversation_context_tables
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "context.db"), size=2)
+    with pool.connection() as conn:
+        create_conversation_context_tables(conn)
+    yield pool
+    pool.close()
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.folded = []
+
+    async def __call__(self, summary, turns):
+        self.folded.extend(turn["content"] for turn in turns)
+        return " ".join(filter(None, [summary] + [turn["content"] for turn in turns]))
+
+
+def covered(messages):
+    """Conteúdo presente no prompt: turnos e o texto do resumo"""
+    return " ".join(message["content"] for message in messages)
+
+
+def test_every_turn_is_in_summary_or_prompt(pool):
+    summarizer = FakeSummarizer()
+    manager = ConversationContextManager(pool, summarizer, recent_turns=4, fold_batch=3, token_budget=10000)
+
+    async def scenario():
+        for i in range(20):
+            await manager.record_turn("+5511", "user", f"turn{i:02d}")
+            await manager.wait_idle()
+            messages = await manager.build_messages("+5511", "system", "next")
+            text = covered(messages)
+            missing = [f"turn{j:02d}" for j in range(i + 1) if f"turn{j:02d}" not in text]
+            assert not missing, f"após {i + 1} turnos faltam {missing}"
+
+    asyncio.run(scenario())
+    assert summarizer.folded
+
+
+def test_fold_keeps_recent_window(pool):
+    manager = ConversationContextManager(pool, FakeSummarizer(), recent_turns=2, fold_batch=2, token_budget=10000)
+
+    async def scenario():
+        for i in range(4):
+            await manager.record_turn("+5511", "user", f"t{i}")
+        await manager.wait_idle()
+
+    asyncio.run(scenario())
+    turns = pool.fetch_all("SELECT content FROM conversation_turns ORDER BY id")
+    assert [row["content"] for row in turns] == ["t2", "t3"]
+    summary = pool.fetch_one("SELECT summary, summarized_turns FROM conversation_summaries")
+    assert summary["summary"] == "t0 t1" and summary["summarized_turns"] == 2
+
+
+def test_prompt_respects_token_budget(pool):
+    manager = ConversationContextManager(pool, FakeSummarizer(), recent_turns=50, fold_batch=50, token_budget=60)
+
+    async def scenario():
+        for i in range(10):
+            await manager.record_turn("+5511", "user", f"{i} " + "x" * 40)
+        return await manager.build_messages("+5511", "sys", "hi")
+
+    messages = asyncio.run(scenario())
+    # Os turnos mais recentes têm prioridade
+    assert messages[-2]["content"].startswith("9 ")
+    assert len(messages) < 12
+
+
+def test_turns_over_budget_are_folded_into_the_summary(pool):
+    summarizer = FakeSummarizer()
+    # Janela larga: sem o orçamento estourado nenhum resumo seria feito
+    manager = ConversationContextManager(pool, summarizer, recent_turns=50, fold_batch=50, token_budget=60)
+
+    async def scenario():
+        for i in range(10):
+            await manager.record_turn("+5511", "user", f"turn{i} " + "x" * 40)
+        first = await manager.build_messages("+5511", "sys", "hi")
+        await manager.wait_idle()
+        second = await manager.build_messages("+5511", "sys", "hi")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    kept = [message["content"].split()[0] for message in first[1:-1]]
+    dropped = [f"turn{i}" for i in range(10) if f"turn{i}" not in kept]
+    assert dropped and summarizer.folded == [f"{turn} " + "x" * 40 for turn in dropped]
+    # Os turnos resumidos saem da tabela; os mantidos continuam no prompt
+    remaining = pool.fetch_all("SELECT content FROM conversation_turns ORDER BY id")
+    assert [row["content"].split()[0] for row in remaining] == kept
+    assert second[1]["content"].startswith("Conversation summary so far:")
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.database import data_transfer
+from app.database.data_transfer import CHECKPOINT_FILE, TableExporter, TableImporter, TargetNotEmptyError, table_path
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone_number TEXT, name TEXT);
+CREATE TABLE interactions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT);
+"""
+
+
+def create_database(path, users):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    for user_id, name in users:
+        conn.execute("INSERT INTO users (id, phone_number, name) VALUES (?, ?, ?)", (user_id, f"+55{user_id}", name))
+        conn.executemany(
+            "INSERT INTO interactions (user_id, message) VALUES (?, ?)",
+            [(user_id, f"{name} {n}") for n in range(5)]
+        )
+    conn.commit()
+    conn.close()
+
+
+def read_export(directory, table):
+    with gzip.open(table_path(directory, table), "rt", encoding="utf-8") as table_file:
+        return [json.loads(line) for line in table_file]
+
+
+def test_resumed_export_drops_a_batch_torn_by_a_crash(tmp_path, monkeypatch):
+    source = str(tmp_path / "source.db")
+    create_database(source, [(n, f"user{n}") for n in range(1, 11)])
+    directory = str(tmp_path / "backup")
+    real_write_json = data_transfer._write_json
+    checkpoints = []
+
+    def crash_after_second_batch(path, data):
+        real_write_json(path, data)
+        if path.endswith(CHECKPOINT_FILE):
+            checkpoints.append(path)
+            if len(checkpoints) == 2:
+                # O terceiro lote chega ao arquivo só pela metade e o processo morre
+                with open(table_path(directory, "users"), "ab") as raw:
+                    raw.write(gzip.compress(b'{"id": 99}\n')[:15])
+                raise KeyboardInterrupt
+
+    monkeypatch.setattr(data_transfer, "_write_json", crash_after_second_batch)
+    with pytest.raises(KeyboardInterrupt):
+        TableExporter(source, directory, tables=("users",), batch_size=3).run()
+    with pytest.raises(EOFError):
+        read_export(directory, "users")
+
+    monkeypatch.setattr(data_transfer, "_write_json", real_write_json)
+    manifest = TableExporter(source, directory, tables=("users",), batch_size=3).run()
+    assert manifest["tables"]["users"]["rows"] == 10
+    assert [row["id"] for row in read_export(directory, "users")] == list(range(1, 11))
+
+
+def test_import_refuses_a_target_with_data_unless_replace(tmp_path):
+    source = str(tmp_path / "source.db")
+    create_database(source, [(1, "ana"), (2, "bruno")])
+    directory = str(tmp_path / "backup")
+    TableExporter(source, directory, tables=("users", "interactions")).run()
+
+    target = str(tmp_path / "target.db")
+    create_database(target, [(1, "carla")])
+    with pytest.raises(TargetNotEmptyError):
+        TableImporter(target, directory).run()
+    conn = sqlite3.connect(target)
+    # Nada foi importado: o histórico de outro aluno não foi parar na carla
+    assert conn.execute("SELECT COUNT(*) FROM interactions").fetchone()[0] == 5
+    conn.close()
+
+    assert TableImporter(target, directory, replace=True).run() == {"users": 2, "interactions": 10}
+    conn = sqlite3.connect(target)
+    assert conn.execute("SELECT name FROM users ORDER BY id").fetchall() == [("ana",), ("bruno",)]
+    conn.close()
+
+
+def test_import_into_an_empty_target_and_resume(tmp_path):
+    source = str(tmp_path / "source.db")
+    create_database(source, [(1, "ana"), (2, "bruno")])
+    directory = str(tmp_path / "backup")
+    TableExporter(source, directory, tables=("users", "interactions")).run()
+
+    target = str(tmp_path / "target.db")
+    importer = TableImporter(target, directory, batch_size=4)
+    assert importer.run(["users"]) == {"users": 2}
+    # Retomar a mesma importação não conta as tabelas já iniciadas como "destino com dados"
+    assert importer.run() == {"users": 0, "interactions": 10}
+    assert os.path.exists(target)
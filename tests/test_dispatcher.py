@@ -0,0 +1,167 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.dispatcher import MailboxFullError, SenderDispatcher
+
+
+def test_messages_from_same_sender_run_in_order():
+    processed = []
+
+    async def handler(sender, body):
+        # Mensagens anteriores demoram mais: sem a fila por remetente a ordem se inverteria
+        await asyncio.sleep(0.01 * (5 - int(body)))
+        processed.append(body)
+        return body
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        results = await asyncio.gather(*(dispatcher.submit("+5511", str(i)) for i in range(5)))
+        await dispatcher.stop()
+        return results
+
+    assert asyncio.run(scenario()) == ["0", "1", "2", "3", "4"]
+    assert processed == ["0", "1", "2", "3", "4"]
+
+
+def test_different_senders_run_in_parallel():
+    running = 0
+    peak = 0
+
+    async def handler(sender, body):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        await asyncio.gather(*(dispatcher.submit(f"+55{i}", "oi") for i in range(10)))
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert peak == 10
+
+
+def test_full_mailbox_is_rejected():
+    release = None
+
+    async def handler(sender, body):
+        await release.wait()
+        return body
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        dispatcher = SenderDispatcher(handler, mailbox_size=2)
+        # O primeiro sai da caixa para o handler; os dois seguintes ocupam a caixa
+        tasks = [asyncio.create_task(dispatcher.submit("+5511", "0"))]
+        await asyncio.sleep(0.01)
+        tasks += [asyncio.create_task(dispatcher.submit("+5511", str(i))) for i in (1, 2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(MailboxFullError):
+            await dispatcher.submit("+5511", "extra")
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert dispatcher.stats()["rejected"] == 1
+        await dispatcher.stop()
+        return results
+
+    assert asyncio.run(scenario()) == ["0", "1", "2"]
+
+
+def test_handler_error_reaches_caller_and_actor_keeps_running():
+    async def handler(sender, body):
+        if body == "erro":
+            raise ValueError("falhou")
+        return body
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        with pytest.raises(ValueError):
+            await dispatcher.submit("+5511", "erro")
+        result = await dispatcher.submit("+5511", "ok")
+        await dispatcher.stop()
+        return result
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_idle_actor_is_evicted():
+    async def handler(sender, body):
+        return body
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler, idle_timeout=0.02)
+        await dispatcher.submit("+5511", "oi")
+        await asyncio.sleep(0.1)
+        stats = dispatcher.stats()
+        # Um remetente que volta depois da remoção ganha um ator novo
+        result = await dispatcher.submit("+5511", "de novo")
+        await dispatcher.stop()
+        return stats, result
+
+    stats, result = asyncio.run(scenario())
+    assert stats["active_actors"] == 0
+    assert stats["evicted"] == 1
+    assert result == "de novo"
+
+
+def test_sync_handler_runs_in_thread_pool():
+    threads = []
+
+    def handler(sender, body):
+        threads.append(threading.get_ident())
+        return body.upper()
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        result = await dispatcher.submit("+5511", "oi")
+        await dispatcher.stop()
+        return result
+
+    assert asyncio.run(scenario()) == "OI"
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_drain_waits_for_pending_messages():
+    async def handler(sender, body):
+        await asyncio.sleep(0.05)
+        return body
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        tasks = [asyncio.create_task(dispatcher.submit("+5511", str(i))) for i in range(3)]
+        await asyncio.sleep(0)
+        remaining = await dispatcher.drain(timeout=2, poll_interval=0.01)
+        await dispatcher.stop()
+        return remaining, [task.result() for task in tasks]
+
+    remaining, results = asyncio.run(scenario())
+    assert remaining == 0
+    assert results == ["0", "1", "2"]
+
+
+def test_posted_message_delivers_result_and_errors_through_the_callback():
+    delivered = []
+
+    async def handler(sender, body):
+        if body == "erro":
+            raise ValueError(body)
+        return body.upper()
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+
+        async def callback(result, error):
+            delivered.append((result, type(error).__name__ if error else None))
+
+        for body in ("oi", "erro", "tchau"):
+            dispatcher.post("+5511", body, callback=callback)
+        assert await dispatcher.drain(timeout=2) == 0
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert delivered == [("OI", None), (None, "ValueError"), ("TCHAU", None)]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.services.command_router import CommandRouter
+from app.services.grammar_check import IRREGULAR_PAST, check_grammar
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Yesterday I goed to school.", "Yesterday I went to school."),
+    ("She buyed a car.", "She bought a car."),
+    ("He have a dog.", "He has a dog."),
+    ("She don't like coffee.", "She doesn't like coffee."),
+    ("They is happy.", "They are happy."),
+    ("I has two brothers.", "I have two brothers."),
+    ("We was tired.", "We were tired."),
+    ("I was late, and you was early.", "I was late, and you were early."),
+    ("When it are cold I stay home.", "When it is cold I stay home."),
+])
+def test_rules_fix_common_mistakes(text, expected):
+    corrected, corrections = check_grammar(text)
+    assert corrected == expected
+    assert corrections
+
+
+@pytest.mark.parametrize("text", [
+    "Does she have a car?",
+    "Doesn't she have a car?",
+    "Didn't he have time?",
+    "Could he have gone?",
+    "Should it have worked?",
+    "Would she have known?",
+    "She might have left.",
+    "He must have seen it.",
+    "May she have a cookie?",
+    "Can't he have one?",
+    "Won't it have to wait?",
+    "Let him go and let it have its space.",
+    "I paid the bill.",
+    "The ball was hit and it flew away.",
+    "Saying thank you is polite.",
+    "The man I told you was right.",
+    "The gift I gave you is blue.",
+])
+def test_correct_sentences_are_left_alone(text):
+    assert check_grammar(text) == (text, [])
+
+
+@pytest.mark.parametrize("word", ["payed", "costed", "flied", "waked", "wakeed"])
+def test_valid_or_junk_forms_are_not_rules(word):
+    assert word not in IRREGULAR_PAST
+    assert check_grammar(f"They {word} it.")[1] == []
+
+
+def test_router_answers_locally_only_for_confident_short_messages():
+    router = CommandRouter(grammar_check_enabled=True, conversation_predicate=lambda sender: True)
+
+    async def scenario():
+        return (
+            await router.route("+5511", "He have a dog."),
+            await router.route("+5511", "Could he have gone?"),
+        )
+
+    corrected, untouched = asyncio.run(scenario())
+    assert "He has a dog." in corrected
+    assert untouched is None
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from app.utils.lazy import LazyObject
+
+
+class Service:
+    def __init__(self):
+        self.name = "servico"
+
+    def __call__(self, value):
+        return value * 2
+
+
+def test_object_is_built_once_on_first_use():
+    built = []
+
+    def factory():
+        built.append(1)
+        return Service()
+
+    lazy = LazyObject(factory, "Service")
+    assert not lazy.loaded and built == []
+    assert lazy.name == "servico" and lazy(21) == 42
+    assert lazy.get() is lazy.get()
+    assert lazy.loaded and built == [1]
+
+
+def test_concurrent_first_use_builds_a_single_instance():
+    built = []
+    start = threading.Barrier(8)
+
+    def factory():
+        built.append(1)
+        return Service()
+
+    lazy = LazyObject(factory)
+    instances = []
+
+    def use():
+        start.wait()
+        instances.append(lazy.get())
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert built == [1] and all(instance is instances[0] for instance in instances)
+
+
+def test_construction_errors_propagate_and_are_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("OPENAI_API_KEY ausente")
+        return Service()
+
+    lazy = LazyObject(factory)
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        lazy.name
+    assert not lazy.loaded
+    assert lazy.name == "servico" and len(attempts) == 2
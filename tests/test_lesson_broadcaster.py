@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.services.lesson_broadcaster import LessonBroadcaster
+
+
+class RecordingSender:
+    def __init__(self, stop_after=None):
+        self.sent = []
+        self.stop_after = stop_after
+        self.stopped = None
+
+    async def send(self, to, body):
+        if self.stop_after is not None and len(self.sent) >= self.stop_after:
+            # Simula a queda do processo no meio do envio
+            self.stopped.set()
+            await asyncio.Event().wait()
+        self.sent.append(to)
+
+
+async def render(level):
+    return f"Lição {level}"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "broadcast.db"), size=4)
+    pool.execute_query("CREATE TABLE users (id INTEGER PRIMARY KEY, phone_number TEXT, level TEXT)")
+    pool.execute_query("CREATE TABLE interactions (id INTEGER PRIMARY KEY, user_id INTEGER, created_at TEXT)")
+    pool.executemany(
+        "INSERT INTO users (id, phone_number, level) VALUES (?, ?, ?)",
+        [(i, f"+55{i}", "A1" if i % 2 else "B1") for i in range(1, 21)] + [(21, "+5521", None)]
+    )
+    yield pool
+    pool.close()
+
+
+def make_broadcaster(pool, sender, **kwargs):
+    broadcaster = LessonBroadcaster(pool, sender, render, concurrency=3, batch_size=4, rate=10000, **kwargs)
+    broadcaster.ensure_schema()
+    return broadcaster
+
+
+def test_resume_after_crash_does_not_resend(pool):
+    first = RecordingSender(stop_after=7)
+
+    async def crash():
+        first.stopped = asyncio.Event()
+        broadcaster = make_broadcaster(pool, first)
+        # Numa queda real nenhum checkpoint posterior aos envios chega ao banco
+        broadcaster._save_checkpoint = lambda *args: None
+        task = asyncio.create_task(broadcaster.run("run-1"))
+        await first.stopped.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(crash())
+    assert pool.fetch_one("SELECT last_user_id FROM broadcast_runs WHERE run_id = 'run-1'") == {"last_user_id": 0}
+
+    second = RecordingSender()
+    stats = asyncio.run(make_broadcaster(pool, second).run("run-1"))
+
+    received = first.sent + second.sent
+    assert sorted(received) == sorted(f"whatsapp:+55{i}" for i in range(1, 21))
+    assert len(first.sent) == 7 and len(second.sent) == 13
+    assert stats["sent"] == 20 and stats["status"] == "done"
+    # Registros individuais só existem além do checkpoint
+    assert pool.fetch_one("SELECT COUNT(*) AS n FROM broadcast_deliveries") == {"n": 0}
+
+
+def test_finished_run_is_not_sent_again(pool):
+    sender = RecordingSender()
+    asyncio.run(make_broadcaster(pool, sender).run("run-1"))
+    state = asyncio.run(make_broadcaster(pool, sender).run("run-1"))
+    assert len(sender.sent) == 20 and state["status"] == "done" and state["sent"] == 20
+
+
+def test_active_filter_skips_students_without_recent_interactions(pool):
+    pool.executemany(
+        "INSERT INTO interactions (user_id, created_at) VALUES (?, ?)",
+        [(2, "2026-10-10 08:00:00"), (5, "2026-10-16 21:00:00"), (7, "2026-01-01 10:00:00"),
+         (21, "2026-10-16 09:00:00")]
+    )
+    sender = RecordingSender()
+    stats = asyncio.run(make_broadcaster(pool, sender, active_since="2026-10-01 00:00:00").run("run-1"))
+    assert sorted(sender.sent) == ["whatsapp:+552", "whatsapp:+555"]
+    assert stats["sent"] == 2
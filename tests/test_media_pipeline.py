@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.services.media_pipeline import MediaPipeline
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "alex.db"), size=2)
+    yield pool
+    pool.close()
+
+
+def audio_file(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"audio")
+    return str(path)
+
+
+def test_concurrent_downloads_share_one_transcription_and_cache_it(tmp_path, pool):
+    calls = []
+
+    async def transcribe(path):
+        calls.append(path)
+        await asyncio.sleep(0.02)
+        return "hello"
+
+    async def scenario():
+        pipeline = MediaPipeline(pool, transcribe, str(tmp_path))
+        pipeline.ensure_schema()
+        first = asyncio.create_task(pipeline._transcript_for(audio_file(tmp_path, "a.ogg"), "h1", "audio/ogg", 5))
+        await asyncio.sleep(0)
+        second = await pipeline._transcript_for(audio_file(tmp_path, "b.ogg"), "h1", "audio/ogg", 5)
+        third = await pipeline._transcript_for(audio_file(tmp_path, "c.ogg"), "h1", "audio/ogg", 5)
+        return await first, second, third, pipeline.stats()
+
+    first, second, third, stats = asyncio.run(scenario())
+    assert (first, second, third) == ("hello", "hello", "hello")
+    assert len(calls) == 1
+    assert stats["coalesced"] == 1 and stats["cache_hits"] == 1
+
+
+def test_waiter_takes_over_when_the_leader_is_cancelled(tmp_path, pool):
+    calls = []
+
+    async def transcribe(path):
+        calls.append(path)
+        await asyncio.sleep(0.05)
+        return f"from {path[-5:]}"
+
+    async def scenario():
+        pipeline = MediaPipeline(pool, transcribe, str(tmp_path))
+        pipeline.ensure_schema()
+        leader = asyncio.create_task(pipeline._transcript_for(audio_file(tmp_path, "a.ogg"), "h1", "audio/ogg", 5))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(pipeline._transcript_for(audio_file(tmp_path, "b.ogg"), "h1", "audio/ogg", 5))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    # Antes o CancelledError do líder chegava a quem só aguardava a mesma transcrição
+    assert asyncio.run(scenario()) == "from b.ogg"
+    assert len(calls) == 2
+
+
+def test_failed_transcription_reaches_waiters_and_is_not_cached(tmp_path, pool):
+    async def transcribe(path):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("api down")
+
+    async def scenario():
+        pipeline = MediaPipeline(pool, transcribe, str(tmp_path))
+        pipeline.ensure_schema()
+        tasks = [
+            asyncio.create_task(pipeline._transcript_for(audio_file(tmp_path, f"{n}.ogg"), "h1", "audio/ogg", 5))
+            for n in range(2)
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True), pipeline
+
+    results, pipeline = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert pool.fetch_one("SELECT COUNT(*) AS n FROM media_transcripts")["n"] == 0
+    assert pipeline.stats()["in_flight"] == 0
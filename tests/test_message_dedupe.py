@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.message_dedupe import MessageDeduplicator, STATUS_DONE
+from app.services.dispatcher import SenderDispatcher
+from app.services.message_queue import MessageQueue
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "dedupe.db"), size=4)
+    yield pool
+    pool.close()
+
+
+def make_dedupe(pool, **kwargs):
+    dedupe = MessageDeduplicator(pool, poll_interval=0.01, **kwargs)
+    dedupe.ensure_schema()
+    return dedupe
+
+
+def status_of(pool, message_sid):
+    row = pool.fetch_one("SELECT status FROM processed_messages WHERE message_sid = ?", (message_sid,))
+    return row["status"] if row else None
+
+
+def test_concurrent_retries_run_compute_once(pool):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "reply"
+
+    async def scenario():
+        dedupe = make_dedupe(pool)
+        replies = await asyncio.gather(*(dedupe.process("SM1", compute) for _ in range(5)))
+        # Nova instância (outro worker): resposta gravada no SQLite
+        stored = await make_dedupe(pool).process("SM1", compute)
+        return replies, stored
+
+    replies, stored = asyncio.run(scenario())
+    assert replies == ["reply"] * 5 and stored == "reply"
+    assert calls == [1]
+
+
+def test_failed_compute_releases_the_message(pool):
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("openai")
+        return "reply"
+
+    async def scenario():
+        dedupe = make_dedupe(pool)
+        with pytest.raises(RuntimeError):
+            await dedupe.process("SM1", compute)
+        return await dedupe.process("SM1", compute)
+
+    assert asyncio.run(scenario()) == "reply"
+    assert len(attempts) == 2
+
+
+def test_waiters_take_over_when_the_leader_is_cancelled(pool):
+    async def scenario():
+        dedupe = make_dedupe(pool)
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return "reply"
+
+        leader = asyncio.create_task(dedupe.process("SM1", slow))
+        await started.wait()
+        waiter = asyncio.create_task(dedupe.process("SM1", fast))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == "reply"
+
+
+def test_claimed_message_is_completed_by_the_queue_worker(pool):
+    handled = []
+
+    class Sender:
+        async def send(self, to, body):
+            pass
+
+    async def handler(sender, body, media_url):
+        handled.append(body)
+        return "reply"
+
+    async def scenario():
+        dedupe = make_dedupe(pool)
+        queue = MessageQueue(SenderDispatcher(handler), Sender(), workers=1, dedupe=dedupe)
+        await queue.start()
+        assert await dedupe.claim("SM1")
+        queue.enqueue("+5511", "hello", None, "SM1")
+        await queue.stop(timeout=5)
+        # Repetição da Twilio depois da conclusão (em outro worker): apenas confirmar
+        return await make_dedupe(pool, processing_timeout=0).claim("SM1")
+
+    assert asyncio.run(scenario()) is False
+    assert status_of(pool, "SM1") == STATUS_DONE
+    assert handled == ["hello"]
+
+
+def test_released_claim_is_processed_inline(pool):
+    async def scenario():
+        dedupe = make_dedupe(pool)
+        assert await dedupe.claim("SM1")
+        # Fila cheia: o webhook libera a mensagem e processa inline
+        await dedupe.release("SM1")
+
+        async def compute():
+            return "reply"
+
+        return await dedupe.process("SM1", compute)
+
+    assert asyncio.run(scenario()) == "reply"
+    assert status_of(pool, "SM1") == STATUS_DONE
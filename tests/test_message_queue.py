@@ -0,0 +1,145 @@
+import asyncio
+
+from app.services.dispatcher import SenderDispatcher
+from app.services.message_queue import MessageQueue
+
+
+class RecordingSender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, to, body):
+        self.sent.append((to, body))
+
+
+class RecordingDedupe:
+    def __init__(self):
+        self.completed = {}
+
+    async def complete(self, message_sid, reply=None):
+        self.completed[message_sid] = reply
+
+
+async def wait_for(predicate, timeout=2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condição não atingida"
+        await asyncio.sleep(0.005)
+
+
+def test_slow_sender_does_not_stall_other_senders():
+    sender = RecordingSender()
+    release = None
+
+    async def handler(to, body, media_url):
+        if to == "+slow":
+            await release.wait()
+        return f"re: {body}"
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        dispatcher = SenderDispatcher(handler)
+        # Um único worker: antes ele ficava preso esperando a resposta do remetente lento
+        queue = MessageQueue(dispatcher, sender, workers=1)
+        await queue.start()
+        queue.enqueue("+slow", "1")
+        queue.enqueue("+slow", "2")
+        for i in range(5):
+            queue.enqueue(f"+fast{i}", "oi")
+        await wait_for(lambda: len(sender.sent) == 5)
+        delivered_while_blocked = list(sender.sent)
+        release.set()
+        await queue.stop(timeout=5)
+        await dispatcher.stop()
+        return delivered_while_blocked
+
+    delivered_while_blocked = asyncio.run(scenario())
+    assert sorted(to for to, _ in delivered_while_blocked) == [f"+fast{i}" for i in range(5)]
+    # O remetente lento recebe as respostas na ordem das mensagens
+    assert [body for to, body in sender.sent if to == "+slow"] == ["re: 1", "re: 2"]
+
+
+def test_replies_of_each_sender_keep_message_order():
+    sender = RecordingSender()
+
+    async def handler(to, body, media_url):
+        # Mensagens anteriores demoram mais: sem o ator por remetente a ordem se inverteria
+        await asyncio.sleep(0.005 * (5 - int(body)))
+        return body
+
+    async def scenario():
+        dispatcher = SenderDispatcher(handler)
+        queue = MessageQueue(dispatcher, sender, workers=4)
+        await queue.start()
+        for i in range(5):
+            for to in ("+5511", "+5522"):
+                queue.enqueue(to, str(i))
+        await queue.stop(timeout=5)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    for to in ("+5511", "+5522"):
+        assert [body for recipient, body in sender.sent if recipient == to] == ["0", "1", "2", "3", "4"]
+
+
+def test_in_flight_limit_backs_up_the_queue():
+    sender = RecordingSender()
+    release = None
+
+    async def handler(to, body, media_url):
+        await release.wait()
+        return "ok"
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        dispatcher = SenderDispatcher(handler)
+        queue = MessageQueue(dispatcher, sender, max_size=1, workers=1, max_in_flight=2)
+        await queue.start()
+        accepted = []
+        for i in range(5):
+            accepted.append(queue.enqueue(f"+55{i}", "oi"))
+            await asyncio.sleep(0.01)
+        release.set()
+        await queue.stop(timeout=5)
+        await dispatcher.stop()
+        return accepted
+
+    # Dois repassados aguardando resposta, um com o worker, um na fila e o quinto recusado
+    # (o webhook processa inline)
+    assert asyncio.run(scenario()) == [True, True, True, True, False]
+    assert len(sender.sent) == 4
+
+
+def test_failures_and_full_mailboxes_still_complete_the_message():
+    sender = RecordingSender()
+    dedupe = RecordingDedupe()
+    release = None
+
+    async def handler(to, body, media_url):
+        if body == "erro":
+            raise RuntimeError("falhou")
+        await release.wait()
+        return body
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        dispatcher = SenderDispatcher(handler, mailbox_size=1)
+        queue = MessageQueue(dispatcher, sender, workers=1, dedupe=dedupe)
+        await queue.start()
+        queue.enqueue("+5522", "erro", message_sid="SM0")
+        queue.enqueue("+5511", "1", message_sid="SM1")
+        await wait_for(lambda: "SM0" in dedupe.completed and dispatcher.pending == 1)
+        # SM2 ocupa a caixa do remetente; SM3 é recusada pelo despachante
+        queue.enqueue("+5511", "2", message_sid="SM2")
+        queue.enqueue("+5511", "3", message_sid="SM3")
+        await wait_for(lambda: "SM3" in dedupe.completed)
+        release.set()
+        await queue.stop(timeout=5)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert dedupe.completed == {"SM0": None, "SM1": "1", "SM2": "2", "SM3": None}
+    assert sender.sent == [("+5511", "1"), ("+5511", "2")]
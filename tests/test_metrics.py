@@ -0,0 +1,44 @@
+import os
+import time
+
+from app.utils.metrics import MetricsRegistry, MultiProcessMetrics
+
+
+def worker_registry(messages, latency, depth):
+    registry = MetricsRegistry()
+    registry.counter("alex_messages_total", "Mensagens", ("path",)).inc(messages, path="local")
+    registry.histogram("alex_message_seconds", "Duração", ("path",), buckets=(0.1, 1)).observe(latency, path="local")
+    registry.gauge("alex_queue_depth", "Fila").set(depth)
+    return registry
+
+
+def test_metrics_from_all_workers_are_merged(tmp_path):
+    first = MultiProcessMetrics(str(tmp_path), worker_registry(3, 0.05, 7), pid=101)
+    second = MultiProcessMetrics(str(tmp_path), worker_registry(4, 0.5, 2), pid=202)
+    second.write()
+
+    text = first.render()
+    assert 'alex_messages_total{path="local"} 7' in text
+    assert 'alex_message_seconds_bucket{path="local",le="0.1"} 1' in text
+    assert 'alex_message_seconds_bucket{path="local",le="1"} 2' in text
+    assert 'alex_message_seconds_count{path="local"} 2' in text
+    assert 'alex_queue_depth{pid="101"} 7' in text
+    assert 'alex_queue_depth{pid="202"} 2' in text
+
+
+def test_stopped_workers_keep_counters_but_drop_gauges(tmp_path):
+    first = MultiProcessMetrics(str(tmp_path), worker_registry(1, 0.05, 5), pid=101, interval=1)
+    stopped = MultiProcessMetrics(str(tmp_path), worker_registry(10, 0.05, 9), pid=202, interval=1)
+    stopped.write()
+    old = time.time() - 60
+    os.utime(stopped.path, (old, old))
+
+    text = first.render()
+    assert 'alex_messages_total{path="local"} 11' in text
+    assert 'pid="202"' not in text
+
+
+def test_reset_removes_previous_snapshots(tmp_path):
+    MultiProcessMetrics(str(tmp_path), worker_registry(1, 0.05, 1), pid=101).write()
+    MultiProcessMetrics.reset(str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
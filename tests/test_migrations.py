@@ -0,0 +1,91 @@
+import sqlite3
+
+from app.database.migrations import MIGRATIONS, MigrationRunner, migrate_databases
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone_number TEXT UNIQUE, level TEXT);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT, response TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+INSERT_MISTAKE = (
+    "INSERT INTO user_mistakes (user_id, category, original, corrected, context, embedding, review_due, last_seen) "
+    "VALUES (1, 'irregular_past', ?, ?, ?, x'00', 0, 0)"
+)
+
+
+def base_schema(database_path):
+    """Esquema base mínimo no lugar do DatabaseManager"""
+    conn = sqlite3.connect(database_path)
+    conn.executescript(BASE_SCHEMA)
+    conn.close()
+
+
+def applied(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    finally:
+        conn.close()
+
+
+def test_latest_migrations_are_registered_in_order():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    names = {version: name for version, name, _ in MIGRATIONS}
+    assert (names[11], names[12], names[13]) == (
+        "drop_grammar_accuracy", "mistake_pending_reviews", "purge_mistake_false_positives"
+    )
+
+
+def test_old_database_is_upgraded_in_order_and_only_once(tmp_path):
+    path = str(tmp_path / "old.db")
+    # Banco parado na versão 10, com dados que as migrações seguintes tratam
+    assert len(MigrationRunner(path, MIGRATIONS[:10], base_schema=base_schema).migrate()) == 10
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO user_skill_accuracy (user_id, skill, correct, total) VALUES (1, 'grammar', 2, 9)")
+    conn.execute(INSERT_MISTAKE, ("goed", "went", "Yesterday I goed home"))
+    conn.execute(INSERT_MISTAKE, ("waked", "woke", "I waked up early"))
+    conn.commit()
+    conn.close()
+
+    runner = MigrationRunner(path, base_schema=base_schema)
+    assert runner.pending() == [(version, name) for version, name, _ in MIGRATIONS[10:]]
+    assert runner.migrate() == [name for _, name, _ in MIGRATIONS[10:]]
+    assert applied(path) == [version for version, _, _ in MIGRATIONS]
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM user_skill_accuracy").fetchone()[0] == 0
+        assert [row[0] for row in conn.execute("SELECT original FROM user_mistakes")] == ["goed"]
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(user_mistakes)")]
+        assert "shown_at" in columns
+    finally:
+        conn.close()
+
+    # Com o esquema em dia nada é reaplicado
+    assert runner.migrate() == [] and runner.pending() == []
+
+
+def test_migrations_are_idempotent_on_databases_without_version_table(tmp_path):
+    path = str(tmp_path / "adopted.db")
+    MigrationRunner(path, base_schema=base_schema).migrate()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE schema_version")
+    conn.commit()
+    conn.close()
+
+    # Banco anterior ao runner: as migrações rodam de novo sobre as tabelas existentes sem erro
+    assert len(MigrationRunner(path, base_schema=base_schema).migrate()) == len(MIGRATIONS)
+    assert applied(path) == [version for version, _, _ in MIGRATIONS]
+
+
+def test_migrate_databases_covers_every_shard(tmp_path):
+    main = str(tmp_path / "main.db")
+    shards = [str(tmp_path / f"shard{i}.db") for i in range(2)]
+    result = migrate_databases(main, [main] + shards, base_schema=base_schema)
+    assert set(result) == {main, *shards}
+    assert all(len(names) == len(MIGRATIONS) for names in result.values())
+    assert migrate_databases(main, [main] + shards, base_schema=base_schema) == {main: [], shards[0]: [], shards[1]: []}
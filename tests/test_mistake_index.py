@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.mistake_index import (
+    DAY, MISTAKE_SCHEMA, MistakeIndex, _UserMistakes, add_pending_reviews, format_review, prompt_context,
+    purge_false_positives, uses_phrase
+)
+from app.services.grammar_check import check_grammar
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def index(tmp_path):
+    pool = SQLitePool(str(tmp_path / "alex.db"), size=2)
+    index = MistakeIndex(pool)
+    index.ensure_schema()
+    yield index
+    pool.close()
+
+
+def row(index, mistake_id):
+    return index.pool.fetch_one(
+        "SELECT occurrences, repetitions, interval_days, review_due, shown_at FROM user_mistakes WHERE id = ?",
+        (mistake_id,)
+    )
+
+
+def show_due(index, user_id, now):
+    mistakes = index.select_for_review(user_id, "past tense", k=3, now=now)
+    index.mark_shown(user_id, [mistake["id"] for mistake in mistakes], now=now)
+    return mistakes
+
+
+def test_showing_a_review_does_not_advance_the_schedule(index):
+    mistake_id = index.record(1, "irregular_past", "goed", "went", now=NOW)
+    shown = show_due(index, 1, NOW + 2 * DAY)
+    assert [mistake["id"] for mistake in shown] == [mistake_id]
+
+    after = row(index, mistake_id)
+    assert after["repetitions"] == 0 and after["interval_days"] == 1
+    assert after["shown_at"] == NOW + 2 * DAY
+    # Não reaparece no mesmo dia, mas volta no seguinte se o aluno não responder
+    assert index.select_for_review(1, now=NOW + 2 * DAY + 60) == []
+    assert index.select_for_review(1, now=NOW + 3 * DAY + 60)[0]["id"] == mistake_id
+
+    assert index.record_message(1, "Hello, how are you?", now=NOW + 2 * DAY + 30) == []
+    assert row(index, mistake_id)["repetitions"] == 0
+
+
+def test_using_the_correct_form_answers_the_review(index):
+    mistake_id = index.record(1, "irregular_past", "goed", "went", now=NOW)
+    show_due(index, 1, NOW + 2 * DAY)
+
+    assert index.record_message(1, "Yesterday I went to school", now=NOW + 2 * DAY + 30) == [mistake_id]
+    after = row(index, mistake_id)
+    assert (after["repetitions"], after["interval_days"], after["shown_at"]) == (1, 1, None)
+
+    show_due(index, 1, NOW + 4 * DAY)
+    index.record_message(1, "We went out", now=NOW + 4 * DAY + 30)
+    assert (row(index, mistake_id)["repetitions"], row(index, mistake_id)["interval_days"]) == (2, 3)
+
+    # Sem revisão pendente, usar a forma correta não conta de novo
+    assert index.record_message(1, "They went home", now=NOW + 4 * DAY + 60) == []
+
+
+def test_repeating_a_pending_mistake_is_a_relapse(index):
+    mistake_id = index.record(1, "irregular_past", "goed", "went", now=NOW)
+    show_due(index, 1, NOW + 2 * DAY)
+
+    text = "I goed there, I mean went"
+    assert index.record_message(1, text, check_grammar(text)[1], now=NOW + 2 * DAY + 30) == []
+    after = row(index, mistake_id)
+    assert (after["occurrences"], after["repetitions"], after["shown_at"]) == (2, 0, None)
+
+
+def test_uses_phrase_matches_whole_words():
+    assert uses_phrase("She doesn't like it", "she doesn't")
+    assert not uses_phrase("wentworth", "went")
+    assert "só avança quando você acerta" in format_review([
+        {"category": "irregular_past", "original": "goed", "corrected": "went"}
+    ])
+
+
+def test_purge_removes_mistakes_the_fixed_rules_no_longer_report(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "old.db"))
+    conn.executescript(MISTAKE_SCHEMA)
+    rows = [
+        ("irregular_past", "goed", "went", "I goed home"),
+        ("irregular_past", "payed", "paid", "I payed the bill"),
+        ("subject_verb_agreement", "he have", "he has", "Does he have a car?"),
+        ("subject_verb_agreement", "she don't", "she doesn't", "she don't know"),
+        ("irregular_past", "costed", "cost", None),
+    ]
+    conn.executemany(
+        "INSERT INTO user_mistakes (user_id, category, original, corrected, context, embedding, review_due, "
+        "last_seen) VALUES (1, ?, ?, ?, ?, x'00', 0, 0)",
+        rows
+    )
+    purge_false_positives(conn)
+    add_pending_reviews(conn)
+    add_pending_reviews(conn)
+    assert [r[0] for r in conn.execute("SELECT original FROM user_mistakes ORDER BY id")] == ["goed", "she don't"]
+    assert "shown_at" in [r[1] for r in conn.execute("PRAGMA table_info(user_mistakes)")]
+    conn.close()
+
+
+def test_writes_for_one_user_do_not_wait_for_another(index):
+    index.record(2, "irregular_past", "goed", "went", now=NOW)
+    other = next(user_id for user_id in range(3, 200) if index._lock_for(user_id) is not index._lock_for(1))
+    done = threading.Event()
+
+    def record_other():
+        index.record(other, "irregular_past", "eated", "ate", now=NOW)
+        index.select_for_review(other, now=NOW + 2 * DAY)
+        done.set()
+
+    with index._lock_for(1):
+        thread = threading.Thread(target=record_other)
+        thread.start()
+        assert done.wait(2)
+    thread.join()
+
+
+def test_appending_grows_capacity_by_doubling():
+    import numpy as np
+
+    entry = _UserMistakes(np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float32), np.zeros(0))
+    capacities = set()
+    for i in range(100):
+        entry.append(i, np.full(4, i, dtype=np.float32), float(i))
+        capacities.add(len(entry._ids))
+
+    assert capacities == {8, 16, 32, 64, 128}
+    assert entry.ids.tolist() == list(range(100))
+    assert entry.matrix.shape == (100, 4) and entry.matrix[42].tolist() == [42.0] * 4
+    entry.due[entry.position(42)] = -1.0
+    assert entry.due[42] == -1.0
+
+
+def test_new_mistakes_after_load_are_searchable(index):
+    first = index.record(1, "irregular_past", "goed", "went", now=NOW)
+    index.clear()
+    ids = [first] + [
+        index.record(1, "agreement", f"they is {word}", f"they are {word}", now=NOW)
+        for word in ("happy", "tired", "late", "here", "ready", "hungry", "cold", "sad", "busy")
+    ]
+    found = [mistake_id for mistake_id, _ in index.similar(1, "irregular past goed went", k=len(ids))]
+    assert sorted(found) == sorted(ids)
+    assert found[0] == first
+
+
+def test_relevant_mistakes_feed_the_prompt_context(index):
+    index.record(1, "irregular_past", "goed", "went", now=NOW)
+    index.record(1, "agreement", "he have", "he has", now=NOW)
+
+    context = prompt_context(index.relevant(1, "Yesterday I goed to school", k=1))
+    assert "goed -> went" in context
+    assert "he have" not in context
+    assert prompt_context(index.relevant(2, "anything")) == ""
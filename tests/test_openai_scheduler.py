@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.openai_scheduler import (
+    OpenAIScheduler, PRIORITY_CONVERSATION, PRIORITY_LESSON, PRIORITY_SUMMARY,
+    RequestRejectedError, ScheduledProxy, method_priority, parse_reset
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_higher_priority_waiters_are_served_first():
+    order = []
+
+    async def scenario():
+        scheduler = OpenAIScheduler(initial_concurrency=1, max_concurrency=1)
+        release = asyncio.Event()
+
+        async def blocker():
+            await release.wait()
+
+        async def call(name):
+            order.append(name)
+
+        first = asyncio.create_task(scheduler.submit(blocker, PRIORITY_CONVERSATION))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(scheduler.submit(lambda: call("summary"), PRIORITY_SUMMARY)),
+            asyncio.create_task(scheduler.submit(lambda: call("lesson"), PRIORITY_LESSON)),
+            asyncio.create_task(scheduler.submit(lambda: call("conversation"), PRIORITY_CONVERSATION)),
+        ]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queued"] == 3
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(scenario())
+    assert order == ["conversation", "lesson", "summary"]
+
+
+def test_concurrency_grows_with_fast_responses_and_halves_on_rate_limit():
+    async def scenario():
+        scheduler = OpenAIScheduler(initial_concurrency=4, max_concurrency=8, target_latency=5)
+
+        async def fast():
+            return "ok"
+
+        for _ in range(20):
+            await scheduler.submit(fast)
+        grown = scheduler.limit
+        with pytest.raises(RateLimitError):
+            async with scheduler.slot():
+                raise RateLimitError()
+        return grown, scheduler.limit, scheduler.rate_limited
+
+    grown, after_429, rate_limited = asyncio.run(scenario())
+    assert 4 < grown <= 8
+    assert after_429 == pytest.approx(grown / 2)
+    assert rate_limited == 1
+
+
+def test_slow_responses_shrink_concurrency_once_per_window():
+    async def scenario():
+        scheduler = OpenAIScheduler(initial_concurrency=10, target_latency=0.01)
+        for _ in range(3):
+            async with scheduler.slot() as ticket:
+                ticket.latency = 1.0
+        return scheduler.limit
+
+    assert asyncio.run(scenario()) == pytest.approx(9.0)
+
+
+def test_requests_past_their_deadline_are_rejected():
+    async def scenario():
+        scheduler = OpenAIScheduler(initial_concurrency=1, max_concurrency=1)
+        release = asyncio.Event()
+        blocker = asyncio.create_task(scheduler.submit(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(RequestRejectedError) as excinfo:
+            await scheduler.submit(asyncio.sleep, deadline=time.monotonic() + 0.02)
+        release.set()
+        await blocker
+        return excinfo.value.reason, scheduler.stats()
+
+    reason, stats = asyncio.run(scenario())
+    assert reason == "deadline"
+    assert stats["rejected"] == 1 and stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        scheduler = OpenAIScheduler(initial_concurrency=1, max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+        blocker = asyncio.create_task(scheduler.submit(release.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(scheduler.submit(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(RequestRejectedError) as excinfo:
+            await scheduler.submit(release.wait)
+        release.set()
+        await asyncio.gather(blocker, queued)
+        return excinfo.value.reason
+
+    assert asyncio.run(scenario()) == "queue_full"
+
+
+def test_transient_errors_are_retried():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    async def scenario():
+        scheduler = OpenAIScheduler(base_backoff=0.001)
+        return await scheduler.submit(flaky), scheduler.retried
+
+    assert asyncio.run(scenario()) == ("ok", 2)
+
+
+def test_non_transient_errors_are_not_retried():
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(OpenAIScheduler().submit(broken))
+    assert len(attempts) == 1
+
+
+def test_proxy_schedules_async_methods_by_name():
+    class Service:
+        async def generate_lesson(self, level):
+            return f"lesson {level}"
+
+        def sync_helper(self):
+            return "sync"
+
+    async def scenario():
+        scheduler = OpenAIScheduler()
+        proxy = ScheduledProxy(Service(), scheduler)
+        return await proxy.generate_lesson("A1"), proxy.sync_helper(), scheduler.completed
+
+    assert asyncio.run(scenario()) == ("lesson A1", "sync", 1)
+    assert method_priority("generate_lesson") == PRIORITY_LESSON
+    assert method_priority("summarize_turns") == PRIORITY_SUMMARY
+    assert method_priority("generate_response") == PRIORITY_CONVERSATION
+
+
+def test_parse_reset_durations():
+    assert parse_reset("6m0s") == 360
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset(None) == 0.0
@@ -0,0 +1,178 @@
+import asyncio
+import json
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.services.openai_usage import instrument_client
+from app.utils.metrics import OPENAI_CLIENT_RETRIES, OPENAI_TOKENS, record_openai_usage
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-3.5-turbo",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Hi!"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17}
+}
+
+
+def tokens(prompt_type, kind):
+    return OPENAI_TOKENS._values.get((prompt_type, kind), 0)
+
+
+def retries(prompt_type, reason):
+    return OPENAI_CLIENT_RETRIES._values.get((prompt_type, reason), 0)
+
+
+def flaky_transport(failures):
+    """Responde 429 nas primeiras ``failures`` chamadas e depois a completion"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) <= failures:
+            return httpx.Response(429, json={"error": {"message": "slow down"}}, headers={"retry-after-ms": "1"})
+        return httpx.Response(200, json=COMPLETION)
+
+    return handler, calls
+
+
+def test_async_client_records_tokens_and_sdk_retries():
+    handler, calls = flaky_transport(failures=1)
+    client = instrument_client(
+        AsyncOpenAI(api_key="test", base_url="http://openai.test/v1"), "test_async",
+        transport=httpx.MockTransport(handler)
+    )
+
+    async def scenario():
+        return await client.chat.completions.create(
+            model="gpt-3.5-turbo", messages=[{"role": "user", "content": "Hello"}]
+        )
+
+    response = asyncio.run(scenario())
+    assert response.choices[0].message.content == "Hi!"
+    assert len(calls) == 2
+    assert retries("test_async", "rate_limit") == 1
+    assert tokens("test_async", "prompt") == 12
+    assert tokens("test_async", "completion") == 5
+
+
+def test_sync_client_records_tokens():
+    handler, _ = flaky_transport(failures=0)
+    client = instrument_client(
+        OpenAI(api_key="test", base_url="http://openai.test/v1"), "test_sync",
+        transport=httpx.MockTransport(handler)
+    )
+    client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "Hello"}])
+    assert tokens("test_sync", "prompt") == 12
+    assert tokens("test_sync", "completion") == 5
+    assert retries("test_sync", "rate_limit") == 0
+
+
+def test_streamed_responses_are_not_read_by_the_hook():
+    events = [
+        {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m",
+         "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+        for word in ("Hi", " there")
+    ]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    client = instrument_client(
+        AsyncOpenAI(api_key="test", base_url="http://openai.test/v1"), "test_stream",
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+        )
+    )
+
+    async def scenario():
+        stream = await client.chat.completions.create(
+            model="gpt-3.5-turbo", messages=[{"role": "user", "content": "Hello"}], stream=True
+        )
+        return "".join([chunk.choices[0].delta.content async for chunk in stream])
+
+    assert asyncio.run(scenario()) == "Hi there"
+    assert tokens("test_stream", "prompt") == 0
+
+
+def test_non_openai_clients_are_left_alone():
+    client = object()
+    assert instrument_client(client, "test") is client
+
+
+def test_usage_is_read_from_json_or_sdk_objects():
+    class Usage:
+        prompt_tokens = 3
+        completion_tokens = 4
+
+    class Response:
+        usage = Usage()
+
+    record_openai_usage({"usage": {"prompt_tokens": 1, "completion_tokens": 2}}, "test_usage")
+    record_openai_usage(Response(), "test_usage")
+    record_openai_usage({"text": "sem usage"}, "test_usage")
+    assert tokens("test_usage", "prompt") == 4
+    assert tokens("test_usage", "completion") == 6
+
+
+RATE_LIMIT_HEADERS = {"x-ratelimit-remaining-tokens": "1234", "x-ratelimit-reset-tokens": "30s"}
+
+
+def completion_transport(request):
+    return httpx.Response(200, json=COMPLETION, headers=RATE_LIMIT_HEADERS)
+
+
+def test_scheduled_ai_service_calls_feed_rate_limit_headers_to_the_scheduler():
+    from app.services.openai_scheduler import OpenAIScheduler, ScheduledProxy
+
+    scheduler = OpenAIScheduler()
+
+    class AIService:
+        """Como o AIService: um cliente assíncrono e outro síncrono (chamado em thread)"""
+
+        def __init__(self):
+            self.client = instrument_client(
+                AsyncOpenAI(api_key="test", base_url="http://openai.test/v1"), "test_scheduled",
+                scheduler=scheduler, transport=httpx.MockTransport(completion_transport)
+            )
+            self.sync_client = instrument_client(
+                OpenAI(api_key="test", base_url="http://openai.test/v1"), "test_scheduled",
+                scheduler=scheduler, transport=httpx.MockTransport(completion_transport)
+            )
+
+        async def get_conversation_response(self, text):
+            return await self.client.chat.completions.create(
+                model="gpt-3.5-turbo", messages=[{"role": "user", "content": text}]
+            )
+
+        async def get_lesson(self, text):
+            return await asyncio.to_thread(
+                self.sync_client.chat.completions.create,
+                model="gpt-3.5-turbo", messages=[{"role": "user", "content": text}]
+            )
+
+    service = ScheduledProxy(AIService(), scheduler)
+
+    async def scenario():
+        await service.get_conversation_response("Hello")
+        after_async = scheduler.stats()["tokens_available"]
+        scheduler._tokens = None
+        await service.get_lesson("Hello")
+        # O hook síncrono roda numa thread e agenda a atualização no event loop
+        await asyncio.sleep(0)
+        return after_async, scheduler.stats()["tokens_available"]
+
+    assert asyncio.run(scenario()) == (1234.0, 1234.0)
+
+
+def test_transcriber_and_streaming_clients_report_headers_to_the_scheduler():
+    from app.services.media_pipeline import OpenAITranscriber
+    from app.services.openai_scheduler import OpenAIScheduler
+    from app.services.streaming import StreamingConversation
+
+    scheduler = OpenAIScheduler()
+    for service in (OpenAITranscriber("test", scheduler=scheduler), StreamingConversation("test", scheduler=scheduler)):
+        hooks = service.client._client.event_hooks["response"]
+        assert len(hooks) == 1
+        asyncio.run(hooks[0](httpx.Response(200, headers=RATE_LIMIT_HEADERS, request=httpx.Request("GET", "http://x"))))
+        assert scheduler.stats()["tokens_available"] == 1234.0
+        scheduler._tokens = None
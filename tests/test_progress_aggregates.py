@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.progress_aggregates import (
+    KIND_ASSESSMENT, KIND_CONVERSATION, KIND_LESSON, ProgressAggregates, create_progress_tables,
+    drop_grammar_accuracy, format_progress
+)
+from app.services.command_router import grade_assessment_answer
+
+INSERT = "INSERT INTO interactions (user_id, message, response) VALUES (?, ?, ?)"
+
+
+@pytest.fixture
+def aggregates(tmp_path):
+    pool = SQLitePool(str(tmp_path / "progress.db"), size=2)
+    pool.execute_query("CREATE TABLE interactions (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, response TEXT)")
+    aggregates = ProgressAggregates(pool)
+    aggregates.ensure_schema()
+    yield aggregates
+    pool.close()
+
+
+def test_interaction_and_aggregates_are_written_together(aggregates):
+    aggregates.record(1, KIND_LESSON, day="2026-01-01", level="A2", interaction_query=INSERT,
+                      interaction_params=(1, "/licao", "Lição"))
+    aggregates.record(1, day="2026-01-02", interaction_query=INSERT, interaction_params=(1, "hi", "hello"))
+
+    progress = aggregates.get(1)
+    assert progress["interactions"] == 2 and progress["lessons_completed"] == 1
+    assert progress["current_streak"] == 2 and progress["current_level"] == "A2"
+    assert aggregates.pool.fetch_one("SELECT COUNT(*) AS n FROM interactions")["n"] == 2
+    assert "Lições concluídas: 1" in format_progress(progress)
+
+
+def test_failed_aggregate_update_rolls_back_the_interaction(aggregates):
+    aggregates.pool.execute_query("DROP TABLE user_progress")
+    with pytest.raises(sqlite3.OperationalError):
+        aggregates.record(1, interaction_query=INSERT, interaction_params=(1, "hi", "hello"))
+    assert aggregates.pool.fetch_one("SELECT COUNT(*) AS n FROM interactions")["n"] == 0
+
+
+def test_grammar_accuracy_is_dropped(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "old.db"))
+    create_progress_tables(conn)
+    conn.executemany(
+        "INSERT INTO user_skill_accuracy (user_id, skill, correct, total) VALUES (?, ?, ?, ?)",
+        [(1, "grammar", 3, 10), (1, "assessment", 4, 5)]
+    )
+    drop_grammar_accuracy(conn)
+    assert conn.execute("SELECT skill FROM user_skill_accuracy").fetchall() == [("assessment",)]
+
+
+def test_progress_reply_reflects_graded_assessment_answers(aggregates):
+    questions = [
+        {"question": "Past of 'go'?", "options": ["A) went", "B) goed"], "correct_answer": "A",
+         "question_type": "multiple_choice"},
+        {"question": "She ___ every day.", "options": ["A) go", "B) goes"], "correct_answer": "B",
+         "question_type": "multiple_choice"}
+    ]
+    # Mesmo caminho do assessment_handler: cada resposta corrigida vira evento de habilidade
+    for index, answer in enumerate(["B", "B"]):
+        grade = grade_assessment_answer({"id": 7, "questions": questions, "current_question": index}, answer,
+                                        final=True)
+        kind = KIND_ASSESSMENT if grade.completed else KIND_CONVERSATION
+        aggregates.record(1, kind, day="2026-01-01", level="A2", skills=grade.skills(),
+                          interaction_query=INSERT, interaction_params=(1, answer, "ok"))
+
+    progress = aggregates.get(1)
+    assert progress["assessments_completed"] == 1 and progress["interactions"] == 2
+    reply = format_progress(progress)
+    assert "Avaliações concluídas: 1" in reply
+    assert "• Avaliação: 50% (1/2)" in reply
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.question_bank import CEFR_LEVELS, QuestionBank, format_item
+from app.database.sharding import routed
+from app.services.assessment_bank import QuestionBankProxy, is_assessment_method
+from app.services.question_bank_builder import QuestionBankBuilder
+
+
+@pytest.fixture
+def bank(tmp_path):
+    pool = SQLitePool(str(tmp_path / "alex.db"), size=2)
+    bank = QuestionBank(pool)
+    bank.ensure_schema()
+    yield bank
+    pool.close()
+
+
+def question(level, number):
+    return {
+        "question": f"{level} question {number}",
+        "options": ["A) one", "B) two", "C) three", "D) four"],
+        "correct_answer": "B",
+        "question_type": "multiple_choice"
+    }
+
+
+def fill_assessment(bank, per_level=2, levels=CEFR_LEVELS):
+    bank.add_items([
+        {"level": level, "kind": "assessment_question", "topic": "grammar", "content": question(level, number)}
+        for number in range(per_level)
+        for level in levels
+    ])
+
+
+def test_cursor_serves_each_item_once_per_user(bank):
+    bank.add_items([
+        {"level": "A1", "kind": "lesson", "topic": topic, "content": {"title": topic, "explanation": "..."}}
+        for topic in ("food", "travel")
+    ])
+
+    first = bank.next_item("+5511", "A1", "lesson")
+    second = bank.next_item("+5511", "A1", "lesson")
+    assert [first["topic"], second["topic"]] == ["food", "travel"]
+    assert bank.next_item("+5511", "A1", "lesson") is None
+    # Outro aluno tem o próprio cursor; outro nível não tem itens
+    assert bank.next_item("+5522", "A1", "lesson")["topic"] == "food"
+    assert bank.next_item("+5511", "B1", "lesson") is None
+    assert format_item(first).startswith("📚 *food*")
+
+
+def test_assessment_questions_spread_over_levels_and_do_not_repeat(bank):
+    fill_assessment(bank)
+
+    first = bank.assessment_questions("+5511", 5)
+    second = bank.assessment_questions("+5511", 5)
+    assert [q["level"] for q in first] == ["A1", "A2", "B1", "B2", "C1"]
+    assert first[0] == dict(question("A1", 0), level="A1")
+    assert [q["question"] for q in second] == [f"{level} question 1" for level in CEFR_LEVELS[:5]]
+    assert bank.assessment_questions("+5511", 5) is None
+
+
+def test_missing_level_does_not_consume_the_other_cursors(bank):
+    fill_assessment(bank, per_level=1, levels=("A1", "A2"))
+
+    assert bank.assessment_questions("+5511", 3, levels=("A1", "A2", "B1")) is None
+    assert [q["level"] for q in bank.assessment_questions("+5511", 2, levels=("A1", "A2"))] == ["A1", "A2"]
+
+
+class FakeAI:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_assessment_questions(self, *args, **kwargs):
+        self.calls += 1
+        return [question("AI", 0)]
+
+    async def generate_lesson(self, level, topic):
+        return f"{level} {topic}"
+
+
+def test_proxy_serves_assessment_from_the_bank_for_the_routed_sender(bank):
+    fill_assessment(bank, per_level=1)
+    ai = FakeAI()
+    proxy = QuestionBankProxy(ai, bank, count=6)
+
+    async def scenario():
+        with routed("+5511"):
+            served = await proxy.generate_assessment_questions()
+            exhausted = await proxy.generate_assessment_questions()
+        anonymous = await proxy.generate_assessment_questions()
+        return served, exhausted, anonymous, await proxy.generate_lesson("A1", "food")
+
+    served, exhausted, anonymous, lesson = asyncio.run(scenario())
+    assert [q["level"] for q in served] == list(CEFR_LEVELS)
+    assert exhausted == anonymous == [question("AI", 0)]
+    assert ai.calls == 2 and (proxy.served, proxy.fallbacks) == (1, 2)
+    assert lesson == "A1 food"
+
+
+def test_assessment_methods_are_detected_by_name():
+    assert is_assessment_method("generate_assessment_questions")
+    assert is_assessment_method("gerar_perguntas_avaliacao")
+    assert not is_assessment_method("generate_lesson")
+    assert not is_assessment_method("evaluate_assessment")
+
+
+def test_builder_fills_the_bank_and_counts_failures(bank):
+    async def generate(level, kind, topic):
+        if topic == "broken":
+            raise ValueError("JSON inválido")
+        return question(level, topic)
+
+    builder = QuestionBankBuilder(bank, generate, concurrency=3, batch_size=4)
+    generated = asyncio.run(builder.build(
+        levels=["A1", "B1"], kinds=["assessment_question"], topics=["food", "travel", "broken"], per_topic=2
+    ))
+
+    assert generated == builder.generated == 8
+    assert builder.failed == 4
+    assert bank.count(level="A1", kind="assessment_question") == 4
+    assert bank.count() == 8
+    assert bank.assessment_questions("+5511", 2, levels=("A1", "B1"))[1]["level"] == "B1"
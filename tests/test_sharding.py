@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.sharding import (
+    ID_STRIDE, ShardRouter, ShardRoutingError, next_id_generation, per_shard, reserve_id_ranges,
+    routed, shard_for, shard_paths
+)
+from app.services.lesson_broadcaster import LessonBroadcaster
+from split_database import GLOBAL_TABLES, split
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone_number TEXT UNIQUE, level TEXT);
+CREATE TABLE interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT, created_at TIMESTAMP
+);
+"""
+
+
+class Shard:
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def get_user(self, phone_number):
+        self.calls.append(("get_user", phone_number))
+        return self.name
+
+    def get_session(self, user_id):
+        self.calls.append(("get_session", user_id))
+        return self.name
+
+    def fetch_one(self, query, params=()):
+        return self.name
+
+    def create_tables(self):
+        return self.name
+
+
+def test_shard_for_is_stable_and_ignores_formatting():
+    assert shard_for("whatsapp:+55 11 99999-0000", 8) == shard_for("5511999990000", 8)
+    assert shard_for("+5511999990000", 1) == 0
+    indexes = {shard_for(f"+55119999{n:05d}", 4) for n in range(200)}
+    assert indexes == {0, 1, 2, 3}
+
+
+def test_shard_paths_include_the_shard_count():
+    assert shard_paths("db/alex.db", 1) == ["db/alex.db"]
+    assert shard_paths("db/alex.db", 2) == ["db/alex.shard-00-of-02.db", "db/alex.shard-01-of-02.db"]
+
+
+def test_router_picks_shard_by_phone_kwargs_and_routed_context():
+    shards = [Shard(index) for index in range(4)]
+    router = ShardRouter(shards)
+    phone = "+5511999990000"
+    expected = shard_for(phone, 4)
+
+    assert router.get_user(phone) == expected
+    assert router.get_user(phone_number=phone) == expected
+    with routed(phone):
+        assert router.get_session(42) == expected
+        assert router.fetch_one("SELECT 1") == expected
+    with pytest.raises(ShardRoutingError):
+        router.get_session(42)
+    with pytest.raises(ShardRoutingError):
+        router.fetch_one("SELECT 1")
+    assert router.create_tables() == [0, 1, 2, 3]
+
+
+def test_per_shard_skips_the_router_for_a_single_shard():
+    shard = Shard(0)
+    assert per_shard([shard]) is shard
+    assert isinstance(per_shard([Shard(0), Shard(1)]), ShardRouter)
+
+
+def test_reserve_id_ranges_starts_above_the_generation():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    reserve_id_ranges(conn, 2, generation=3)
+    conn.execute("INSERT INTO users (phone_number) VALUES ('+55')")
+    assert conn.execute("SELECT id FROM users").fetchone()[0] == 5 * ID_STRIDE + 1
+    assert next_id_generation([conn]) == 6
+    assert next_id_generation([sqlite3.connect(":memory:")]) == 0
+
+
+def create_shards(database_path, shard_count, users_per_shard):
+    """Shards como a aplicação os cria: faixa de ids própria e usuários roteados pelo hash"""
+    phones = []
+    paths = shard_paths(database_path, shard_count)
+    for index, path in enumerate(paths):
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        reserve_id_ranges(conn, index)
+        conn.commit()
+        conn.close()
+    number = 0
+    while len(phones) < shard_count * users_per_shard:
+        phone = f"+5511{number:08d}"
+        number += 1
+        index = shard_for(phone, shard_count)
+        conn = sqlite3.connect(paths[index])
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] < users_per_shard:
+            user_id = conn.execute("INSERT INTO users (phone_number) VALUES (?)", (phone,)).lastrowid
+            conn.execute("INSERT INTO interactions (user_id, message) VALUES (?, 'hi')", (user_id,))
+            conn.commit()
+            phones.append(phone)
+        conn.close()
+    return phones
+
+
+def all_ids(paths, table):
+    ids = []
+    for path in paths:
+        conn = sqlite3.connect(path)
+        ids.extend(row[0] for row in conn.execute(f"SELECT id FROM {table}"))
+        conn.close()
+    return ids
+
+
+@pytest.mark.parametrize("from_shards, to_shards", [(1, 4), (4, 8), (4, 2)])
+def test_resharding_keeps_new_ids_unique(tmp_path, monkeypatch, capsys, from_shards, to_shards):
+    database_path = str(tmp_path / "alex.db")
+    monkeypatch.setenv("DATABASE_PATH", database_path)
+    phones = create_shards(database_path, from_shards, users_per_shard=5)
+
+    split(argparse.Namespace(shards=to_shards, from_shards=from_shards, batch_size=3))
+
+    paths = shard_paths(database_path, to_shards)
+    copied = all_ids(paths, "users")
+    assert len(copied) == len(phones) == len(set(copied))
+
+    # Cada destino gera ids novos: nenhum repete os copiados nem os dos outros destinos
+    for index, path in enumerate(paths):
+        conn = sqlite3.connect(path)
+        for n in range(3):
+            conn.execute("INSERT INTO users (phone_number) VALUES (?)", (f"+new-{index}-{n}",))
+            conn.execute("INSERT INTO interactions (user_id, message) VALUES (1, 'x')")
+        conn.commit()
+        conn.close()
+    for table in ("users", "interactions"):
+        ids = all_ids(paths, table)
+        assert len(ids) == len(set(ids))
+
+
+def test_broadcast_lessons_are_global_and_runs_are_per_shard():
+    assert "broadcast_lessons" in GLOBAL_TABLES
+    assert "broadcast_runs" not in GLOBAL_TABLES
+
+
+class Sender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, to, body):
+        self.sent.append((to, body))
+
+
+def test_resumed_broadcast_reuses_lessons_rendered_by_other_shards(tmp_path):
+    main = SQLitePool(str(tmp_path / "alex.db"), size=2)
+    shards = [SQLitePool(str(tmp_path / f"shard-{index}.db"), size=2) for index in range(2)]
+    for index, pool in enumerate(shards):
+        with pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT INTO users (phone_number, level) VALUES (?, 'B1')", (f"+55{index}",))
+    renders = []
+
+    async def render(level):
+        renders.append(level)
+        return f"lesson {len(renders)}"
+
+    async def scenario():
+        sender = Sender()
+        for pool in shards:
+            broadcaster = LessonBroadcaster(pool, sender, render, lesson_pool=main, rate=1000)
+            broadcaster.ensure_schema()
+            await broadcaster.run("run-1")
+        return sender.sent
+
+    try:
+        sent = asyncio.run(scenario())
+        assert renders == ["B1"]
+        assert [body for _, body in sent] == ["lesson 1", "lesson 1"]
+        assert main.fetch_all("SELECT level FROM broadcast_lessons")[0]["level"] == "B1"
+        for pool in shards:
+            assert pool.fetch_one("SELECT status FROM broadcast_runs")["status"] == "done"
+            assert pool.fetch_all("SELECT * FROM broadcast_lessons") == []
+    finally:
+        main.close()
+        for pool in shards:
+            pool.close()
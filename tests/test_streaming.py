@@ -0,0 +1,242 @@
+import asyncio
+
+import pytest
+
+from app.services.dispatcher import SenderDispatcher
+from app.services.message_queue import MessageQueue
+from app.services.streaming import (
+    WHATSAPP_MAX_CHARS, MessageChunker, StreamingConversation, StreamingResponder, collect_text, finish_with,
+    split_message
+)
+
+SENTENCE = "This is a complete sentence about English grammar. "
+
+
+async def deltas_of(text, size=7, error=None):
+    for i in range(0, len(text), size):
+        await asyncio.sleep(0)
+        yield text[i:i + size]
+    if error:
+        raise error
+
+
+class RecordingSender:
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.fail_on = fail_on
+
+    async def send(self, to, body):
+        if self.fail_on is not None and len(self.sent) == self.fail_on:
+            raise ConnectionError("twilio")
+        self.sent.append((to, body))
+
+
+def test_chunker_cuts_on_sentence_boundaries_within_limit():
+    text = SENTENCE * 100
+    chunker = MessageChunker()
+    chunks = []
+    for i in range(0, len(text), 13):
+        chunks += chunker.feed(text[i:i + 13])
+    chunks += chunker.flush()
+
+    assert all(len(chunk) <= WHATSAPP_MAX_CHARS for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    # O primeiro pedaço sai cedo; os seguintes são maiores
+    assert len(chunks[0]) < 400 < len(chunks[1])
+    assert " ".join(chunks) == text.strip()
+
+
+def test_chunker_releases_first_paragraph_early():
+    chunker = MessageChunker(first_chars=200)
+    assert chunker.feed("Short intro.\n\nRest") == ["Short intro."]
+
+
+def test_chunker_hard_cuts_text_without_boundaries():
+    chunks = split_message("x" * 4000)
+    assert [len(chunk) for chunk in chunks] == [1600, 1600, 800]
+
+
+def test_split_message_keeps_short_replies_whole():
+    assert split_message("oi") == ["oi"]
+    assert split_message(None) == []
+
+
+def test_deliver_sends_chunks_in_order():
+    text = SENTENCE * 60
+    sender = RecordingSender()
+
+    async def scenario():
+        return await StreamingResponder(sender).deliver("+5511", deltas_of(text))
+
+    full, timings = asyncio.run(scenario())
+    assert full == text
+    assert " ".join(body for _, body in sender.sent) == text.strip()
+    assert timings["messages"] == len(sender.sent) > 1
+
+
+def test_generation_error_wins_over_send_error():
+    class SlowFailingSender:
+        async def send(self, to, body):
+            # A geração falha enquanto este envio ainda está em andamento
+            await asyncio.sleep(0.05)
+            raise ConnectionError("twilio")
+
+    async def scenario():
+        deltas = deltas_of(SENTENCE * 20, size=len(SENTENCE), error=ValueError("api"))
+        await StreamingResponder(SlowFailingSender()).deliver("+5511", deltas)
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+def test_send_error_stops_generation_and_is_raised():
+    produced = 0
+
+    async def endless():
+        nonlocal produced
+        while True:
+            produced += 1
+            await asyncio.sleep(0)
+            yield SENTENCE
+
+    async def scenario():
+        await StreamingResponder(RecordingSender(fail_on=0)).deliver("+5511", endless())
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
+    assert produced < 100
+
+
+def test_queue_streams_async_iterators_and_splits_long_text():
+    sender = RecordingSender()
+    replies = {"stream": deltas_of(SENTENCE * 40), "long": SENTENCE * 40, "short": "ok"}
+
+    async def handler(to, body, media_url):
+        return replies[body]
+
+    async def scenario():
+        queue = MessageQueue(SenderDispatcher(handler), sender, workers=1, responder=StreamingResponder(sender))
+        await queue.start()
+        for body in ("stream", "long", "short"):
+            queue.enqueue(body, body)
+        await queue.stop(timeout=5)
+
+    asyncio.run(scenario())
+    by_recipient = {}
+    for to, body in sender.sent:
+        by_recipient.setdefault(to, []).append(body)
+    assert len(by_recipient["stream"]) > 1 and len(by_recipient["long"]) > 1
+    assert all(len(body) <= WHATSAPP_MAX_CHARS for _, body in sender.sent)
+    assert by_recipient["short"] == ["ok"]
+
+
+class RecordingDedupe:
+    def __init__(self):
+        self.completed = {}
+
+    async def complete(self, message_sid, reply=None):
+        self.completed[message_sid] = reply
+
+
+def test_queue_runs_bookkeeping_and_dedupe_on_the_assembled_stream():
+    sender = RecordingSender()
+    dedupe = RecordingDedupe()
+    recorded = []
+    text = SENTENCE * 40
+
+    async def record(full_text):
+        recorded.append(full_text)
+
+    async def handler(to, body, media_url):
+        if body == "stream":
+            return finish_with(deltas_of(text), record)
+        return "ok"
+
+    async def scenario():
+        queue = MessageQueue(SenderDispatcher(handler), sender, workers=1, responder=StreamingResponder(sender), dedupe=dedupe)
+        await queue.start()
+        queue.enqueue("+5511", "stream", message_sid="SM1")
+        queue.enqueue("+5522", "short", message_sid="SM2")
+        await queue.stop(timeout=5)
+
+    asyncio.run(scenario())
+    assert recorded == [text]
+    assert dedupe.completed == {"SM1": text, "SM2": "ok"}
+    assert " ".join(body for to, body in sender.sent if to == "+5511") == text.strip()
+
+
+def test_failed_stream_skips_bookkeeping():
+    recorded = []
+
+    async def record(full_text):
+        recorded.append(full_text)
+
+    async def scenario():
+        return await collect_text(finish_with(deltas_of(SENTENCE, error=TimeoutError("openai")), record))
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(scenario())
+    assert recorded == []
+
+
+def test_collect_text_assembles_streams_and_keeps_plain_text():
+    async def scenario():
+        return await collect_text(deltas_of(SENTENCE)), await collect_text("ok"), await collect_text(None)
+
+    assert asyncio.run(scenario()) == (SENTENCE, "ok", None)
+
+
+class FakeStreamingClient:
+    """Imita ``client.chat.completions.create(stream=True)`` do AsyncOpenAI"""
+
+    def __init__(self, words):
+        self.words = words
+        self.requests = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **request):
+        self.requests.append(request)
+
+        async def events():
+            for word in self.words:
+                delta = type("Delta", (), {"content": word})
+                yield type("Event", (), {"choices": [type("Choice", (), {"delta": delta})]})
+
+        return events()
+
+
+class FakeContext:
+    async def build_messages(self, user_key, system_prompt, user_message):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": f"Conversation summary so far: {user_key} likes football"},
+            {"role": "user", "content": user_message}
+        ]
+
+
+def test_streaming_conversation_uses_level_and_conversation_context():
+    conversation = StreamingConversation("test", conversation_context=FakeContext())
+    conversation.client = FakeStreamingClient(["Nice! ", "Who is ", "your team?"])
+
+    async def scenario():
+        return await collect_text(await conversation.reply("+5511", "B1", "I like football"))
+
+    assert asyncio.run(scenario()) == "Nice! Who is your team?"
+    request = conversation.client.requests[0]
+    assert request["stream"] is True
+    assert "B1" in request["messages"][0]["content"]
+    assert "likes football" in request["messages"][1]["content"]
+    assert request["messages"][-1] == {"role": "user", "content": "I like football"}
+
+
+def test_streaming_conversation_adds_extra_context_to_the_system_prompt():
+    conversation = StreamingConversation("test")
+    conversation.client = FakeStreamingClient(["ok"])
+
+    async def scenario():
+        return await collect_text(await conversation.reply("+5511", "A2", "I goed home", "goed -> went"))
+
+    assert asyncio.run(scenario()) == "ok"
+    system = conversation.client.requests[0]["messages"][0]["content"]
+    assert "A2" in system and system.endswith("goed -> went")
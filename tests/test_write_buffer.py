@@ -0,0 +1,102 @@
+import pytest
+
+from app.database.connection_pool import SQLitePool
+from app.database.sharding import ShardRoutingError, routed, shard_for
+from app.database.write_buffer import WriteBehindBuffer, WriteBufferedManager
+
+SCHEMA = "CREATE TABLE interactions (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, response TEXT)"
+INSERT = "INSERT INTO interactions (user_id, message, response) VALUES (?, ?, ?)"
+
+
+class FakeManager:
+    """Mesma interface de escrita do DatabaseManager, sobre um SQLitePool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.calls = []
+
+    def execute_query(self, query, params=()):
+        self.calls.append(query)
+        return self.pool.execute_query(query, params)
+
+    def get_conversation_history(self, user_id):
+        return self.pool.fetch_all("SELECT message FROM interactions WHERE user_id = ? ORDER BY id", (user_id,))
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "buffer.db"), size=2)
+    pool.execute_query(SCHEMA)
+    yield pool
+    pool.close()
+
+
+def count(pool):
+    return pool.fetch_one("SELECT COUNT(*) AS total FROM interactions")["total"]
+
+
+def test_flush_writes_batch_in_one_transaction(pool):
+    buffer = WriteBehindBuffer(pool, max_rows=1000, max_delay_ms=60000)
+    for i in range(50):
+        buffer.add(INSERT, (1, f"m{i}", "r"), key="+5511")
+    assert count(pool) == 0
+    assert buffer.flush() == 50
+    assert count(pool) == 50
+    assert buffer.stats()["batches"] == 1
+    buffer.close()
+
+
+def test_bad_row_does_not_drop_batch(pool):
+    buffer = WriteBehindBuffer(pool, max_rows=1000, max_delay_ms=60000)
+    buffer.add(INSERT, (1, "ok", "r"))
+    buffer.add("INSERT INTO missing_table (x) VALUES (?)", (1,))
+    buffer.add(INSERT, (1, "ok again", "r"))
+    buffer.flush()
+    assert count(pool) == 2
+    assert buffer.stats()["failed_rows"] == 1
+    buffer.close()
+
+
+def test_close_writes_pending_rows(pool):
+    buffer = WriteBehindBuffer(pool, max_rows=1000, max_delay_ms=60000)
+    buffer.add(INSERT, (1, "m", "r"))
+    buffer.close()
+    assert count(pool) == 1
+    with pytest.raises(RuntimeError):
+        buffer.add(INSERT, (1, "m", "r"))
+
+
+def test_manager_buffers_history_inserts_and_reads_own_writes(pool):
+    buffer = WriteBehindBuffer(pool, max_rows=1000, max_delay_ms=60000)
+    manager = FakeManager(pool)
+    buffered = WriteBufferedManager(manager, [buffer])
+    with routed("+5511"):
+        assert buffered.execute_query(INSERT, (1, "oi", "olá")) is None
+        assert count(pool) == 0
+        # Outros comandos passam direto
+        buffered.execute_query("UPDATE interactions SET response = 'x' WHERE id = 0")
+        assert [row["message"] for row in buffered.get_conversation_history(1)] == ["oi"]
+    assert manager.calls == ["UPDATE interactions SET response = 'x' WHERE id = 0"]
+    buffer.close()
+
+
+def test_manager_picks_buffer_of_current_shard(tmp_path):
+    pools = [SQLitePool(str(tmp_path / f"shard{i}.db"), size=1) for i in range(2)]
+    for pool in pools:
+        pool.execute_query(SCHEMA)
+    buffers = [WriteBehindBuffer(pool, max_rows=1000, max_delay_ms=60000) for pool in pools]
+    buffered = WriteBufferedManager(FakeManager(pools[0]), buffers)
+
+    phone = "whatsapp:+5511999990000"
+    with routed(phone):
+        buffered.execute_query(INSERT, (1, "oi", "olá"))
+    with pytest.raises(ShardRoutingError):
+        buffered.execute_query(INSERT, (1, "sem shard", "x"))
+
+    for buffer in buffers:
+        buffer.close()
+    target = shard_for(phone, 2)
+    assert count(pools[target]) == 1
+    assert count(pools[1 - target]) == 0
+    for pool in pools:
+        pool.close()
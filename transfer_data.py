@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+from app.database.data_transfer import DEFAULT_TABLES, TableExporter, TableImporter, TargetNotEmptyError
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(
+        description="Exporta ou importa usuários, sessões de avaliação e histórico em JSONL comprimido"
+    )
+    parser.add_argument("--database", default=os.getenv("DATABASE_PATH", "database/alex_bot.db"),
+                        help="Arquivo SQLite (um shard por vez quando DATABASE_SHARDS > 1)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Linhas por lote/transação")
+    parser.add_argument("--restart", action="store_true", help="Ignora o checkpoint e começa do zero")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Exporta as tabelas para um diretório")
+    export_parser.add_argument("directory", help="Diretório de destino (<tabela>.jsonl.gz + manifest.json)")
+    export_parser.add_argument("--tables", default=",".join(DEFAULT_TABLES), help="Tabelas separadas por vírgula")
+
+    import_parser = commands.add_parser("import", help="Importa um diretório exportado")
+    import_parser.add_argument("directory", help="Diretório gerado pelo export")
+    import_parser.add_argument("--tables", help="Subconjunto das tabelas do manifesto (padrão: todas)")
+    import_parser.add_argument("--jobs", type=int, default=1, help="Tabelas importadas em paralelo")
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Aceita um destino com dados e substitui as linhas com a mesma chave "
+                                    "(padrão: exige tabelas vazias)")
+    return parser.parse_args()
+
+
+def main(args):
+    start = time.perf_counter()
+    if args.command == "export":
+        exporter = TableExporter(args.database, args.directory, args.tables.split(","), args.batch_size)
+        manifest = exporter.run(restart=args.restart)
+        for table, entry in manifest["tables"].items():
+            print(f"  {table}: {entry['rows']} linhas")
+        print(f"Exportação {manifest['export_id']} concluída em {time.perf_counter() - start:.1f}s")
+    else:
+        if not os.path.exists(os.path.join(args.directory, "manifest.json")):
+            print(f"Erro: {args.directory} não contém um manifest.json (exportação incompleta?)")
+            sys.exit(1)
+        importer = TableImporter(args.database, args.directory, args.batch_size, args.jobs, args.replace)
+        tables = args.tables.split(",") if args.tables else None
+        try:
+            imported = importer.run(tables, restart=args.restart)
+        except TargetNotEmptyError as e:
+            print(f"Erro: {e}")
+            sys.exit(1)
+        for table, rows in imported.items():
+            print(f"  {table}: {rows} linhas importadas")
+        print(f"Importação concluída em {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main(parse_args())